@@ -1,15 +1,20 @@
+import os
 import json
 import math
-import requests
 import numpy as np
 import pandas as pd
 import streamlit as st
-import geopandas as gpd
+import streamlit.components.v1 as components
 import plotly.express as px
-import pyarrow
-# import plotly.graph_objects as gov
-import plotly.subplots as sp
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from datetime import date
+from indices import indexa_apolices, conta_apolices, linhas_parciais, classifica_segurado, indexa_localidades, municipios_uf, nome_municipio, coordenadas_municipio, indexa_eventos, agrupa_eventos, busca_municipios, indexa_anos, agrega_anos, matriz_anos, indexa_linha_tempo, associa_eventos, taxa_explicada, atribui_unidades, paises_unidades, vizinhos, indexa_susep, recorte_susep
+from compartilhado import mapeia_arrow, le_parquet, persistente, cache_orcado, status_cargas, relatorio_memoria, cria_antecipador, antecipa, publica_malha, ORCAMENTO_MB, PASTA_CACHE, SEGURADORAS
+from simulacao import parametros_carteira, simula_carteira, cria_executor
+from figuras import FiguraCompacta, compacta_figura
+from instantaneos import le_instantaneo, html_instantaneo, altura_instantaneo, assinatura_app
+from estatistica import mann_kendall, anomalia_ultimo_ano, classifica_tendencia, ajusta_frequencia, probabilidade_excedencia, periodo_retorno, classifica_periodo_retorno
 
 # -------------------- CONFIGURAÇÕES ----------------------
 titulo_pagina = 'OBSERVARIO  2024 - BY ® INTEGRAL SOLUÇÕES E GESTÃO :world_map:'
@@ -38,7 +43,7 @@ def number_to_human(num):
     else:
         return f'R$ {num:.2f}'
 
-@st.cache_data
+@cache_orcado
 def carrega_geojson(caminho):
     with open(caminho, 'r') as f:
         geoj = json.load(f)
@@ -46,23 +51,185 @@ def carrega_geojson(caminho):
 
 # @st.cache_data
 def filtra_geojson(geojson, iso, prop='codarea'):
-    gdf = gpd.GeoDataFrame.from_features(geojson)
-    return json.loads(gdf[gdf[prop] == iso].to_json())
+    # filtro direto nas features, sem passar pelo geopandas
+    return {'type': 'FeatureCollection', 'features': [f for f in geojson['features'] if f['properties'][prop] == iso]}
 
-@st.cache_data
+def geometria(nome, malha):
+    # com a pasta static/ servida, a figura leva só a URL da malha (publica_malha); sem, leva o geojson
+    return publica_malha(nome, malha) if st.get_option('server.enableStaticServing') else malha
+
+@cache_orcado
 def carrega_dados(caminho_arquivo):
     df = pd.read_csv(caminho_arquivo, engine='pyarrow', dtype_backend='pyarrow')
     return df
 
-@st.cache_data
+@cache_orcado
 def carrega_parquet(caminho_arquivo):
-    df = pd.read_parquet(caminho_arquivo, engine='pyarrow', dtype_backend='pyarrow')
-    return df
+    # memory map do Arrow IPC publicado: as réplicas do servidor dividem as mesmas páginas
+    # (cache_orcado: o dataframe não é copiado a cada execução, então não deve ser alterado no lugar)
+    return mapeia_arrow(caminho_arquivo)
+
+@st.cache_resource
+def carrega_psr(caminho_arquivo, _seguradoras):
+    # copy() não duplica os buffers Arrow; só as colunas derivadas ficam na memória do processo
+    psr = carrega_parquet(caminho_arquivo).copy()
+    psr['seguradora'] = psr.seguradora.map(_seguradoras)
+    psr['pe_taxa'] = psr.pe_taxa * 100
+    psr['cod_apolice'] = carrega_indice_apolices(caminho_arquivo)['codigos']
+    return psr
+
+@st.cache_resource
+def carrega_indice_apolices(caminho_arquivo):
+    return indexa_apolices(carrega_parquet(caminho_arquivo))
+
+@st.cache_data
+@persistente()
+def carrega_culturas_psr(caminho_arquivo):
+    # linhas por (uf, dia, cultura): opções do filtro de culturas da aba Agro sem carregar o PSR inteiro
+    psr = le_parquet(caminho_arquivo, ['uf', 'data_apolice', 'cultura']).to_pandas()
+    return psr.groupby(['uf', 'data_apolice', 'cultura'], as_index=False, observed=True).size().rename(columns={'size': 'linhas'})
+
+@st.cache_resource
+def carrega_indice_localidades(caminho_municipios, caminho_coordenadas):
+    return indexa_localidades(carrega_parquet(caminho_municipios).iloc[:-45], carrega_parquet(caminho_coordenadas))
+
+@st.cache_resource
+def carrega_indice_eventos(caminho_arquivo):
+    return indexa_eventos(carrega_parquet(caminho_arquivo))
+
+@st.cache_resource
+def carrega_indice_anos(caminho_arquivo):
+    chaves = ['pais', 'cod_uf', 'uf', 'ibge', 'municipio', 'grupo_de_desastre', 'descricao_tipologia']
+    return indexa_anos(carrega_parquet(caminho_arquivo), chaves, ['agricultura', 'pecuaria', 'industria'])
+
+@st.cache_data
+@persistente()
+def carrega_unidades_eventos(caminho_eventos, caminho_malha):
+    # unidade subnacional de cada evento (linha a linha); no cache persistente, refeita só se as fontes mudarem
+    eventos = carrega_parquet(caminho_eventos)
+    return pd.DataFrame({'unidade': atribui_unidades(eventos.latitude.to_numpy(dtype=float, na_value=np.nan), eventos.longitude.to_numpy(dtype=float, na_value=np.nan), carrega_geojson(caminho_malha))})
+
+@st.cache_data
+@persistente()
+def carrega_paises_unidades(caminho_unidades, caminho_paises):
+    return paises_unidades(carrega_geojson(caminho_unidades), carrega_geojson(caminho_paises))
+
+@st.cache_resource
+def carrega_indice_unidades(caminho_eventos, caminho_malha):
+    eventos = carrega_parquet(caminho_eventos).assign(unidade=carrega_unidades_eventos(caminho_eventos, caminho_malha).unidade.to_numpy())
+    return indexa_anos(eventos.dropna(subset=['unidade']), ['cod_uf', 'unidade', 'descricao_tipologia'])
+
+@st.cache_resource
+def carrega_indice_susep(caminho_arquivo):
+    return indexa_susep(carrega_parquet(caminho_arquivo))
+
+@st.cache_resource
+def carrega_indice_linha_tempo(caminho_arquivo):
+    return indexa_linha_tempo(carrega_parquet(caminho_arquivo).iloc[:62273])
+
+@st.cache_data
+@persistente('PSR_COMPLETO.parquet', 'desastres_latam2.parquet')
+def calcula_sinistros_explicados(_psr, _indice, janela):
+    # histórico nacional: cada sinistro contra os eventos da mesma tipologia no município em +-janela dias
+    sinistros = _psr.query("descricao_tipologia != '-'")
+    defasagem = associa_eventos(_indice, sinistros, janela=janela)
+    return taxa_explicada(sinistros, defasagem, por=('uf', 'ibge', 'municipio', 'cultura', 'descricao_tipologia', 'data_apolice'))
+
+@st.cache_data
+@persistente('desastres_latam2.parquet')
+def calcula_tendencias(_indice, inicio, fim, por=('ibge', 'descricao_tipologia'), **filtros):
+    # todas as séries do filtro em um único lote (por padrão: todo município x tipologia)
+    rotulos, matriz, _ = matriz_anos(_indice, inicio, fim, por=list(por), **filtros)
+    resultado = mann_kendall(matriz)
+    rotulos['tendencia'] = classifica_tendencia(resultado)
+    rotulos['declive'] = resultado['declive']
+    rotulos['p_valor'] = resultado['p_valor']
+    rotulos['anomalia'] = anomalia_ultimo_ano(matriz)
+    return rotulos
+
+@st.cache_data
+@persistente('desastres_latam2.parquet')
+def calcula_periodos_retorno(_indice, inicio, fim, por=('ibge', 'descricao_tipologia'), modelo='auto', minimo=1, **filtros):
+    # taxa anual por série (Poisson ou binomial negativa), probabilidade de excedência e período de retorno
+    rotulos, matriz, _ = matriz_anos(_indice, inicio, fim, por=list(por), **filtros)
+    ajuste = ajusta_frequencia(matriz, modelo=modelo)
+    probabilidade = probabilidade_excedencia(ajuste, minimo=minimo)
+    rotulos['taxa_anual'] = ajuste['media']
+    rotulos['prob_anual'] = probabilidade * 100
+    rotulos['periodo_retorno'] = periodo_retorno(probabilidade)
+    rotulos['classe_retorno'] = classifica_periodo_retorno(rotulos.periodo_retorno.to_numpy())
+    return rotulos
+
+@st.cache_resource
+def carrega_antecipador():
+    # threads de aquecimento compartilhadas por todas as sessões
+    return cria_antecipador()
+
+@st.cache_data
+def carrega_vizinhos(caminho):
+    return vizinhos(carrega_geojson(caminho), prop='abbrev_state')
+
+@st.cache_resource
+def carrega_executor_simulacao():
+    # um único pool de processos para todas as sessões
+    return cria_executor()
+
+@st.cache_data
+def simula_perdas(_psr, uf, culturas, anos_simulados, semente=0):
+    # _psr é a base completa: o recorte (histórico inteiro de 2006 a 2021, sem a janela de datas) sai
+    # só de uf e culturas, que estão na chave do cache, e a frequência divide pelos anos_psr certos
+    recorte = _psr[_psr.uf.eq(uf).to_numpy()]
+    if culturas:
+        recorte = recorte[recorte.cultura.isin(culturas).to_numpy()]
+    parametros = parametros_carteira(recorte, anos_psr)
+    return simula_carteira(parametros, anos=anos_simulados, executor=carrega_executor_simulacao(), semente=semente)
+
+@st.cache_resource
+def carrega_assinatura_app():
+    # código + dados desta réplica; instantâneos de outra assinatura são ignorados
+    return assinatura_app()
 
 @st.cache_data
+def carrega_instantaneo(aba, local, assinatura):
+    pacote = le_instantaneo(aba, local, assinatura)
+    return None if pacote is None else {'html': html_instantaneo(pacote), 'altura': altura_instantaneo(pacote)}
+
+@cache_orcado
+@persistente()
 def carrega_malha(tipo='estados', uf='PI', intrarregiao='municipio', qualidade='minima'):
+    import requests  # só na falta do cache
     url = f'https://servicodados.ibge.gov.br/api/v3/malhas/{tipo}/{uf}?formato=application/vnd.geo+json&intrarregiao={intrarregiao}&qualidade={qualidade}'
-    return requests.get(url).json()
+    # só uma malha de verdade chega ao cache em disco: erro HTTP ou corpo inválido levantam antes
+    resposta = requests.get(url, timeout=60)
+    resposta.raise_for_status()
+    malha = resposta.json()
+    if not isinstance(malha, dict) or malha.get('type') != 'FeatureCollection' or not malha.get('features'):
+        raise ValueError(f'resposta do IBGE sem malha: {url}')
+    return malha
+
+def arredonda_coordenadas(coordenadas, casas):
+    if isinstance(coordenadas[0], (int, float)):
+        return [round(c, casas) for c in coordenadas]
+    return [arredonda_coordenadas(c, casas) for c in coordenadas]
+
+@cache_orcado
+def carrega_malha_nacional(caminho=os.path.join(PASTA_CACHE, 'malha_municipios_br.json'), tolerancia=0.005, casas=4):
+    # malha de todos os municípios do país, simplificada e gravada na pasta de cache na primeira execução
+    if os.path.exists(caminho):
+        return carrega_geojson(caminho)
+    import geopandas as gpd  # só na primeira geração da malha
+    gdf = gpd.GeoDataFrame.from_features(carrega_malha(tipo='paises', uf='BR'))
+    gdf['geometry'] = gdf.geometry.simplify(tolerancia, preserve_topology=True)
+    malha = json.loads(gdf[['codarea', 'geometry']].to_json(drop_id=True))
+    for feature in malha['features']:
+        feature['geometry']['coordinates'] = arredonda_coordenadas(feature['geometry']['coordinates'], casas)
+    # temporário + os.replace: outra sessão nunca lê a malha pela metade
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(malha, f, separators=(',', ':'))
+    os.replace(temporario, caminho)
+    return malha
 
 def filtra_estado(df, uf):
     return df[(df.uf.eq(uf))]
@@ -79,41 +246,9 @@ def calcula_ocorrencias(df, cols_selecionadas, cols_agrupadas):
 def classifica_risco(df, col_ocorrencias):
     # df = dataframe.copy()
     quartis = df[col_ocorrencias].quantile([0.2, 0.4, 0.6, 0.8]).values
-    risco = []
-    for valor in df[col_ocorrencias]:
-        if valor > quartis[3]:
-            risco.append('Muito Alto')
-        elif valor > quartis[2]:
-            risco.append('Alto')
-        elif valor > quartis[1]:
-            risco.append('Moderado')
-        elif valor > quartis[0]:
-            risco.append('Baixo')
-        else:
-            risco.append('Muito Baixo')
-    df['risco'] = risco
-    return df
-
-def classifica_segurado(df, munis, munis_segurados, munis_sinistrados):
-    # df = dataframe.copy()
-    tudo = set(munis)
-    tenho = set(munis_segurados)
-    especifico = set(munis_sinistrados)
-
-    nao_segurado = list(tudo - tenho)
-    nao_sinistrado = list(tenho - especifico)
-
-    df['seg'] = np.where(df.code_muni.isin(nao_segurado), 'Não Segurada', 'Mais Sinistros que a Média')
-    # df['seg'] = np.where(df.code_muni.isin(nao_segurado), 'Não Segurada', 'Apresenta Sinistro')
-    df.loc[df[df.code_muni.isin(nao_sinistrado)].index, 'seg'] = 'Menos Sinistros que a Média'
-    # df.loc[df[df.code_muni.isin(nao_sinistrado)].index, 'seg'] = 'Não Apresenta Sinistro'
-    # df.seg = np.where(df.ibge.isin(nao_sinistrado), 'Não Apresenta Sinistro', 'Apresenta Sinistro')
-    
-    # nenhum = set(base.query("descricao_tipologia == '-'").ibge)
-    # algum = set(base.query("descricao_tipologia != '-'").ibge)
-    # resultado = list(nenhum - algum)
-    # df['seg'] = np.where(df.ibge == '-', 'Não Segurada', 'Apresenta Sinistro')
-    # df.seg = df.seg.mask(df.code_muni.isin(resultado), 'Não Apresenta Sinistro')
+    # quantos quintis o valor ultrapassa (estritamente) = posição do rótulo
+    faixas = np.searchsorted(quartis, df[col_ocorrencias].to_numpy(dtype=float), side='left')
+    df['risco'] = np.array(['Muito Baixo', 'Baixo', 'Moderado', 'Alto', 'Muito Alto'], dtype=object)[faixas]
     return df
 
 # @st.cache_data
@@ -122,7 +257,7 @@ def classifica_lossratio(df):
     df['classe_sinistralidade'] = pd.cut(df.loss_ratio, [0.0, 20, 40, 60, 80, 100, 1000], labels=['Abaixo de 20%', 'De 20% a 40%', 'De 40% e 60%', 'De 60% e 80%', 'De 80% e 100%', 'Acima de 100%'])
     return df
 
-def cria_mapa(df, malha, locais='ibge', cor='ocorrencias', tons=None, tons_midpoint=None, nome_hover=None, dados_hover=None, lista_cores=None, lat=-14, lon=-53, zoom=3, titulo_legenda='Risco', featureid='properties.codarea', min_max=None):
+def cria_mapa(df, malha, locais='ibge', cor='ocorrencias', tons=None, tons_midpoint=None, nome_hover=None, dados_hover=None, lista_cores=None, lat=-14, lon=-53, zoom=3, titulo_legenda='Risco', featureid='properties.codarea', min_max=None, pontos=None, bordas=True):
     ordem = {cor: list(lista_cores.keys())} if lista_cores else None
     fig = px.choropleth_mapbox(
         df, geojson=malha, color=cor,
@@ -133,7 +268,9 @@ def cria_mapa(df, malha, locais='ibge', cor='ocorrencias', tons=None, tons_midpo
         category_orders=ordem,
         labels={'risco': 'Risco', 'ocorrencias': 'Ocorrências', 'code_muni': 'Código Municipal', 'sinistros': 'Sinistros',
                 'code_state': 'Código', 'desastre_mais_comum': 'Desastre mais comum', 'evento_mais_comum': 'Evento mais comum',
-                'seg': 'Tipo de Área Segurada', 'classe_sinistralidade': 'Classificação', 'loss_ratio': 'Índice de Sinistralidade'},
+                'seg': 'Tipo de Área Segurada', 'classe_sinistralidade': 'Classificação', 'loss_ratio': 'Índice de Sinistralidade',
+                'tendencia': 'Tendência', 'declive': 'Variação por Ano (Sen)', 'p_valor': 'Valor-p', 'anomalia': 'Anomalia do Último Ano (z)',
+                'classe_retorno': 'Período de Retorno', 'periodo_retorno': 'Período de Retorno (anos)', 'prob_anual': 'Probabilidade Anual (%)', 'taxa_anual': 'Ocorrências por Ano'},
         locations=locais, featureidkey=featureid,
         center={'lat': lat, 'lon': lon}, zoom=zoom, 
         mapbox_style='carto-positron', height=500,
@@ -158,284 +295,156 @@ def cria_mapa(df, malha, locais='ibge', cor='ocorrencias', tons=None, tons_midpo
             traceorder="normal"
         )
     )
-    
-    return fig
-
-
-
-# VARIAVEIS
-dados_atlas = carrega_parquet('desastres_latam2.parquet')
-dados_merge = carrega_parquet('area2.parquet')
-coord_uf = carrega_parquet('coord_uf.parquet')
-coord_muni = carrega_parquet('coord_muni.parquet')
-pop_pib = carrega_parquet('pop_pib_muni.parquet')
-# pop_pib_uf = carrega_parquet('pop_pib_latam.parquet')
-# malha_america = carrega_geojson('malha_latam.json')
-# malha_brasil = carrega_geojson('malha_brasileira.json')
-
-# dados_susep = carrega_parquet('susep_agro.parquet')
-# psr = carrega_parquet('PSR_COMPLETO.parquet')
-# psr.seguradora = psr.seguradora.map(seg)
-# psr.pe_taxa = psr.pe_taxa * 100
-
-print(dados_atlas.info())
-
-
-estados = {
-   'Acre': 'AC',
-    'Alagoas': 'AL',
-    'Amazonas': 'AM',
-    'Amapá': 'AP',
-    'Bahia': 'BA',
-    'Ceará': 'CE',
-    'Distrito Federal': 'DF',
-    'Espírito Santo': 'ES',
-    'Goiás': 'GO',
-    'Maranhão': 'MA',
-    'Minas Gerais': 'MG',
-    'Mato Grosso do Sul': 'MS',
-    'Mato Grosso': 'MT',
-    'Pará': 'PA',
-    'Paraíba': 'PB',
-    'Pernambuco': 'PE',
-    'Paraná': 'PR',
-    'Piauí': 'PI',
-    'Rio de Janeiro': 'RJ',
-    'Rio Grande do Norte': 'RN',
-    'Rondônia': 'RO',
-    'Roraima': 'RR',
-    'Rio Grande do Sul': 'RS',
-    'Santa Catarina': 'SC',
-    'Sergipe': 'SE',
-    'São Paulo': 'SP',
-    'Tocantins': 'TO'
-
-  
-}
-
-
-# estados = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
-anos = np.arange(1991, 2023)
-anos_latam = np.arange(2000, 2024)
-anos_psr = np.arange(2006, 2022)
-mapa_de_cores = {
-    'Estiagem e Seca': '#EECA3B',
-    'Incêndio Florestal': '#E45756',
-    'Onda de Frio': '#72B7B2',
-    'Onda de Calor e Baixa Umidade': '#F58518',
-    'Enxurradas': '#B279A2',
-    'Inundações': '#0099C6',
-    'Alagamentos': '#72B7B2',
-    'Movimento de Massa': '#9D755D',
-    'Chuvas Intensas': '#4C78A8',
-    'Vendavais e Ciclones': '#54A24B',
-    'Granizo': 'rgb(102, 102, 102)',
-    'Tornado': '#4C78A8',
-    'Onda de Frio': '#72B7B2',
-    'Doenças infecciosas': '#54A24B',
-    'Erosão': '#9D755D',
-    'Outros': '#FF9DA6',
-    'Rompimento/Colapso de barragens': 'rgb(102, 102, 102)',
-    'Sem Dados': '#BAB0AC'
-}
-meses = {
-    '1': 'JAN',
-    '2': 'FEV',
-    '3': 'MAR',
-    '4': 'ABR',
-    '5': 'MAI',
-    '6': 'JUN',
-    '7': 'JUL',
-    '8': 'AGO',
-    '9': 'SET',
-    '10': 'OUT',
-    '11': 'NOV',
-    '12': 'DEZ'
-}
-cores_risco = {
-    'Muito Alto': '#E45756',
-    'Alto': '#F58518',
-    'Moderado': '#EECA3B',
-    'Baixo': '#72B7B2',
-    'Muito Baixo': '#4C78A8'
-}
-cores_segurado = {
-    'Não Segurada': '#EECA3B',
-    'Menos Sinistros que a Média': '#54A24B',
-    'Mais Sinistros que a Média': '#E45756'
-}
-# cores_segurado = {
-#     'Não Segurada': '#EECA3B',
-#     'Não Apresenta Sinistro': '#54A24B',
-#     'Apresenta Sinistro': '#E45756'
-# }
-cores_sinistralidade = {
-    'Acima de 100%': '#ff0000',
-    'De 80% e 100%': '#ff5232',
-    'De 60% e 80%': '#ff7b5a',
-    'De 40% e 60%': '#ff9e81',
-    'De 20% a 40%': '#ffbfaa',
-    'Abaixo de 20%': '#ffdfd4'
-}
-desastres = {
-    'Hidrológico': ['Alagamentos', 'Chuvas Intensas', 'Enxurradas', 'Inundações', 'Movimento de Massa'],
-    'Climatológico': ['Estiagem e Seca', 'Incêndio Florestal', 'Onda de Calor e Baixa Umidade', 'Onda de Frio'],
-    'Meteorológico': ['Granizo', 'Onda de Frio', 'Tornado', 'Vendavais e Ciclones'],
-    'Outros': ['Doenças infecciosas', 'Erosão', 'Onda de Calor e Baixa Umidade', 'Outros', 'Rompimento/Colapso de barragens']
-}
-idx_select = {
-    'Climatológico': 0,
-    'Hidrológico': 2,
-    'Meteorológico': 3,
-    'Outros': 1
-}
-
-idx_select_br = {
-    'Climatológico': 0,
-    'Hidrológico': 3,
-    'Meteorológico': 3,
-    'Outros': 1
-}
-seg = {
-    'BRASILSEG COMPANHIA DE SEGUROS': 'Brasilseg', 
-    'Mapfre Seguros Gerais S.A.': 'MAPFRE Seguros',
-    'Essor Seguros S.A.': 'Essor Seguros',
-    'Swiss Re Corporate Solutions Brasil S.A.': 'Swiss Re',
-    'Nobre Seguradora do Brasil S.A': 'Nobre Seguradora',
-    'Allianz Seguros S.A': 'Allianz Seguros',
-    'Sancor Seguros do Brasil S.A.': 'Sancor Seguros',
-    'FairFax Brasil Seguros Corporativos S/A': 'Fairfax Seguros',
-    'Newe Seguros S.A': 'Newe Seguros',
-    'Tokio Marine Seguradora S.A.': 'Tokio Marine Seguradora',
-    'Porto Seguro Companhia de Seguros Gerais': 'Porto Seguro',
-    'Too Seguros S.A.': 'Too Seguros',
-    'Aliança do Brasil Seguros S/A.': 'Aliança do Brasil Seguros',
-    'Sompo Seguros S/A': 'Sompo Seguros',
-    'Companhia Excelsior de Seguros': 'Seguros Excelsior',
-    'EZZE Seguros S.A.': 'EZZE Seguros',
-    'Itaú XL Seguros Corporativos S.A': 'Itaú XL Seguros',
-}
-
-# COLUNAS
-tabs = st.tabs(['UF do Brasil', 'Agro', 'América Latina', 'Créditos'])
-
-with tabs[0]:
-    secao1_uf = st.container()
-    col_mapa1, col_dados1 = secao1_uf.columns([1, 1], gap='large')
-    col_dados1.header('Parâmetros de Análise')
-    # col_mapa, col_dados = st.columns([1, 1], gap='large')
-    select1, select2 = col_dados1.columns([1, 1])
-
-
-
-    # SELECTBOX
-    uf_selectbox = select1.selectbox('Selecione o estado', list(estados.keys()), index=17)
-    uf_selecionado = estados[uf_selectbox]
-    grupo_desastre_selecionado = select2.selectbox('Selecione o grupo de desastre', ['Todos os Grupos de Desastre'] + list(desastres.keys()), index=0)
-    # grupo_desastre_selecionado = select2.selectbox('Selecione o grupo de desastre', list(desastres.keys()), index=0)
-    # ano_inicial, ano_final = col_dados.date_input('Selecione o Período a ser analisado', (date(1991, 1, 7), date(2022, 12, 30)), date(1991, 1, 7), date(2022, 12, 30), format="DD/MM/YYYY")
-    ano_inicial, ano_final = col_dados1.select_slider('Selecione o Intervalo de Anos', anos, value=(anos[0], anos[-1]))
-
-
-
-    # BUBBLE PLOT
-    atlas_yearQ = dados_atlas.query("uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final")
-    if grupo_desastre_selecionado != 'Todos os Grupos de Desastre':
-        atlas_yearQ = atlas_yearQ.query("grupo_de_desastre == @grupo_desastre_selecionado")
-    atlas_year = atlas_yearQ.groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
-    # atlas_year = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final").groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
-
 
+    # sem contorno os milhares de polígonos da malha nacional desenham bem mais rápido
+    if not bordas:
+        fig.update_traces(marker_line_width=0, selector=dict(type='choroplethmapbox'))
+
+    # camada de eventos agrupados (uma bolha por célula da grade do zoom atual)
+    if pontos is not None and len(pontos) > 0:
+        fig.add_trace(
+            px.scatter_mapbox(
+                pontos, lat='lat', lon='lon', size='eventos', size_max=30,
+                hover_data={'eventos': True, 'lat': False, 'lon': False},
+                labels={'eventos': 'Eventos'}
+            ).data[0]
+        )
+        fig.update_traces(marker=dict(color='#222A2A', sizemin=4, opacity=0.8), showlegend=False, selector=dict(mode='markers'))
+
+    return compacta_figura(fig)
+
+def quadros_risco(contagens, locais, anos):
+    # contagens (ano, ibge, ocorrencias) -> matriz ano x município e classificação por quintis de cada ano
+    contagem = contagens.pivot_table(index='ano', columns='ibge', values='ocorrencias', aggfunc='sum', fill_value=0).reindex(index=anos, columns=locais, fill_value=0).to_numpy()
+    quintis = np.quantile(contagem, [0.2, 0.4, 0.6, 0.8], axis=1).T
+    faixas = (contagem[:, :, None] > quintis[:, None, :]).sum(axis=2)
+    rotulos = np.array(['Muito Baixo', 'Baixo', 'Moderado', 'Alto', 'Muito Alto'], dtype=object)[faixas]
+    return rotulos, contagem
+
+def quadros_desastre(contagens, locais, anos):
+    # contagens (ano, ibge, descricao_tipologia, ocorrencias) -> desastre mais comum por município em cada ano
+    mais_comum = contagens.sort_values('ocorrencias', ascending=False).drop_duplicates(subset=['ano', 'ibge'], keep='first')
+    rotulos = mais_comum.pivot(index='ano', columns='ibge', values='descricao_tipologia').reindex(index=anos, columns=locais).fillna('Sem Dados').to_numpy(dtype=object)
+    ocorrencias = mais_comum.pivot(index='ano', columns='ibge', values='ocorrencias').reindex(index=anos, columns=locais).fillna(0).to_numpy()
+    return rotulos, ocorrencias
+
+def cria_mapa_animado(locais, malha, anos, rotulos, valores, lista_cores, nomes=None, lat=-14, lon=-53, zoom=3, titulo_legenda='Risco', titulo_valor='Ocorrências', featureid='properties.codarea', bordas=True):
+    # a malha vai só no traço inicial; cada quadro troca apenas z e o hover, e a reprodução fica no navegador
+    categorias = list(lista_cores.keys())
+    escala = []
+    for i, cor in enumerate(lista_cores.values()):
+        escala += [[i / len(categorias), cor], [(i + 1) / len(categorias), cor]]
+
+    def quadro(i):
+        codigos = pd.Categorical(rotulos[i], categories=categorias).codes.astype(float)
+        codigos[codigos < 0] = np.nan
+        return dict(z=codigos, customdata=np.column_stack([rotulos[i], valores[i]]))
+
+    hover = '<b>%{text}</b><br>' + titulo_legenda + ': %{customdata[0]}<br>' + titulo_valor + ': %{customdata[1]}<extra></extra>'
+    fig = FiguraCompacta(
+        go.Choroplethmapbox(
+            geojson=malha, locations=locais, featureidkey=featureid, text=nomes,
+            zmin=-0.5, zmax=len(categorias) - 0.5, colorscale=escala, marker_opacity=0.95,
+            marker_line_width=0.5 if bordas else 0, hovertemplate=hover,
+            colorbar=dict(title=titulo_legenda, tickvals=list(range(len(categorias))), ticktext=categorias),
+            **quadro(0)
+        ),
+        frames=[go.Frame(name=str(ano), data=[go.Choroplethmapbox(**quadro(i))], traces=[0]) for i, ano in enumerate(anos)]
+    )
 
-    fig_grupo_desastre = px.scatter(atlas_year, x="ano", y='descricao_tipologia', size='ocorrencias', 
-        color='descricao_tipologia', size_max=50, color_discrete_map=mapa_de_cores,
-        labels={
-            "ano": "Ano", 
-            "descricao_tipologia": "Desastre"
-        }
+    animacao = dict(frame=dict(duration=600, redraw=True), transition=dict(duration=0), mode='immediate')
+    fig.update_layout(
+        mapbox=dict(style='carto-positron', center={'lat': lat, 'lon': lon}, zoom=zoom),
+        mapbox_bounds={"west": -150, "east": -20, "south": -60, "north": 60},
+        margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=500,
+        updatemenus=[dict(
+            type='buttons', direction='left', x=0.01, y=0.01, xanchor='left', yanchor='bottom',
+            buttons=[
+                dict(label='▶', method='animate', args=[None, {**animacao, 'fromcurrent': True}]),
+                dict(label='❚❚', method='animate', args=[[None], {**animacao, 'frame': dict(duration=0, redraw=False)}]),
+            ]
+        )],
+        sliders=[dict(
+            active=0, x=0.1, len=0.9, y=0.01, yanchor='bottom', currentvalue=dict(prefix='Ano: '),
+            steps=[dict(label=str(ano), method='animate', args=[[str(ano)], animacao]) for ano in anos]
+        )]
     )
-    fig_grupo_desastre.update_layout(showlegend=False, legend_orientation='h', margin={"r":0,"t":0,"l":0,"b":0})
-    fig_grupo_desastre.update_xaxes(showgrid=True)
-    # col_dados.caption('Quanto maior o círculo, maior o número de ocorrências do desastre')
-    col_dados1.plotly_chart(fig_grupo_desastre)
-    # col_dados.title(" ")
+    return fig
 
 
+@st.fragment
+def secao_risco_uf(dados_atlas, indice_anos, dados_merge, pop_pib, uf_selecionado, ufs_selecionadas, grupo_desastre_selecionado, ano_inicial, ano_final, animar_mapas, malha_mun_estados, lat, lon, zoom_uf):
+    # tipologia e métrica do mapa só refazem esta seção (mapa de risco, métricas, tabela, danos e heatmap);
+    # os dados vêm como argumentos, guardados com o fragmento, e não dos globais da última execução completa
+    anos_animacao = list(range(ano_inicial, ano_final + 1))
+    grupo_filtro = None if grupo_desastre_selecionado == 'Todos os Grupos de Desastre' else grupo_desastre_selecionado
+
     secao2_uf = st.container()
     col_mapa2, col_dados2 = secao2_uf.columns([1, 1], gap='large')
 
     col_dados2.header('Refinar Parâmetros de Análise')
 
     # selecionando estado
-    desastre_col, mun_col = col_dados2.columns([1, 1])
+    desastre_col, metrica_col = col_dados2.columns([1, 1])
 
     disasters = desastres[grupo_desastre_selecionado] if grupo_desastre_selecionado != 'Todos os Grupos de Desastre' else dados_atlas.descricao_tipologia.unique().tolist()
 
     tipol_name = 'Todos os Desasastres' if grupo_desastre_selecionado == 'Todos os Grupos de Desastre' else f'Todos os Desastres ({grupo_desastre_selecionado})'
     tipologia_selecionada = desastre_col.selectbox('Selecione a tipologia do desastre', [tipol_name] + disasters, index=0, key='tipol')
     # tipologia_selecionada = desastre_col.selectbox('Selecione a tipologia do desastre', desastres[grupo_desastre_selecionado], index=idx_select[grupo_desastre_selecionado], key='tipol')
-    coord_municipio = mun_col.selectbox('Encontrar município (zoom)',['-'] + dados_merge.iloc[:-45].query("abbrev_state == @uf_selecionado").name_muni.unique().tolist(), index=0)
-
-
-
-    # MALHA
-    malha_mun_estados = carrega_malha(uf=uf_selecionado)
-    zoom_uf = 5
-    if coord_municipio == '-':
-        lat, lon = coord_uf.query("abbrev_state == @uf_selecionado")[['lat', 'lon']].values[0]
-    else:
-        cod_muni = dados_merge.loc[dados_merge.name_muni == coord_municipio, 'code_muni'].values[0]
-        lat, lon = coord_muni.query("codarea == @cod_muni")[['lat', 'lon']].values[0]
-        zoom_uf = 10
-
-
-
-    # MAPA DE DESASTRES COMUNS
-    tipol_com_muni = dados_atlas.query("uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final")
-    if grupo_desastre_selecionado != 'Todos os Grupos de Desastre':
-        tipol_com_muni = tipol_com_muni.query("grupo_de_desastre == @grupo_desastre_selecionado")
-
-    tipologias_mais_comuns_por_muni = tipol_com_muni.groupby(['ibge', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'desastre_mais_comum'})
-    # tipologias_mais_comuns_por_muni = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final").groupby(['ibge', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'desastre_mais_comum'})
-
-    merge_muni_2 = dados_merge.query("abbrev_state == @uf_selecionado").groupby(['code_muni', 'name_muni'], as_index=False).size().drop('size', axis=1)
-    tipol_merge = merge_muni_2.merge(tipologias_mais_comuns_por_muni, how='left', left_on='code_muni', right_on='ibge').drop('ibge', axis=1)
-    tipol_merge.loc[np.isnan(tipol_merge["ocorrencias"]), 'ocorrencias'] = 0
-    tipol_merge.desastre_mais_comum = tipol_merge.desastre_mais_comum.fillna('Sem Dados')
-    col_mapa1.header(f'Desastre mais comum por Município')
-    # col_mapa1.header(f'Desastre mais comum por Município ({ano_inicial} - {ano_final})')
-    col_mapa1.plotly_chart(cria_mapa(tipol_merge, malha_mun_estados, locais='code_muni', cor='desastre_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_muni', dados_hover=['desastre_mais_comum', 'ocorrencias'], zoom=zoom_uf, lat=lat, lon=lon, titulo_legenda='Desastre mais comum'), use_container_width=True)
-
-
-
+    metrica_mapa = metrica_col.selectbox('Colorir mapa de risco por', metricas_mapa, index=0, key='metrica_mapa')
 
 
 
     # QUERY
-    dados_atlas_query = dados_atlas.query("uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final")
-    # dados_atlas_query = dados_atlas.query("descricao_tipologia == @tipologia_selecionada & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final")
-    if grupo_desastre_selecionado != 'Todos os Grupos de Desastre':
-        dados_atlas_query = dados_atlas_query.query("grupo_de_desastre == @grupo_desastre_selecionado")
-
-    if tipologia_selecionada != tipol_name:
-        dados_atlas_query = dados_atlas_query.query("descricao_tipologia == @tipologia_selecionada")
-
-    # dados_atlas_query = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & descricao_tipologia == @tipologia_selecionada & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final")
+    tipologia_filtro = None if tipologia_selecionada == tipol_name else tipologia_selecionada
+    filtros_atlas = dict(uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro, descricao_tipologia=tipologia_filtro)
+    ocorrencias_por_ano = agrega_anos(indice_anos, ano_inicial, ano_final, anual=True, **filtros_atlas)
 
 
     # MAPA RISCO
-    ocorrencias = dados_atlas_query.groupby(['ibge', 'municipio'], as_index=False).size().rename(columns={'size': 'ocorrencias'}).sort_values('ocorrencias', ascending=False).drop_duplicates(subset='ibge', keep='first')
-    merge_muni = dados_merge.query("abbrev_state == @uf_selecionado").groupby(['code_muni', 'name_muni', 'AREA_KM2'], as_index=False).size().drop('size', axis=1).drop_duplicates(subset='code_muni', keep='first')
+    ocorrencias = agrega_anos(indice_anos, ano_inicial, ano_final, por=['ibge', 'municipio'], **filtros_atlas)[['ibge', 'municipio', 'ocorrencias']].sort_values('ocorrencias', ascending=False).drop_duplicates(subset='ibge', keep='first')
+    merge_muni = dados_merge.query("abbrev_state in @ufs_selecionadas").groupby(['code_muni', 'name_muni', 'AREA_KM2'], as_index=False).size().drop('size', axis=1).drop_duplicates(subset='code_muni', keep='first')
     ocorrencias_merge = merge_muni.merge(ocorrencias, how='left', left_on='code_muni', right_on='ibge')
     ocorrencias_merge.loc[np.isnan(ocorrencias_merge["ocorrencias"]), 'ocorrencias'] = 0
 
     classificacao_ocorrencias = classifica_risco(ocorrencias_merge, 'ocorrencias')  # mudadr classficador
-    fig_mapa = cria_mapa(classificacao_ocorrencias, malha_mun_estados, locais='code_muni', cor='risco', lista_cores=cores_risco, dados_hover='ocorrencias', nome_hover='name_muni', lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Risco de {tipologia_selecionada}')
+    titulo_mapa = f'Risco de {tipologia_selecionada} ({ano_inicial} - {ano_final})'
+    if metrica_mapa == 'Período de retorno':
+        if tipologia_filtro is None:
+            retornos = calcula_periodos_retorno(indice_anos, ano_inicial, ano_final, por=('ibge',), uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)
+        else:
+            retornos = calcula_periodos_retorno(indice_anos, ano_inicial, ano_final, uf=ufs_selecionadas)
+            retornos = retornos[retornos.descricao_tipologia == tipologia_filtro]
+        mapa_retornos = merge_muni.merge(retornos.drop_duplicates('ibge'), how='left', left_on='code_muni', right_on='ibge')
+        mapa_retornos = mapa_retornos.fillna({'taxa_anual': 0.0, 'prob_anual': 0.0, 'periodo_retorno': np.inf, 'classe_retorno': 'Acima de 25 anos'})
+        titulo_mapa = f'Período de Retorno de {tipologia_selecionada} ({ano_inicial} - {ano_final})'
+        fig_mapa = cria_mapa(mapa_retornos, malha_mun_estados, locais='code_muni', cor='classe_retorno', lista_cores=cores_retorno, dados_hover=['taxa_anual', 'prob_anual'], nome_hover='name_muni', lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Período de Retorno de {tipologia_selecionada}', bordas=uf_selecionado != BRASIL)
+    elif metrica_mapa in ('Tendência (Mann-Kendall)', 'Anomalia do último ano (z-score)'):
+        if tipologia_filtro is None:
+            tendencias = calcula_tendencias(indice_anos, ano_inicial, ano_final, por=('ibge',), uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)
+        else:
+            tendencias = calcula_tendencias(indice_anos, ano_inicial, ano_final, uf=ufs_selecionadas)
+            tendencias = tendencias[tendencias.descricao_tipologia == tipologia_filtro]
+        mapa_tendencias = merge_muni.merge(tendencias.drop_duplicates('ibge'), how='left', left_on='code_muni', right_on='ibge')
+        mapa_tendencias = mapa_tendencias.fillna({'tendencia': 'Sem Tendência', 'declive': 0.0, 'p_valor': 1.0, 'anomalia': 0.0})
+        if metrica_mapa == 'Tendência (Mann-Kendall)':
+            titulo_mapa = f'Tendência de {tipologia_selecionada} ({ano_inicial} - {ano_final})'
+            fig_mapa = cria_mapa(mapa_tendencias, malha_mun_estados, locais='code_muni', cor='tendencia', lista_cores=cores_tendencia, dados_hover=['declive', 'p_valor'], nome_hover='name_muni', lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Tendência de {tipologia_selecionada}', bordas=uf_selecionado != BRASIL)
+        else:
+            titulo_mapa = f'Anomalia de {tipologia_selecionada} em {ano_final}'
+            fig_mapa = cria_mapa(mapa_tendencias, malha_mun_estados, locais='code_muni', cor='anomalia', tons='RdBu_r', tons_midpoint=0, min_max=[-3, 3], dados_hover=['anomalia'], nome_hover='name_muni', lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Anomalia de {tipologia_selecionada}', bordas=uf_selecionado != BRASIL)
+    elif animar_mapas:
+        ocorrencias_anuais = agrega_anos(indice_anos, ano_inicial, ano_final, por=['ibge'], anual=True, **filtros_atlas)
+        rotulos_risco, valores_risco = quadros_risco(ocorrencias_anuais, merge_muni.code_muni, anos_animacao)
+        fig_mapa = cria_mapa_animado(merge_muni.code_muni, malha_mun_estados, anos_animacao, rotulos_risco, valores_risco, cores_risco, nomes=merge_muni.name_muni, lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Risco de {tipologia_selecionada}', bordas=uf_selecionado != BRASIL)
+    else:
+        fig_mapa = cria_mapa(classificacao_ocorrencias, malha_mun_estados, locais='code_muni', cor='risco', lista_cores=cores_risco, dados_hover='ocorrencias', nome_hover='name_muni', lat=lat, lon=lon, zoom=zoom_uf, titulo_legenda=f'Risco de {tipologia_selecionada}', bordas=uf_selecionado != BRASIL)
     # fig_mapa = cria_mapa(classificacao_ocorrencias, malha_mun_estados, locais='code_muni', cor='ocorrencias', tons=list(cores_risco.values()), dados_hover='ocorrencias', nome_hover='name_muni', lat=lat, lon=lon, zoom=5, titulo_legenda=f'Risco de {tipologia_selecionada}')
     # col_mapa.divider()
     # col_mapa.title(" ")
     # col_mapa.title(" ")
-    col_mapa2.header(f'Risco de {tipologia_selecionada} ({ano_inicial} - {ano_final})')
+    col_mapa2.header(titulo_mapa)
     col_mapa2.plotly_chart(fig_mapa, use_container_width=True)
 
 
@@ -444,8 +453,8 @@ with tabs[0]:
     met1, met2 = col_dados2.columns([1, 1])
     met3, met4 = col_dados2.columns([1, 1])
 
-    met1.metric('Total de Ocorrências', len(dados_atlas_query))
-    med_anual = dados_atlas_query.groupby('ano').size().mean().astype(int) if dados_atlas_query.groupby('ano').size().any() else 0
+    met1.metric('Total de Ocorrências', int(ocorrencias_por_ano.ocorrencias.sum()))
+    med_anual = int(ocorrencias_por_ano.ocorrencias.mean()) if len(ocorrencias_por_ano) > 0 else 0
     met2.metric('Média de Ocorrências por Ano', med_anual)
     muni_ocorr = math.ceil(len(classificacao_ocorrencias.query("ocorrencias > 0")) / len(classificacao_ocorrencias) * 100)
     met3.metric('% dos Municípios com no *mínimo* Uma Ocorrência', f'{muni_ocorr}%')
@@ -478,12 +487,8 @@ with tabs[0]:
 
 
     # LINEPLOT
-    line_query = dados_atlas.iloc[:62273].query("uf == @uf_selecionado")
-    if tipologia_selecionada != tipol_name:
-        line_query = line_query.query("descricao_tipologia == @tipologia_selecionada")
-
     cols_danos = ['agricultura', 'pecuaria', 'industria']  # 'total_danos_materiais'
-    soma_danos = line_query.groupby(['ano'], as_index=False)[cols_danos].sum()
+    soma_danos = agrega_anos(indice_anos, anos[0], anos[-1], anual=True, uf=ufs_selecionadas, descricao_tipologia=tipologia_filtro)[['ano'] + cols_danos]
     st.header(f'Danos causados por *{tipologia_selecionada}* em *{uf_selecionado} de 1991 a 2022*')
 
     fig_line = px.line(
@@ -561,13 +566,13 @@ with tabs[0]:
     pivot_hm = heatmap_query.pivot_table(index='ano', columns='uf', aggfunc='size', fill_value=0)
     pivot_hm = pivot_hm.reindex(columns=dados_atlas.uf.unique()[:-1], fill_value=0)
     pivot_hm = pivot_hm.reindex(index=anos, fill_value=0).transpose()
-    fig_hm = px.imshow(
+    fig_hm = compacta_figura(px.imshow(
         pivot_hm,
         labels=dict(x="Ano", y="Estado (UF)", color="Total ocorrências"),
         x=pivot_hm.columns,
         y=pivot_hm.index,
         color_continuous_scale=cor_hm,
-    )
+    ))
     fig_hm.update_layout(
         yaxis_nticks=len(pivot_hm),
         height=700
@@ -576,529 +581,922 @@ with tabs[0]:
     st.plotly_chart(fig_hm, use_container_width=True)
 
 
+@st.fragment
+def tabela_municipios_psr(psrG_muni, col_order, tabela_cols, titulo, nome_arquivo):
+    # reordenar a tabela refaz só este fragmento
+    # st.divider()
+    tit_tabela, tabela_ordem = st.columns([4, 1])
+    ordem_tabela1 = tabela_ordem.selectbox('Ordenar por', ['Média Taxa de Prêmio', 'Total Sinistros', 'Total Apólices', 'Média de Sinistros por Apólice', 'Média Prod. Segurada'], index=0, key='ordem_psr')
+    ordem_tabela2 = tabela_cols[ordem_tabela1]
+    tit_tabela.header(titulo)
+    # tit_tabela.header(f'Dados dos Municípios com Sinistros de {tipologia_selecionada_psr} ({ano_psr})')
+    st.dataframe(
+        psrG_muni[col_order].sort_values(ordem_tabela2, ascending=False),
+        hide_index=True, 
+        column_config={
+            'municipio': st.column_config.TextColumn('Município'),
+            'descricao_tipologia': st.column_config.TextColumn('Total Sinistros'),
+            'apolices': st.column_config.TextColumn('Total Apólices'),
+            'cultura': st.column_config.TextColumn('Cultura mais Comum'),
+            'seguradora': st.column_config.TextColumn('Seguradora mais Comum'),
+            'prod_segurada': st.column_config.NumberColumn(
+                'Média Prod. Segurada (kg/ha)',
+                format="%.2f",
+            ),
+            'pe_taxa': st.column_config.NumberColumn(
+                'Média Taxa de Prêmio',
+                format="%.2f%%",
+            ),
+            'sin/apol': st.column_config.NumberColumn(
+                'Média de Sinistros por Apólice',
+                format="%.2f",
+            )
+        },
+        height=400,
+        use_container_width=True
+    )
+    st.download_button('Baixar tabela', psrG_muni.to_csv(sep=',', index=False), file_name=nome_arquivo, use_container_width=True)
+    # st.download_button('Baixar tabela', psrG_muni.to_csv(sep=',', index=False), file_name=f'psr_{uf_psr}_{ano_psr}.csv', use_container_width=True)
 
-with tabs[1]:
-    dados_susep = carrega_parquet('susep_agro2.parquet')
-    psr = carrega_parquet('PSR_COMPLETO.parquet')
-    psr.seguradora = psr.seguradora.map(seg)
-    psr.pe_taxa = psr.pe_taxa * 100
+@st.fragment
+def painel_susep(susepQ, top_seguradoras, periodo):
+    # o formulário de seguradoras refaz só o painel da SUSEP
+    secao_susep = st.container()
+    col_susep1, col_susep2 = secao_susep.columns([1, 1])
 
-    tipologias_psr = sorted(psr.descricao_tipologia.unique()[1:].tolist())
+    col_susep1.header('Análise Gráfica dos Valores Financeiros')
+    col_susep2.header('Métricas Financeiras')
 
-    secao1_agro = st.container()
+    col_susep1.caption('Dados da Superintendência de Seguros Privados (SUSEP).')
 
-    # COLUNAS
-    col_mapa_agro1, col_metrics1 = secao1_agro.columns([1, 1], gap='large')
-    col_metrics1.header('Parâmetros de Análise')
-    form_agro = col_metrics1.form('form_agro', border=False, clear_on_submit=False)
-    col_config1, col_config2, col_config3 = form_agro.columns([1, 1, 1])
-    
-    estado_psr = col_config1.selectbox('Estado', estados.keys(), index=17, key='uf_psr')
-    uf_psr = estados[estado_psr]
-    psrQ1 = psr.query("uf == @uf_psr")
-    dt_inicial_psr, dt_final_psr = col_config2.date_input('Data das Apólices', (date(2021, 1, 1), date(2021, 12, 31)), date(2006, 1, 7), date(2021, 12, 31), format="DD/MM/YYYY")
-    # ano_psr = col_config2.selectbox('Ano de Subscrição', sorted(psrQ1.ano.unique().tolist(), reverse=True), index=0, key='ano_psr')
-    psrQ1 = psrQ1.query("data_apolice >= @dt_inicial_psr & data_apolice < @dt_final_psr")
-    # psrQ1 = psrQ1.query("ano == @ano_psr")
+    form_susep = col_susep2.form('form_susep', border=False, clear_on_submit=False)
+    form_susep.caption('As seguradoras estão listadas abaixo por ordem decrescente de prêmios diretos. Se nenhuma seguradora for selecionada, todas serão consideradas.')
 
-    cultura_psr = col_config1.multiselect('Cultura Global', psrQ1.cultura.value_counts().index.tolist(), default=None, placeholder='Selecionar culturas', key='cultura_psr')
-    # cultura_psr = col_config3.selectbox('Cultura Global', ['Todas as Culturas'] + sorted(psrQ1.cultura.unique().tolist()), index=0, key='cultura_psr')
+    susep_seg = form_susep.multiselect('Seguradoras', top_seguradoras, default=None, placeholder='Selecionar seguradoras', key='seguradora_psr')
+    enviar_form_susep = form_susep.form_submit_button('Selecionar Seguradoras')
 
-    enviar_form_agro = form_agro.form_submit_button('Aplicar Parâmetros')
-    
-    # if cultura_psr != 'Todas as Culturas':
-    if len(cultura_psr) > 0:
-        psrQ3 = psrQ1.query("cultura.isin(@cultura_psr)")
-        # print(f'CULTURA: {cultura_psr}')
+    if len(susep_seg) > 0:
+        susepQ2 = susepQ.query("seguradora.isin(@susep_seg)")
     else:
-        psrQ3 = psrQ1
+        susepQ2 = susepQ
 
 
 
-    # METRICAS1
-    lr = psrQ3.groupby(['uf'], as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum()
-    lr['loss_ratio'] = lr.valor_indenizacao / (lr.valor_premio + lr.valor_subvencao)
+    susep_met_1, susep_met_2 = col_susep2.columns([1, 1])
+    susep_met_1.metric('Prêmios Diretos', number_to_human(susepQ2.premio_dir.sum()))
+    susep_met_2.metric('Sinistro Diretos', number_to_human(susepQ2.sin_dir.sum()))
+    susep_met_1.metric('Prêmios Retidos', number_to_human(susepQ2.premio_ret.sum()))
+    susep_met_2.metric('Prêmios Retidos (Líquido)', number_to_human(susepQ2.prem_ret_liq.sum()))
+    susep_met_1.metric('Salvados de Sinistros', number_to_human(susepQ2.salvados.sum()))
+    susep_met_2.metric('Recuperações', number_to_human(susepQ2.recuperacao.sum()))
 
-    # metrica_psr_uf1, metrica_psr_uf2 = col_metrics.columns([1, 1])
-    col_config3.metric('Total de Apólices', psrQ3.num_apolice.nunique())
-    # print(f'LEN APOL: {len(psrQ3.num_apolice)}')
-    # col_config3.metric('Total de Apólices', len(psrQ3.num_apolice))
-    # print(psrQ3.num_apolice.nunique())
-    lr_metric = f'{lr.loss_ratio.multiply(100).astype(int).values[0]}%' if not psrQ3.empty else '0%'
-    col_config3.metric(f'Índice de Sinistralidade', lr_metric)
+    susep_tab1, susep_tab2 = col_susep1.tabs(['Prêmios e Sinsitros', 'Ramos do Seguro Rural'])
 
-    coord_psr = col_config2.selectbox('Encontrar município (zoom)',['-'] + dados_merge.iloc[:-45].query("abbrev_state == @uf_psr").name_muni.unique().tolist(), index=0, key='coord_psr')
+    # susepQ2 já vem do rollup mensal: poucas linhas por mês
+    bar_susep = susepQ2.groupby('mes', as_index=False)[['premio_dir', 'sin_dir']].sum()
+    bar_susep['Mês'] = (bar_susep.mes % 100).astype(str).map(meses)
+    bar_susep['Ano'] = (bar_susep.mes // 100).astype(str)
+    bar_susep['Período'] = bar_susep[['Mês', 'Ano']].agg('-'.join, axis=1)
+    bar_susep = bar_susep.drop(['mes', 'Mês', 'Ano'], axis=1)
+    bar_susep = bar_susep.rename(columns={'premio_dir': 'Prêmios Diretos', 'sin_dir': 'Sinistros Diretos'})
+    susepBar = px.bar(bar_susep, x='Período', y=['Prêmios Diretos', 'Sinistros Diretos'], barmode='group', labels={'value': 'Valor', 'variable': 'Tipo', 'Período': 'Período'})
 
+    susep_tab1.write(f'**Prêmios e Sinistros diretos ({periodo})**')
+    susep_tab1.plotly_chart(susepBar, use_container_width=True)
+    
 
+    with susep_tab2:
+        pizza_susep(susepQ2, periodo)
 
-    zoom_uf_psr = 6
-    if coord_psr == '-':
-        lat_psr, lon_psr = coord_uf.query("abbrev_state == @uf_psr")[['lat', 'lon']].values[0]
-    else:
-        cod_muni_psr = dados_merge.loc[dados_merge.name_muni == coord_psr, 'code_muni'].values[0]
-        # print(cod_muni_psr)
-        lat_psr, lon_psr = coord_muni.query("codarea == @cod_muni_psr")[['lat', 'lon']].values[0]
-        # print(coord_muni.head())
-        zoom_uf_psr = 10
 
+@st.fragment
+def pizza_susep(susepQ2, periodo):
+    # trocar a métrica refaz só a pizza
+    susep_cols = {
+        'premio_dir': 'Prêmios Diretos',
+        'premio_ret': 'Prêmios Retidos',
+        'prem_ret_liq': 'Prêmios Retidos (Líquido)',
+        'sin_dir': 'Sinistros Diretos',
+        'salvados': 'Salvados',
+        'recuperacao': 'Recuperações'
+    }
+    inv_susep_cols = {v: k for k, v in susep_cols.items()}
+    met_selecionada = st.selectbox('Métrica', list(susep_cols.values()))
 
+    st.write(f'**Representatividade dos Tipos de Seguro no valor dos {met_selecionada} ({periodo})**')
+
+    susepPie = susepQ2.groupby(['ramo'])[inv_susep_cols[met_selecionada]].sum()
+    susepPie = px.pie(
+        susepPie,
+        values=inv_susep_cols[met_selecionada],
+        names=susepPie.index
+    )
+    susepPie.update_layout(
+        legend=dict(font=dict(size=16)),
+        legend_title=dict(font=dict(size=14), text='Tipo de Seguro')
+    )
+    st.plotly_chart(susepPie, use_container_width=True)
+
+
+def mostra_instantaneo(aba, local, padrao):
+    # primeira tela com os filtros no padrão: pacote pré-renderizado (instantaneos.py); a primeira
+    # mudança de filtro (ou o botão) passa a aba para o cálculo ao vivo pelo resto da sessão
+    chave = f'ao_vivo_{aba}'
+    if not padrao:
+        st.session_state[chave] = True
+    if st.session_state.get(chave):
+        return False
+    pacote = carrega_instantaneo(aba, local, carrega_assinatura_app())
+    if pacote is None:
+        return False
+    st.button('Refinar filtros', key=f'refinar_{aba}', on_click=st.session_state.__setitem__, args=(chave, True), help='Visão padrão pré-calculada; refinar passa a calcular ao vivo.')
+    components.html(pacote['html'], height=pacote['altura'], scrolling=True)
+    return True
+
+
+def antecipa_selecoes(uf_selecionado, ufs_selecionadas, grupo_desastre_selecionado, ano_inicial, ano_final, uf_psr):
+    # próximos cliques mais comuns: outra tipologia ou métrica na mesma UF (períodos de retorno e
+    # tendências só das UFs selecionadas) e as malhas da UF, da UF da aba Agro e das vizinhas
+    antecipador = carrega_antecipador()
+    indice_anos = carrega_indice_anos('desastres_latam2.parquet')
+    grupo_filtro = None if grupo_desastre_selecionado == 'Todos os Grupos de Desastre' else grupo_desastre_selecionado
+    for funcao in (calcula_periodos_retorno, calcula_tendencias):
+        antecipa(antecipador, (funcao.__name__, ano_inicial, ano_final, tuple(ufs_selecionadas)), funcao, indice_anos, ano_inicial, ano_final, uf=ufs_selecionadas)
+        antecipa(antecipador, (funcao.__name__, ano_inicial, ano_final, tuple(ufs_selecionadas), grupo_filtro), funcao, indice_anos, ano_inicial, ano_final, por=('ibge',), uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)
+    ufs = [uf for uf in (uf_selecionado, uf_psr) if uf != BRASIL]
+    vizinhas = carrega_vizinhos('malha_brasileira.json')
+    for uf in dict.fromkeys(ufs + [v for uf in ufs for v in vizinhas.get(uf, [])]):
+        antecipa(antecipador, ('malha', uf), carrega_malha, uf=uf)
+
+
+def mostra_status_cargas(container):
+    status = status_cargas()
+    container.caption(f'Cache dos carregadores: {status["total_mb"]:.0f} MB privados de {status["limite_mb"]:.0f} MB (OBSERVARIO_CARGAS_MB), mais {status["mapeado_mb"]:.0f} MB mapeados de arquivo (page cache, fora do limite); entradas usadas há mais tempo saem primeiro.')
+    container.dataframe(status['funcoes'], hide_index=True, use_container_width=True, column_config={
+        'mb': st.column_config.NumberColumn('MB privados', format='%.1f'), 'mb_mapeado': st.column_config.NumberColumn('MB mapeados', format='%.1f'), 'taxa_acerto': st.column_config.NumberColumn('Taxa de acerto', format='%.2f')})
+    container.dataframe(status['entradas'], hide_index=True, use_container_width=True, column_config={
+        'mb': st.column_config.NumberColumn('MB privados', format='%.2f'), 'mb_mapeado': st.column_config.NumberColumn('MB mapeados', format='%.2f'), 'segundos': st.column_config.NumberColumn('Carga (s)', format='%.2f'), 'ocioso_s': st.column_config.NumberColumn('Sem uso (s)', format='%.0f')})
+
+
+# STATUS
+# ?status=cache mostra só o estado do cache dos carregadores deste processo, sem carregar os dados
+if st.query_params.get('status') == 'cache':
+    mostra_status_cargas(st)
+    st.stop()
 
-    malha_psr = carrega_malha(uf=uf_psr)
-    merge_muni_psr = dados_merge.iloc[:-45].query("abbrev_state == @uf_psr")
 
-    # MAPA SINISTRALIDADE
-    sin_muni = psrQ3.groupby(['ibge'], as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
-    sin_muni['loss_ratio'] = (sin_muni.valor_indenizacao / (sin_muni.valor_premio + sin_muni.valor_subvencao)) * 100
+# VARIAVEIS
+# carregadas só no cálculo ao vivo de cada aba: a primeira tela com instantâneo não toca nos dados
+# (os carregadores ficam em cache, então repetir a chamada em cada aba é só uma consulta)
+def carrega_variaveis():
+    return (
+        carrega_parquet('desastres_latam2.parquet'),
+        carrega_indice_anos('desastres_latam2.parquet'),
+        carrega_parquet('area2.parquet'),
+        carrega_parquet('coord_uf.parquet'),
+        carrega_parquet('pop_pib_muni.parquet'),
+        carrega_indice_localidades('area2.parquet', 'coord_muni.parquet'),
+    )
+
+# pop_pib_uf = carrega_parquet('pop_pib_latam.parquet')
+# malha_america = carrega_geojson('malha_latam.json')
+# malha_brasil = carrega_geojson('malha_brasileira.json')
 
-    sin_muni_merge = merge_muni_psr.merge(sin_muni, how='left', left_on='code_muni', right_on='ibge')
-    sin_muni_merge.loss_ratio = sin_muni_merge.loss_ratio.fillna(0)
-    # sin_muni_merge.loss_ratio = sin_muni_merge.loss_ratio.fillna(1e-6)
-    sin_muni_merge.ibge = sin_muni_merge.ibge.fillna('-')
-    # sin_muni_lr = classifica_lossratio(sin_muni_merge)
+# dados_susep = carrega_parquet('susep_agro.parquet')
+# psr = carrega_parquet('PSR_COMPLETO.parquet')
+# psr.seguradora = psr.seguradora.map(seg)
+# psr.pe_taxa = psr.pe_taxa * 100
 
-    fig_sinistralidade_muni = cria_mapa(sin_muni_merge, malha_psr, locais='code_muni', cor='loss_ratio', tons='Reds', min_max=[0, 120], dados_hover='loss_ratio', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Índice de Sinistralidade (%)')
-    # fig_sinistralidade_muni = cria_mapa(sin_muni_lr, malha_psr, locais='code_muni', cor='classe_sinistralidade', lista_cores=cores_sinistralidade, dados_hover='loss_ratio', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Índice de Sinistralidade')
 
-    fig_sinistralidade_muni.update_coloraxes(colorbar=dict(title='Índice de Sinistralidade (%)', tickvals=[0, 20, 40, 60, 80, 100], ticktext=['0', '20', '40', '60', '80', '100+'], orientation='h', yanchor='top', y=0.0))
+estados = {
+   'Acre': 'AC',
+    'Alagoas': 'AL',
+    'Amazonas': 'AM',
+    'Amapá': 'AP',
+    'Bahia': 'BA',
+    'Ceará': 'CE',
+    'Distrito Federal': 'DF',
+    'Espírito Santo': 'ES',
+    'Goiás': 'GO',
+    'Maranhão': 'MA',
+    'Minas Gerais': 'MG',
+    'Mato Grosso do Sul': 'MS',
+    'Mato Grosso': 'MT',
+    'Pará': 'PA',
+    'Paraíba': 'PB',
+    'Pernambuco': 'PE',
+    'Paraná': 'PR',
+    'Piauí': 'PI',
+    'Rio de Janeiro': 'RJ',
+    'Rio Grande do Norte': 'RN',
+    'Rondônia': 'RO',
+    'Roraima': 'RR',
+    'Rio Grande do Sul': 'RS',
+    'Santa Catarina': 'SC',
+    'Sergipe': 'SE',
+    'São Paulo': 'SP',
+    'Tocantins': 'TO'
 
-    col_mapa_agro1.header(f'Índice de Sinistralidade por Município')
-    col_mapa_agro1.plotly_chart(fig_sinistralidade_muni, use_container_width=True)
+  
+}
 
 
+BRASIL = 'BR'
+estados_br = {'Brasil inteiro': BRASIL, **estados}
 
-    fig_bar = sp.make_subplots(specs=[[{"secondary_y": True}]])
 
-    bar_data = psrQ3.groupby(['ano', psrQ1.data_apolice.dt.month]).num_apolice.nunique()
-    bar_data = bar_data.reset_index(level=['data_apolice', 'ano'])
-    bar_data.data_apolice = bar_data.data_apolice.astype(str).map(meses)
-    bar_data.ano = bar_data.ano.astype(str)
-    bar_data['Mês'] = bar_data[['data_apolice', 'ano']].agg('-'.join, axis=1)
-    bar_data = bar_data.drop(['ano', 'data_apolice'], axis=1)
+# estados = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+anos = np.arange(1991, 2023)
+anos_latam = np.arange(2000, 2024)
+anos_psr = np.arange(2006, 2022)
+mapa_de_cores = {
+    'Estiagem e Seca': '#EECA3B',
+    'Incêndio Florestal': '#E45756',
+    'Onda de Frio': '#72B7B2',
+    'Onda de Calor e Baixa Umidade': '#F58518',
+    'Enxurradas': '#B279A2',
+    'Inundações': '#0099C6',
+    'Alagamentos': '#72B7B2',
+    'Movimento de Massa': '#9D755D',
+    'Chuvas Intensas': '#4C78A8',
+    'Vendavais e Ciclones': '#54A24B',
+    'Granizo': 'rgb(102, 102, 102)',
+    'Tornado': '#4C78A8',
+    'Onda de Frio': '#72B7B2',
+    'Doenças infecciosas': '#54A24B',
+    'Erosão': '#9D755D',
+    'Outros': '#FF9DA6',
+    'Rompimento/Colapso de barragens': 'rgb(102, 102, 102)',
+    'Sem Dados': '#BAB0AC'
+}
+meses = {
+    '1': 'JAN',
+    '2': 'FEV',
+    '3': 'MAR',
+    '4': 'ABR',
+    '5': 'MAI',
+    '6': 'JUN',
+    '7': 'JUL',
+    '8': 'AGO',
+    '9': 'SET',
+    '10': 'OUT',
+    '11': 'NOV',
+    '12': 'DEZ'
+}
+cores_risco = {
+    'Muito Alto': '#E45756',
+    'Alto': '#F58518',
+    'Moderado': '#EECA3B',
+    'Baixo': '#72B7B2',
+    'Muito Baixo': '#4C78A8'
+}
+cores_tendencia = {
+    'Tendência de Alta': '#E45756',
+    'Sem Tendência': '#BAB0AC',
+    'Tendência de Queda': '#4C78A8'
+}
+cores_retorno = {
+    'Até 2 anos': '#E45756',
+    '2 a 5 anos': '#F58518',
+    '5 a 10 anos': '#EECA3B',
+    '10 a 25 anos': '#72B7B2',
+    'Acima de 25 anos': '#4C78A8'
+}
+metricas_mapa = ['Risco (quintis)', 'Período de retorno', 'Tendência (Mann-Kendall)', 'Anomalia do último ano (z-score)']
+cores_segurado = {
+    'Não Segurada': '#EECA3B',
+    'Menos Sinistros que a Média': '#54A24B',
+    'Mais Sinistros que a Média': '#E45756'
+}
+# cores_segurado = {
+#     'Não Segurada': '#EECA3B',
+#     'Não Apresenta Sinistro': '#54A24B',
+#     'Apresenta Sinistro': '#E45756'
+# }
+cores_sinistralidade = {
+    'Acima de 100%': '#ff0000',
+    'De 80% e 100%': '#ff5232',
+    'De 60% e 80%': '#ff7b5a',
+    'De 40% e 60%': '#ff9e81',
+    'De 20% a 40%': '#ffbfaa',
+    'Abaixo de 20%': '#ffdfd4'
+}
+desastres = {
+    'Hidrológico': ['Alagamentos', 'Chuvas Intensas', 'Enxurradas', 'Inundações', 'Movimento de Massa'],
+    'Climatológico': ['Estiagem e Seca', 'Incêndio Florestal', 'Onda de Calor e Baixa Umidade', 'Onda de Frio'],
+    'Meteorológico': ['Granizo', 'Onda de Frio', 'Tornado', 'Vendavais e Ciclones'],
+    'Outros': ['Doenças infecciosas', 'Erosão', 'Onda de Calor e Baixa Umidade', 'Outros', 'Rompimento/Colapso de barragens']
+}
+idx_select = {
+    'Climatológico': 0,
+    'Hidrológico': 2,
+    'Meteorológico': 3,
+    'Outros': 1
+}
+
+idx_select_br = {
+    'Climatológico': 0,
+    'Hidrológico': 3,
+    'Meteorológico': 3,
+    'Outros': 1
+}
+seg = SEGURADORAS
+
+# COLUNAS
+tabs = st.tabs(['UF do Brasil', 'Agro', 'América Latina', 'Créditos'])
+
+with tabs[0]:
+    secao1_uf = st.container()
+    col_mapa1, col_dados1 = secao1_uf.columns([1, 1], gap='large')
+    col_dados1.header('Parâmetros de Análise')
+    # col_mapa, col_dados = st.columns([1, 1], gap='large')
+    select1, select2 = col_dados1.columns([1, 1])
+
+
+
+    # SELECTBOX
+    uf_selectbox = select1.selectbox('Selecione o estado', list(estados_br.keys()), index=18, key='uf_br')
+    uf_selecionado = estados_br[uf_selectbox]
+    ufs_selecionadas = list(estados.values()) if uf_selecionado == BRASIL else [uf_selecionado]
+    grupo_desastre_selecionado = select2.selectbox('Selecione o grupo de desastre', ['Todos os Grupos de Desastre'] + list(desastres.keys()), index=0)
+    # grupo_desastre_selecionado = select2.selectbox('Selecione o grupo de desastre', list(desastres.keys()), index=0)
+    # ano_inicial, ano_final = col_dados.date_input('Selecione o Período a ser analisado', (date(1991, 1, 7), date(2022, 12, 30)), date(1991, 1, 7), date(2022, 12, 30), format="DD/MM/YYYY")
+    ano_inicial, ano_final = col_dados1.select_slider('Selecione o Intervalo de Anos', anos, value=(anos[0], anos[-1]))
+    animar_mapas = col_dados1.toggle('Animar mapas ano a ano', value=False, key='animar_mapas')
+    anos_animacao = list(range(ano_inicial, ano_final + 1))
 
-    # bar_data = psrQ3.groupby(psrQ3.data_apolice.dt.month, as_index=False).num_apolice.nunique().rename(columns={'num_apolice': 'Apólices'})
-    # print(bar_data.head())
-    # bar_data = bar_data.set_index(['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez'])
-    fig_bar.add_trace(
-        px.bar(bar_data, x='Mês', y='num_apolice', labels={'num_apolice': 'Apólices'}).data[0],
-        secondary_y=False,
-    )
-    # fig_bar.add_trace(
-    #     px.bar(bar_data, x=bar_data.index, y='Apólices', labels={'index': 'Mês', 'Apólices': 'Apólices'}).data[0],
-    #     secondary_y=False,
-    # )
-
-    line_data = psrQ3.groupby(['ano', psrQ1.data_apolice.dt.month])[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
-    line_data = line_data.reset_index(level=['data_apolice', 'ano'])
-    line_data.data_apolice = line_data.data_apolice.astype(str).map(meses)
-    line_data.ano = line_data.ano.astype(str)
-    line_data['Mês'] = line_data[['data_apolice', 'ano']].agg('-'.join, axis=1)
-    line_data = line_data.drop(['ano', 'data_apolice'], axis=1)
-    # line_data = psrQ3.groupby(psrQ3.data_apolice.dt.month, as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
-    line_data['loss_ratio'] = (line_data.valor_indenizacao / (line_data.valor_premio + line_data.valor_subvencao)) * 100
-    fig_bar.add_trace(
-        # go.Line(x=[2, 3, 4], y=[4, 5, 6], name="yaxis2 data"),
-        px.line(line_data, x='Mês', y='loss_ratio', labels={'loss_ratio': 'Índice de Sinistralidade (%)'}, color_discrete_sequence=['#ff0000'], markers=True).data[0],
-        secondary_y=True
-    )
-    # fig_bar.add_trace(
-    #     # go.Line(x=[2, 3, 4], y=[4, 5, 6], name="yaxis2 data"),
-    #     px.line(line_data, x=line_data.index, y='loss_ratio', labels={'index': 'Mês', 'loss_ratio': 'Índice de Sinistralidade (%)'}, color_discrete_sequence=['#ff0000'], markers=True).data[0],
-    #     secondary_y=True
-    # )
-
-    fig_bar.update_layout(
-        title_text="Número de Apólices Contratas e Índice de Sinistralidade por Mês",
-        # xaxis = dict(
-        #     tickmode = 'array',
-        #     tickvals = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11],
-        #     ticktext = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez']
-        # )
-    )
 
-    # Set x-axis title
-    fig_bar.update_xaxes(title_text="Mês")
 
-    # Set y-axes titles
-    fig_bar.update_yaxes(title_text="Número de Apólices", secondary_y=False)
-    fig_bar.update_yaxes(title_text="Índice de Sinistralidade (%)", secondary_y=True, minor=dict(dtick=1))
+    # INSTANTÂNEO
+    padrao_uf = grupo_desastre_selecionado == 'Todos os Grupos de Desastre' and (ano_inicial, ano_final) == (anos[0], anos[-1]) and not animar_mapas
+    instantaneo_uf = mostra_instantaneo('uf', uf_selectbox, padrao_uf)
+    if not instantaneo_uf:
+        dados_atlas, indice_anos, dados_merge, coord_uf, pop_pib, indice_localidades = carrega_variaveis()
 
-    col_metrics1.plotly_chart(fig_bar)
-    col_metrics1.caption("Os meses que não aparecem no gráfico acima não possuem apólices subscritas ou sinistros reportados.")
 
 
+        # BUBBLE PLOT
+        grupo_filtro = None if grupo_desastre_selecionado == 'Todos os Grupos de Desastre' else grupo_desastre_selecionado
+        atlas_year = agrega_anos(indice_anos, ano_inicial, ano_final, por=['descricao_tipologia'], anual=True, uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)[['ano', 'descricao_tipologia', 'ocorrencias']]
+        # atlas_year = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final").groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
 
-    # # BUBBLE PLOT
-    # psr_year = psr.query("uf == @uf_psr")
-    # psr_year_grouped = psr_year.drop(psr_year.query("descricao_tipologia == '-'").index).groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
-    # # print(psr_year_grouped.head())
 
 
+        fig_grupo_desastre = px.scatter(atlas_year, x="ano", y='descricao_tipologia', size='ocorrencias', 
+            color='descricao_tipologia', size_max=50, color_discrete_map=mapa_de_cores,
+            labels={
+                "ano": "Ano", 
+                "descricao_tipologia": "Desastre"
+            }
+        )
+        fig_grupo_desastre.update_layout(showlegend=False, legend_orientation='h', margin={"r":0,"t":0,"l":0,"b":0})
+        fig_grupo_desastre.update_xaxes(showgrid=True)
+        # col_dados.caption('Quanto maior o círculo, maior o número de ocorrências do desastre')
+        col_dados1.plotly_chart(fig_grupo_desastre)
+        # col_dados.title(" ")
+
+
+        # MUNICÍPIO (o zoom vale para os dois mapas)
+        busca_col, mun_col = col_dados1.columns([1, 1])
+        if uf_selecionado == BRASIL:
+            busca_muni = busca_col.text_input('Buscar município', key='busca_muni')
+            opcoes_muni = busca_municipios(indice_localidades, busca_muni, limite=20)
+        else:
+            opcoes_muni = municipios_uf(indice_localidades, uf_selecionado)
+        coord_municipio = mun_col.selectbox('Encontrar município (zoom)', ['-'] + opcoes_muni, index=0, format_func=lambda codigo: nome_municipio(indice_localidades, codigo, com_uf=uf_selecionado == BRASIL))
+
+
+
+        # MALHA
+        malha_mun_estados = geometria(f'municipios_{uf_selecionado}', carrega_malha_nacional() if uf_selecionado == BRASIL else carrega_malha(uf=uf_selecionado))
+        zoom_uf = 5
+        if coord_municipio == '-' and uf_selecionado == BRASIL:
+            lat, lon = -14, -53
+            zoom_uf = 3
+        elif coord_municipio == '-':
+            lat, lon = coord_uf.query("abbrev_state == @uf_selecionado")[['lat', 'lon']].values[0]
+        else:
+            lat, lon = coordenadas_municipio(indice_localidades, coord_municipio)
+            zoom_uf = 10
+
+
+
+        # MAPA DE DESASTRES COMUNS
+        tipologias_mais_comuns_por_muni = agrega_anos(indice_anos, ano_inicial, ano_final, por=['ibge', 'descricao_tipologia'], uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)[['ibge', 'descricao_tipologia', 'ocorrencias']].sort_values('ocorrencias', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'descricao_tipologia': 'desastre_mais_comum'})
+        # tipologias_mais_comuns_por_muni = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & uf == @uf_selecionado & ano >= @ano_inicial & ano <= @ano_final").groupby(['ibge', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'desastre_mais_comum'})
+
+        merge_muni_2 = dados_merge.query("abbrev_state in @ufs_selecionadas").groupby(['code_muni', 'name_muni'], as_index=False).size().drop('size', axis=1)
+        tipol_merge = merge_muni_2.merge(tipologias_mais_comuns_por_muni, how='left', left_on='code_muni', right_on='ibge').drop('ibge', axis=1)
+        tipol_merge.loc[np.isnan(tipol_merge["ocorrencias"]), 'ocorrencias'] = 0
+        tipol_merge.desastre_mais_comum = tipol_merge.desastre_mais_comum.fillna('Sem Dados')
+        col_mapa1.header(f'Desastre mais comum por Município')
+        # col_mapa1.header(f'Desastre mais comum por Município ({ano_inicial} - {ano_final})')
+        if animar_mapas:
+            tipol_com_muni = agrega_anos(indice_anos, ano_inicial, ano_final, por=['ibge', 'descricao_tipologia'], anual=True, uf=ufs_selecionadas, grupo_de_desastre=grupo_filtro)
+            rotulos_desastre, valores_desastre = quadros_desastre(tipol_com_muni, merge_muni_2.code_muni, anos_animacao)
+            fig_desastre = cria_mapa_animado(merge_muni_2.code_muni, malha_mun_estados, anos_animacao, rotulos_desastre, valores_desastre, mapa_de_cores, nomes=merge_muni_2.name_muni, zoom=zoom_uf, lat=lat, lon=lon, titulo_legenda='Desastre mais comum', bordas=uf_selecionado != BRASIL)
+        else:
+            fig_desastre = cria_mapa(tipol_merge, malha_mun_estados, locais='code_muni', cor='desastre_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_muni', dados_hover=['desastre_mais_comum', 'ocorrencias'], zoom=zoom_uf, lat=lat, lon=lon, titulo_legenda='Desastre mais comum', bordas=uf_selecionado != BRASIL)
+        col_mapa1.plotly_chart(fig_desastre, use_container_width=True)
 
-    # fig_psr_year = px.scatter(psr_year_grouped, x="ano", y='descricao_tipologia', size='ocorrencias', 
-    #     color='descricao_tipologia', size_max=50, color_discrete_map=mapa_de_cores,
-    #     labels={
-    #         "ano": "Ano de Subscrição", 
-    #         "descricao_tipologia": "Evento Climático"
-    #     }
-    # )
-    # fig_psr_year.update_layout(showlegend=False, legend_orientation='h', margin={"r":0,"t":0,"l":0,"b":0})
-    # fig_psr_year.update_xaxes(showgrid=True)
-    # # col_metrics.caption('Sinistros por evento climático ao longo dos anos.')
-    # col_metrics.plotly_chart(fig_psr_year)
-    # col_metrics.text(" ")
-    # col_metrics.text(" ")
 
-    susepQ = dados_susep.query("uf == @uf_psr & data >= @dt_inicial_psr & data < @dt_final_psr")
-    top_seguradoras = susepQ.groupby(['seguradora'], as_index=False)['premio_dir'].sum().sort_values('premio_dir', ascending=False).seguradora.tolist()
+
+        # REFINAR PARÂMETROS
+        secao_risco_uf(dados_atlas, indice_anos, dados_merge, pop_pib, uf_selecionado, ufs_selecionadas, grupo_desastre_selecionado, ano_inicial, ano_final, animar_mapas, malha_mun_estados, lat, lon, zoom_uf)
+
+
+
+with tabs[1]:
+    culturas_psr = carrega_culturas_psr('PSR_COMPLETO.parquet')
+
+    secao1_agro = st.container()
+
+    # COLUNAS
+    col_mapa_agro1, col_metrics1 = secao1_agro.columns([1, 1], gap='large')
+    col_metrics1.header('Parâmetros de Análise')
+    form_agro = col_metrics1.form('form_agro', border=False, clear_on_submit=False)
+    col_config1, col_config2, col_config3 = form_agro.columns([1, 1, 1])
     
+    estado_psr = col_config1.selectbox('Estado', estados.keys(), index=17, key='uf_psr')
+    uf_psr = estados[estado_psr]
+    dt_inicial_psr, dt_final_psr = col_config2.date_input('Data das Apólices', (date(2021, 1, 1), date(2021, 12, 31)), date(2006, 1, 7), date(2021, 12, 31), format="DD/MM/YYYY")
+    # ano_psr = col_config2.selectbox('Ano de Subscrição', sorted(psrQ1.ano.unique().tolist(), reverse=True), index=0, key='ano_psr')
+    # psrQ1 = psrQ1.query("ano == @ano_psr")
 
+    inicio_psr, fim_psr = pd.Timestamp(dt_inicial_psr), pd.Timestamp(dt_final_psr)
+    opcoes_cultura = culturas_psr.query("uf == @uf_psr & data_apolice >= @inicio_psr & data_apolice < @fim_psr").groupby('cultura', observed=True).linhas.sum().sort_values(ascending=False, kind='stable')
+    cultura_psr = col_config1.multiselect('Cultura Global', opcoes_cultura.index.tolist(), default=None, placeholder='Selecionar culturas', key='cultura_psr')
+    # cultura_psr = col_config3.selectbox('Cultura Global', ['Todas as Culturas'] + sorted(psrQ1.cultura.unique().tolist()), index=0, key='cultura_psr')
 
-    secao2_agro = st.container()
-    col_mapa_agro2, col_metrics2 = secao2_agro.columns([1, 1], gap='large')
+    enviar_form_agro = form_agro.form_submit_button('Aplicar Parâmetros')
 
-    col_metrics2.header(f'Sinistros e Reportes de Desastres em {meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} - {meses[str(dt_final_psr.month)]} {dt_final_psr.year}')
-    # col_metrics2.header(f'Sinistros e Reportes de Desastres em {ano_psr}')
-    tipologia_selecionada_psr = col_metrics2.selectbox('Evento Climático', ['Todos os Eventos'] + tipologias_psr, index=0, key='tipol_psr')
 
 
+    # INSTANTÂNEO
+    padrao_agro = (dt_inicial_psr, dt_final_psr) == (date(2021, 1, 1), date(2021, 12, 31)) and len(cultura_psr) == 0
+    if not mostra_instantaneo('agro', estado_psr, padrao_agro):
+        dados_atlas, indice_anos, dados_merge, coord_uf, pop_pib, indice_localidades = carrega_variaveis()
+        indice_susep = carrega_indice_susep('susep_agro2.parquet')
+        # o parquet da ingestao.py já vem com os nomes curtos; os antigos ainda trazem a razão social
+        psr = carrega_psr('PSR_COMPLETO.parquet', seg | {curto: curto for curto in seg.values()})
+        indice_apolices = carrega_indice_apolices('PSR_COMPLETO.parquet')
+        tipologias_psr = sorted(psr.descricao_tipologia.unique()[1:].tolist())
 
-    # QUERIES
-    psrQ2 = psrQ1.query("descricao_tipologia != '-'")
-    if tipologia_selecionada_psr != 'Todos os Eventos':
-        psrQ2 = psrQ1.query("descricao_tipologia == @tipologia_selecionada_psr")
+        psrQ1 = psr.query("uf == @uf_psr")
+        psrQ1 = psrQ1.query("data_apolice >= @dt_inicial_psr & data_apolice < @dt_final_psr")
+        # if cultura_psr != 'Todas as Culturas':
+        if len(cultura_psr) > 0:
+            psrQ3 = psrQ1.query("cultura.isin(@cultura_psr)")
+            # print(f'CULTURA: {cultura_psr}')
+        else:
+            psrQ3 = psrQ1
 
-    if len(cultura_psr) > 0:
-        psrQ2_2 = psrQ2.query("cultura.isin(@cultura_psr)")
-    else:
-        psrQ2_2 = psrQ2
 
-    # else:
-    #     psrQ2 = psrQ1.query("descricao_tipologia != '-'")
 
+        # METRICAS1
+        lr = psrQ3.groupby(['uf'], as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum()
+        lr['loss_ratio'] = lr.valor_indenizacao / (lr.valor_premio + lr.valor_subvencao)
 
+        # metrica_psr_uf1, metrica_psr_uf2 = col_metrics.columns([1, 1])
+        # total nacional do período pelos sketches HyperLogLog; só as linhas dos meses de borda, achadas pelo índice
+        psr_periodo = psr[['data_apolice', 'cod_apolice']].iloc[linhas_parciais(indice_apolices, dt_inicial_psr, dt_final_psr)].query("data_apolice >= @dt_inicial_psr & data_apolice < @dt_final_psr")
+        total_brasil = conta_apolices(indice_apolices, psr_periodo, dt_inicial_psr, dt_final_psr, aproximado=True)
+        col_config3.metric('Total de Apólices', conta_apolices(indice_apolices, psrQ3, dt_inicial_psr, dt_final_psr, uf=uf_psr, culturas=cultura_psr), help=f'Brasil no período, todas as culturas: ~{total_brasil:,}'.replace(',', '.'))
+        # print(f'LEN APOL: {len(psrQ3.num_apolice)}')
+        # col_config3.metric('Total de Apólices', len(psrQ3.num_apolice))
+        # print(psrQ3.num_apolice.nunique())
+        lr_metric = f'{lr.loss_ratio.multiply(100).astype(int).values[0]}%' if not psrQ3.empty else '0%'
+        col_config3.metric(f'Índice de Sinistralidade', lr_metric)
 
-    # AREA SEGURADA
-    sin = psrQ2_2.groupby(['ibge'], as_index=False).size()
-    sin_merge = merge_muni_psr.merge(sin, how='left', left_on='code_muni', right_on='ibge').rename(columns={'size': 'sinistros'})
-    sin_merge.sinistros = sin_merge.sinistros.fillna(0)
-    sin_merge.ibge = sin_merge.ibge.fillna('-')
-    sin_quant = int(sin_merge['sinistros'].mean()) if len(sin) > 0 else 0
-    munis_sinistrados = sin_merge.query("sinistros > @sin_quant").ibge
-    # print(sin_quant)
-    sin_segurado = classifica_segurado(sin_merge, merge_muni_psr.code_muni, psrQ1.ibge, munis_sinistrados)
-    # sin_segurado = classifica_segurado(sin_merge, merge_muni_psr.code_muni, psrQ1.ibge, psrQ2.ibge)
+        coord_psr = col_config2.selectbox('Encontrar município (zoom)', ['-'] + municipios_uf(indice_localidades, uf_psr), index=0, format_func=lambda codigo: nome_municipio(indice_localidades, codigo), key='coord_psr')
 
-    sin_fig = cria_mapa(sin_segurado, malha_psr, locais='code_muni', cor='seg', lista_cores=cores_segurado, dados_hover='sinistros', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Classificação da Área')
 
-    col_mapa_agro2.header(f'Mapa de Áreas Seguradas ({tipologia_selecionada_psr})')
-    col_mapa_agro2.plotly_chart(sin_fig, use_container_width=True)
 
+        zoom_uf_psr = 6
+        if coord_psr == '-':
+            lat_psr, lon_psr = coord_uf.query("abbrev_state == @uf_psr")[['lat', 'lon']].values[0]
+        else:
+            lat_psr, lon_psr = coordenadas_municipio(indice_localidades, coord_psr)
+            zoom_uf_psr = 10
 
 
-    # # SINISTRO COMUM
-    # psrQ1_2 = psrQ1.drop(psrQ1.query("descricao_tipologia == '-'").index)
-    # sin_comum = psrQ1_2.groupby(['ibge', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'evento_mais_comum'})
-    # sin_comum_merge = merge_muni_psr.merge(sin_comum, how='left', left_on='code_muni', right_on='ibge')
-    # sin_comum_merge.loc[np.isnan(sin_comum_merge["ocorrencias"]), 'ocorrencias'] = 0
-    # sin_comum_merge.evento_mais_comum = sin_comum_merge.evento_mais_comum.fillna('Sem Dados')
 
-    # # col_mapa.subheader(f'Desastre mais comum por Município ({ano_inicial} - {ano_final})')
-    # col_mapa_agro.subheader(f'Evento com mais Chamadas de Sinistro por Município ({uf_psr} - {ano_psr})')
-    # col_mapa_agro.plotly_chart(cria_mapa(sin_comum_merge, malha_psr, locais='code_muni', cor='evento_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_muni', dados_hover=['evento_mais_comum', 'ocorrencias'], zoom=zoom_uf_psr, lat=lat_psr, lon=lon_psr, titulo_legenda='Evento mais comum'), use_container_width=True)
+        malha_psr = geometria(f'municipios_{uf_psr}', carrega_malha(uf=uf_psr))
+        merge_muni_psr = dados_merge.iloc[:-45].query("abbrev_state == @uf_psr")
 
+        # MAPA SINISTRALIDADE
+        sin_muni = psrQ3.groupby(['ibge'], as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
+        sin_muni['loss_ratio'] = (sin_muni.valor_indenizacao / (sin_muni.valor_premio + sin_muni.valor_subvencao)) * 100
 
+        sin_muni_merge = merge_muni_psr.merge(sin_muni, how='left', left_on='code_muni', right_on='ibge')
+        sin_muni_merge.loss_ratio = sin_muni_merge.loss_ratio.fillna(0)
+        # sin_muni_merge.loss_ratio = sin_muni_merge.loss_ratio.fillna(1e-6)
+        sin_muni_merge.ibge = sin_muni_merge.ibge.fillna('-')
+        # sin_muni_lr = classifica_lossratio(sin_muni_merge)
 
-    atlas_psr = dados_atlas.query("uf == @uf_psr & data >= @dt_inicial_psr & data < @dt_final_psr")
-    # atlas_psr = dados_atlas.query("uf == @uf_psr & ano == @ano_psr")
-    if tipologia_selecionada_psr != 'Todos os Eventos':
-        atlas_psr = atlas_psr.query("descricao_tipologia == @tipologia_selecionada_psr")
+        fig_sinistralidade_muni = cria_mapa(sin_muni_merge, malha_psr, locais='code_muni', cor='loss_ratio', tons='Reds', min_max=[0, 120], dados_hover='loss_ratio', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Índice de Sinistralidade (%)')
+        # fig_sinistralidade_muni = cria_mapa(sin_muni_lr, malha_psr, locais='code_muni', cor='classe_sinistralidade', lista_cores=cores_sinistralidade, dados_hover='loss_ratio', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Índice de Sinistralidade')
 
-    # METRICAS2
-    col_metrics_col1, col_metrics_col2 = col_metrics2.columns([1, 1])
-    col_metrics_col1.metric(f'Ocorrências Reportadas de {tipologia_selecionada_psr}', len(atlas_psr))
-    col_metrics_col2.metric(f'Sinistros de {tipologia_selecionada_psr}', len(psrQ2_2))
+        fig_sinistralidade_muni.update_coloraxes(colorbar=dict(title='Índice de Sinistralidade (%)', tickvals=[0, 20, 40, 60, 80, 100], ticktext=['0', '20', '40', '60', '80', '100+'], orientation='h', yanchor='top', y=0.0))
 
+        col_mapa_agro1.header(f'Índice de Sinistralidade por Município')
+        col_mapa_agro1.plotly_chart(fig_sinistralidade_muni, use_container_width=True)
 
 
-    # PIE CHART
-    col_metrics2.write(f'**Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
-    # col_metrics2.write(f'**Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {ano_psr})**')
-    psrPie = psrQ3.drop(psrQ3.query("descricao_tipologia == '-'").index).groupby('descricao_tipologia')['valor_indenizacao'].sum()
-    figpie = px.pie(
-        psrPie,
-        values='valor_indenizacao',
-        names=psrPie.index,
-        #title=f'Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {ano_psr})'
-    )
-    figpie.update_layout(
-        legend=dict(font=dict(size=16)),
-        legend_title=dict(font=dict(size=14), text='Evento Climático')
-    )
-    col_metrics2.plotly_chart(figpie, use_container_width=True)
 
+        fig_bar = make_subplots(specs=[[{"secondary_y": True}]])
 
+        bar_data = conta_apolices(indice_apolices, psrQ3, dt_inicial_psr, dt_final_psr, uf=uf_psr, culturas=cultura_psr, por='mes')
+        bar_data.index = pd.MultiIndex.from_arrays([bar_data.index // 100, bar_data.index % 100], names=['ano', 'data_apolice'])
+        bar_data = bar_data.reset_index(level=['data_apolice', 'ano'])
+        bar_data.data_apolice = bar_data.data_apolice.astype(str).map(meses)
+        bar_data.ano = bar_data.ano.astype(str)
+        bar_data['Mês'] = bar_data[['data_apolice', 'ano']].agg('-'.join, axis=1)
+        bar_data = bar_data.drop(['ano', 'data_apolice'], axis=1)
 
-    # secao_susep = st.container()
-    # col_susep1, col_susep2 = secao_susep.columns([1, 1])
+        # bar_data = psrQ3.groupby(psrQ3.data_apolice.dt.month, as_index=False).num_apolice.nunique().rename(columns={'num_apolice': 'Apólices'})
+        # print(bar_data.head())
+        # bar_data = bar_data.set_index(['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez'])
+        fig_bar.add_trace(
+            px.bar(bar_data, x='Mês', y='num_apolice', labels={'num_apolice': 'Apólices'}).data[0],
+            secondary_y=False,
+        )
+        # fig_bar.add_trace(
+        #     px.bar(bar_data, x=bar_data.index, y='Apólices', labels={'index': 'Mês', 'Apólices': 'Apólices'}).data[0],
+        #     secondary_y=False,
+        # )
 
-    # col_susep1.header('Análise Gráfica dos Valores Financeiros')
-    # col_susep2.header('Métricas Financeiras')
+        line_data = psrQ3.groupby(['ano', psrQ1.data_apolice.dt.month])[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
+        line_data = line_data.reset_index(level=['data_apolice', 'ano'])
+        line_data.data_apolice = line_data.data_apolice.astype(str).map(meses)
+        line_data.ano = line_data.ano.astype(str)
+        line_data['Mês'] = line_data[['data_apolice', 'ano']].agg('-'.join, axis=1)
+        line_data = line_data.drop(['ano', 'data_apolice'], axis=1)
+        # line_data = psrQ3.groupby(psrQ3.data_apolice.dt.month, as_index=False)[['valor_premio', 'valor_subvencao', 'valor_indenizacao']].sum().copy()
+        line_data['loss_ratio'] = (line_data.valor_indenizacao / (line_data.valor_premio + line_data.valor_subvencao)) * 100
+        fig_bar.add_trace(
+            # go.Line(x=[2, 3, 4], y=[4, 5, 6], name="yaxis2 data"),
+            px.line(line_data, x='Mês', y='loss_ratio', labels={'loss_ratio': 'Índice de Sinistralidade (%)'}, color_discrete_sequence=['#ff0000'], markers=True).data[0],
+            secondary_y=True
+        )
+        # fig_bar.add_trace(
+        #     # go.Line(x=[2, 3, 4], y=[4, 5, 6], name="yaxis2 data"),
+        #     px.line(line_data, x=line_data.index, y='loss_ratio', labels={'index': 'Mês', 'loss_ratio': 'Índice de Sinistralidade (%)'}, color_discrete_sequence=['#ff0000'], markers=True).data[0],
+        #     secondary_y=True
+        # )
 
-    # col_susep1.caption('Dados da Superintendência de Seguros Privados (SUSEP).')
+        fig_bar.update_layout(
+            title_text="Número de Apólices Contratas e Índice de Sinistralidade por Mês",
+            # xaxis = dict(
+            #     tickmode = 'array',
+            #     tickvals = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11],
+            #     ticktext = ['jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez']
+            # )
+        )
 
-    # form_susep = col_susep2.form('form_susep', border=False, clear_on_submit=False)
-    # form_susep.caption('As seguradoras estão listadas abaixo por ordem decrescente de prêmios diretos. Se nenhuma seguradora for selecionada, todas serão consideradas.')
+        # Set x-axis title
+        fig_bar.update_xaxes(title_text="Mês")
 
-    # susep_seg = form_susep.multiselect('Seguradoras', top_seguradoras, default=None, placeholder='Selecionar seguradoras', key='seguradora_psr')
-    # enviar_form_susep = form_susep.form_submit_button('Selecionar Seguradoras')
+        # Set y-axes titles
+        fig_bar.update_yaxes(title_text="Número de Apólices", secondary_y=False)
+        fig_bar.update_yaxes(title_text="Índice de Sinistralidade (%)", secondary_y=True, minor=dict(dtick=1))
 
-    # if len(susep_seg) > 0:
-    #     susepQ2 = susepQ.query("seguradora.isin(@susep_seg)")
-    # else:
-    #     susepQ2 = susepQ
+        col_metrics1.plotly_chart(fig_bar)
+        col_metrics1.caption("Os meses que não aparecem no gráfico acima não possuem apólices subscritas ou sinistros reportados.")
 
 
 
-    # susep_met_1, susep_met_2 = col_susep2.columns([1, 1])
-    # susep_met_1.metric('Prêmios Diretos', number_to_human(susepQ2.premio_dir.sum()))
-    # susep_met_2.metric('Sinistro Diretos', number_to_human(susepQ2.sin_dir.sum()))
-    # susep_met_1.metric('Prêmios Retidos', number_to_human(susepQ2.premio_ret.sum()))
-    # susep_met_2.metric('Prêmios Retidos (Líquido)', number_to_human(susepQ2.prem_ret_liq.sum()))
-    # susep_met_1.metric('Salvados de Sinistros', number_to_human(susepQ2.salvados.sum()))
-    # susep_met_2.metric('Recuperações', number_to_human(susepQ2.recuperacao.sum()))
+        # # BUBBLE PLOT
+        # psr_year = psr.query("uf == @uf_psr")
+        # psr_year_grouped = psr_year.drop(psr_year.query("descricao_tipologia == '-'").index).groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
+        # # print(psr_year_grouped.head())
 
-    # susep_tab1, susep_tab2 = col_susep1.tabs(['Prêmios e Sinsitros', 'Ramos do Seguro Rural'])
 
-    # bar_susep = susepQ2.groupby([susepQ2.data.dt.year, susepQ2.data.dt.month], as_index=True)[['premio_dir', 'sin_dir']].sum()
-    # bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Ano'})
-    # bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Mês'})
-    # bar_susep.Mês = bar_susep.Mês.astype(str).map(meses)
-    # bar_susep.Ano = bar_susep.Ano.astype(str)
-    # bar_susep['Período'] = bar_susep[['Mês', 'Ano']].agg('-'.join, axis=1)
-    # bar_susep = bar_susep.drop(['Mês', 'Ano'], axis=1)
-    # bar_susep = bar_susep.rename(columns={'premio_dir': 'Prêmios Diretos', 'sin_dir': 'Sinistros Diretos'})
-    # susepBar = px.bar(bar_susep, x='Período', y=['Prêmios Diretos', 'Sinistros Diretos'], barmode='group', labels={'value': 'Valor', 'variable': 'Tipo', 'Período': 'Período'})
 
-    # susep_tab1.write(f'**Prêmios e Sinistros diretos ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
-    # susep_tab1.plotly_chart(susepBar, use_container_width=True)
+        # fig_psr_year = px.scatter(psr_year_grouped, x="ano", y='descricao_tipologia', size='ocorrencias', 
+        #     color='descricao_tipologia', size_max=50, color_discrete_map=mapa_de_cores,
+        #     labels={
+        #         "ano": "Ano de Subscrição", 
+        #         "descricao_tipologia": "Evento Climático"
+        #     }
+        # )
+        # fig_psr_year.update_layout(showlegend=False, legend_orientation='h', margin={"r":0,"t":0,"l":0,"b":0})
+        # fig_psr_year.update_xaxes(showgrid=True)
+        # # col_metrics.caption('Sinistros por evento climático ao longo dos anos.')
+        # col_metrics.plotly_chart(fig_psr_year)
+        # col_metrics.text(" ")
+        # col_metrics.text(" ")
+
+        susepQ, top_seguradoras = recorte_susep(indice_susep, uf_psr, dt_inicial_psr, dt_final_psr)
     
 
-    # susep_cols = {
-    #     'premio_dir': 'Prêmios Diretos',
-    #     'premio_ret': 'Prêmios Retidos',
-    #     'prem_ret_liq': 'Prêmios Retidos (Líquido)',
-    #     'sin_dir': 'Sinistros Diretos',
-    #     'salvados': 'Salvados',
-    #     'recuperacao': 'Recuperações'
-    # }
-    # inv_susep_cols = {v: k for k, v in susep_cols.items()}
-    # met_selecionada = susep_tab2.selectbox('Métrica', list(susep_cols.values()))
-
-    # susep_tab2.write(f'**Representatividade dos Tipos de Seguro no valor dos {met_selecionada} ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
-
-    # susepPie = susepQ2.groupby(['ramo'])[inv_susep_cols[met_selecionada]].sum()
-    # susepPie = px.pie(
-    #     susepPie,
-    #     values=inv_susep_cols[met_selecionada],
-    #     names=susepPie.index
-    # )
-    # susepPie.update_layout(
-    #     legend=dict(font=dict(size=16)),
-    #     legend_title=dict(font=dict(size=14), text='Tipo de Seguro')
-    # )
-    # susep_tab2.plotly_chart(susepPie, use_container_width=True)
 
-   
+        secao2_agro = st.container()
+        col_mapa_agro2, col_metrics2 = secao2_agro.columns([1, 1], gap='large')
 
-    # DATAFRAME
-    if len(psrQ2_2) > 0:
-
-        # print(f'psrQ2_2:\n{psrQ2_2.head()}')
-        psrG_muni = psrQ2_2.groupby('municipio').agg({
-            'descricao_tipologia': 'count',
-            # 'NM_CULTURA_GLOBAL': lambda x: x.mode().iloc[0],
-            'pe_taxa': 'mean',
-            'prod_segurada': 'mean',
-            'seguradora': lambda x: x.mode().iloc[0],
-        }).reset_index()
-        # print(f'psrG_muni:\n{psrG_muni.head()}')
-
-        psrApol_muni = psrQ2_2.groupby(['municipio'], as_index=False).size().merge(psrQ1.groupby(['municipio'], as_index=False)['num_apolice'].nunique(), how='left', on='municipio')
-        psrG_muni['apolices'] = psrApol_muni['num_apolice']
-        psrG_muni['sin/apol'] = (psrApol_muni['size'] / psrApol_muni['num_apolice'])
-
-        psrG_muni = psrQ2_2.groupby(['municipio', 'cultura'], as_index=False)['area_total'].sum().sort_values('area_total', ascending=False).drop_duplicates('municipio', keep='first').merge(psrG_muni, how='right', on='municipio').drop('area_total', axis=1)
-
-        col_order = ['municipio', 'cultura', 'apolices', 'descricao_tipologia', 'sin/apol', 'pe_taxa', 'prod_segurada', 'seguradora']
-        tabela_cols = {
-            'Média Taxa de Prêmio': 'pe_taxa',
-            'Total Sinistros': 'descricao_tipologia',
-            'Total Apólices': 'apolices',
-            'Média de Sinistros por Apólice': 'sin/apol',
-            'Média Prod. Segurada': 'prod_segurada'
-        }
+        col_metrics2.header(f'Sinistros e Reportes de Desastres em {meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} - {meses[str(dt_final_psr.month)]} {dt_final_psr.year}')
+        # col_metrics2.header(f'Sinistros e Reportes de Desastres em {ano_psr}')
+        tipologia_selecionada_psr = col_metrics2.selectbox('Evento Climático', ['Todos os Eventos'] + tipologias_psr, index=0, key='tipol_psr')
+
+
+
+        # QUERIES
+        psrQ2 = psrQ1.query("descricao_tipologia != '-'")
+        if tipologia_selecionada_psr != 'Todos os Eventos':
+            psrQ2 = psrQ1.query("descricao_tipologia == @tipologia_selecionada_psr")
+
+        if len(cultura_psr) > 0:
+            psrQ2_2 = psrQ2.query("cultura.isin(@cultura_psr)")
+        else:
+            psrQ2_2 = psrQ2
+
+        # else:
+        #     psrQ2 = psrQ1.query("descricao_tipologia != '-'")
+
+
+
+        # AREA SEGURADA
+        sin = psrQ2_2.groupby(['ibge'], as_index=False).size()
+        sin_merge = merge_muni_psr.merge(sin, how='left', left_on='code_muni', right_on='ibge').rename(columns={'size': 'sinistros'})
+        sin_merge.sinistros = sin_merge.sinistros.fillna(0)
+        sin_merge.ibge = sin_merge.ibge.fillna('-')
+        sin_quant = int(sin_merge['sinistros'].mean()) if len(sin) > 0 else 0
+        munis_sinistrados = sin_merge.sinistros.gt(sin_quant).to_numpy(dtype=bool)
+        # print(sin_quant)
+        sin_segurado = classifica_segurado(sin_merge, psrQ1.ibge, munis_sinistrados)
+        # sin_segurado = classifica_segurado(sin_merge, merge_muni_psr.code_muni, psrQ1.ibge, psrQ2.ibge)
+
+        sin_fig = cria_mapa(sin_segurado, malha_psr, locais='code_muni', cor='seg', lista_cores=cores_segurado, dados_hover='sinistros', nome_hover='name_muni', lat=lat_psr, lon=lon_psr, zoom=zoom_uf_psr, titulo_legenda=f'Classificação da Área')
+
+        col_mapa_agro2.header(f'Mapa de Áreas Seguradas ({tipologia_selecionada_psr})')
+        col_mapa_agro2.plotly_chart(sin_fig, use_container_width=True)
+
+
+
+        # # SINISTRO COMUM
+        # psrQ1_2 = psrQ1.drop(psrQ1.query("descricao_tipologia == '-'").index)
+        # sin_comum = psrQ1_2.groupby(['ibge', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='ibge', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'evento_mais_comum'})
+        # sin_comum_merge = merge_muni_psr.merge(sin_comum, how='left', left_on='code_muni', right_on='ibge')
+        # sin_comum_merge.loc[np.isnan(sin_comum_merge["ocorrencias"]), 'ocorrencias'] = 0
+        # sin_comum_merge.evento_mais_comum = sin_comum_merge.evento_mais_comum.fillna('Sem Dados')
+
+        # # col_mapa.subheader(f'Desastre mais comum por Município ({ano_inicial} - {ano_final})')
+        # col_mapa_agro.subheader(f'Evento com mais Chamadas de Sinistro por Município ({uf_psr} - {ano_psr})')
+        # col_mapa_agro.plotly_chart(cria_mapa(sin_comum_merge, malha_psr, locais='code_muni', cor='evento_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_muni', dados_hover=['evento_mais_comum', 'ocorrencias'], zoom=zoom_uf_psr, lat=lat_psr, lon=lon_psr, titulo_legenda='Evento mais comum'), use_container_width=True)
+
+
+
+        atlas_psr = dados_atlas.query("uf == @uf_psr & data >= @dt_inicial_psr & data < @dt_final_psr")
+        # atlas_psr = dados_atlas.query("uf == @uf_psr & ano == @ano_psr")
+        if tipologia_selecionada_psr != 'Todos os Eventos':
+            atlas_psr = atlas_psr.query("descricao_tipologia == @tipologia_selecionada_psr")
+
+        # METRICAS2
+        col_metrics_col1, col_metrics_col2 = col_metrics2.columns([1, 1])
+        col_metrics_col1.metric(f'Ocorrências Reportadas de {tipologia_selecionada_psr}', len(atlas_psr))
+        col_metrics_col2.metric(f'Sinistros de {tipologia_selecionada_psr}', len(psrQ2_2))
+
+        # SINISTROS EXPLICADOS
+        janela_psr = col_metrics2.slider('Janela de associação entre sinistro e desastre (± dias)', 0, 365, 90, step=15, key='janela_psr')
+        explicados = calcula_sinistros_explicados(psr, carrega_indice_linha_tempo('desastres_latam2.parquet'), janela_psr)
+        explicados = explicados.query("uf == @uf_psr & data_apolice >= @dt_inicial_psr & data_apolice < @dt_final_psr")
+        if tipologia_selecionada_psr != 'Todos os Eventos':
+            explicados = explicados.query("descricao_tipologia == @tipologia_selecionada_psr")
+        if len(cultura_psr) > 0:
+            explicados = explicados.query("cultura.isin(@cultura_psr)")
+        total_explicados = explicados.explicados.sum()
+        col_metrics2.metric('Sinistros explicados por desastres reportados', f'{total_explicados / max(explicados.sinistros.sum(), 1):.1%}', help='Sinistros com um evento da mesma tipologia reportado no Atlas para o mesmo município dentro da janela em torno da data da apólice.')
 
-        # st.divider()
-        tit_tabela, tabela_ordem = st.columns([4, 1])
-        ordem_tabela1 = tabela_ordem.selectbox('Ordenar por', ['Média Taxa de Prêmio', 'Total Sinistros', 'Total Apólices', 'Média de Sinistros por Apólice', 'Média Prod. Segurada'], index=0, key='ordem_psr')
-        ordem_tabela2 = tabela_cols[ordem_tabela1]
-        tit_tabela.header(f'Dados dos Municípios com Sinistros de {tipologia_selecionada_psr} ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} - {meses[str(dt_final_psr.month)]} {dt_final_psr.year})')
-        # tit_tabela.header(f'Dados dos Municípios com Sinistros de {tipologia_selecionada_psr} ({ano_psr})')
-        st.dataframe(
-            psrG_muni[col_order].sort_values(ordem_tabela2, ascending=False),
-            hide_index=True, 
+        explicados_muni = explicados.groupby(['municipio', 'cultura'], as_index=False, observed=True)[['sinistros', 'explicados']].sum()
+        explicados_muni['taxa_explicada'] = explicados_muni.explicados / explicados_muni.sinistros * 100
+        expander_explicados = col_metrics2.expander('Sinistros explicados por município e cultura')
+        expander_explicados.dataframe(
+            explicados_muni.sort_values('sinistros', ascending=False),
+            hide_index=True,
+            use_container_width=True,
             column_config={
-                'municipio': st.column_config.TextColumn('Município'),
-                'descricao_tipologia': st.column_config.TextColumn('Total Sinistros'),
-                'apolices': st.column_config.TextColumn('Total Apólices'),
-                'cultura': st.column_config.TextColumn('Cultura mais Comum'),
-                'seguradora': st.column_config.TextColumn('Seguradora mais Comum'),
-                'prod_segurada': st.column_config.NumberColumn(
-                    'Média Prod. Segurada (kg/ha)',
-                    format="%.2f",
-                ),
-                'pe_taxa': st.column_config.NumberColumn(
-                    'Média Taxa de Prêmio',
-                    format="%.2f%%",
-                ),
-                'sin/apol': st.column_config.NumberColumn(
-                    'Média de Sinistros por Apólice',
-                    format="%.2f",
-                )
-            },
-            height=400,
-            use_container_width=True
+                'municipio': 'Município',
+                'cultura': 'Cultura',
+                'sinistros': 'Sinistros',
+                'explicados': 'Explicados',
+                'taxa_explicada': st.column_config.NumberColumn('Taxa Explicada (%)', format='%.1f'),
+            }
         )
-        st.download_button('Baixar tabela', psrG_muni.to_csv(sep=',', index=False), file_name=f'psr_{uf_psr}_{meses[str(dt_inicial_psr.month)]}{dt_inicial_psr.year}-{meses[str(dt_final_psr.month)]}{dt_final_psr.year}.csv', use_container_width=True)
-        # st.download_button('Baixar tabela', psrG_muni.to_csv(sep=',', index=False), file_name=f'psr_{uf_psr}_{ano_psr}.csv', use_container_width=True)
-
-
-
-    # HEATMAP
-    st.title(" ")
-    st.title(" ")
-
-    tabs_psr = st.tabs(['Sinistros por Evento Climático', 'Sinistros por Estado'])
-    hm_query_psr = psr.drop(psr.query("descricao_tipologia == '-'").index)
-    if tipologia_selecionada_psr != 'Todos os Eventos':
-        hm_query_psr = psr.query("descricao_tipologia == @tipologia_selecionada_psr")
-
-    with tabs_psr[0]:
-        hm_query_psr_1 = psr.drop(psr.query("descricao_tipologia == '-'").index).query("uf == @uf_selecionado")
-        pivot_hm1_psr = hm_query_psr_1.pivot_table(index='ano', columns='descricao_tipologia', aggfunc='size', fill_value=0)
-        pivot_hm1_psr = pivot_hm1_psr.reindex(index=anos_psr, fill_value=0).transpose()
-        fig_hm1_psr = px.imshow(
-            pivot_hm1_psr,
-            labels=dict(x="Ano", y="Evento Climático", color="Sinistros"),
-            x=pivot_hm1_psr.columns,
-            y=pivot_hm1_psr.index,
-            color_continuous_scale='Greys',
-        )
-        fig_hm1_psr.update_layout(
-            yaxis_nticks=len(pivot_hm1_psr),
-        )
-        st.header(f'Número de Sinistros por Evento Climático de 2006 a 2021')
-        st.plotly_chart(fig_hm1_psr, use_container_width=True)
-
-
-    with tabs_psr[1]:
-        pivot_hm_psr = hm_query_psr.pivot_table(index='ano', columns='uf', aggfunc='size', fill_value=0)
-        # pivot_hm_psr = pivot_hm_psr.reindex(columns=psr.uf.unique(), fill_value=0)
-        pivot_hm_psr = pivot_hm_psr.reindex(index=anos_psr, fill_value=0).transpose()
-        fig_hm_psr = px.imshow(
-            pivot_hm_psr,
-            labels=dict(x="Ano", y="Estado (UF)", color="Total de Sinistro"),
-            x=pivot_hm_psr.columns,
-            y=pivot_hm_psr.index,
-            color_continuous_scale='Greys',
+
+
+
+        # PIE CHART
+        col_metrics2.write(f'**Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
+        # col_metrics2.write(f'**Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {ano_psr})**')
+        psrPie = psrQ3.drop(psrQ3.query("descricao_tipologia == '-'").index).groupby('descricao_tipologia')['valor_indenizacao'].sum()
+        figpie = px.pie(
+            psrPie,
+            values='valor_indenizacao',
+            names=psrPie.index,
+            #title=f'Representatividade dos Eventos Climáticos no Total Indenizado ({uf_psr} - {ano_psr})'
         )
-        fig_hm_psr.update_layout(
-            yaxis_nticks=len(pivot_hm_psr),
-            height=700
+        figpie.update_layout(
+            legend=dict(font=dict(size=16)),
+            legend_title=dict(font=dict(size=14), text='Evento Climático')
         )
-        st.header(f'Sinistros de *{tipologia_selecionada_psr}* por estado de 2006 a 2021')
-        st.caption('Apenas os estados com pelo menos um sinistro serão exibidos')
-        st.plotly_chart(fig_hm_psr, use_container_width=True)
+        col_metrics2.plotly_chart(figpie, use_container_width=True)
 
 
 
-    secao_susep = st.container()
-    col_susep1, col_susep2 = secao_susep.columns([1, 1])
+        # secao_susep = st.container()
+        # col_susep1, col_susep2 = secao_susep.columns([1, 1])
 
-    col_susep1.header('Análise Gráfica dos Valores Financeiros')
-    col_susep2.header('Métricas Financeiras')
+        # col_susep1.header('Análise Gráfica dos Valores Financeiros')
+        # col_susep2.header('Métricas Financeiras')
 
-    col_susep1.caption('Dados da Superintendência de Seguros Privados (SUSEP).')
+        # col_susep1.caption('Dados da Superintendência de Seguros Privados (SUSEP).')
 
-    form_susep = col_susep2.form('form_susep', border=False, clear_on_submit=False)
-    form_susep.caption('As seguradoras estão listadas abaixo por ordem decrescente de prêmios diretos. Se nenhuma seguradora for selecionada, todas serão consideradas.')
+        # form_susep = col_susep2.form('form_susep', border=False, clear_on_submit=False)
+        # form_susep.caption('As seguradoras estão listadas abaixo por ordem decrescente de prêmios diretos. Se nenhuma seguradora for selecionada, todas serão consideradas.')
 
-    susep_seg = form_susep.multiselect('Seguradoras', top_seguradoras, default=None, placeholder='Selecionar seguradoras', key='seguradora_psr')
-    enviar_form_susep = form_susep.form_submit_button('Selecionar Seguradoras')
+        # susep_seg = form_susep.multiselect('Seguradoras', top_seguradoras, default=None, placeholder='Selecionar seguradoras', key='seguradora_psr')
+        # enviar_form_susep = form_susep.form_submit_button('Selecionar Seguradoras')
 
-    if len(susep_seg) > 0:
-        susepQ2 = susepQ.query("seguradora.isin(@susep_seg)")
-    else:
-        susepQ2 = susepQ
+        # if len(susep_seg) > 0:
+        #     susepQ2 = susepQ.query("seguradora.isin(@susep_seg)")
+        # else:
+        #     susepQ2 = susepQ
 
 
 
-    susep_met_1, susep_met_2 = col_susep2.columns([1, 1])
-    susep_met_1.metric('Prêmios Diretos', number_to_human(susepQ2.premio_dir.sum()))
-    susep_met_2.metric('Sinistro Diretos', number_to_human(susepQ2.sin_dir.sum()))
-    susep_met_1.metric('Prêmios Retidos', number_to_human(susepQ2.premio_ret.sum()))
-    susep_met_2.metric('Prêmios Retidos (Líquido)', number_to_human(susepQ2.prem_ret_liq.sum()))
-    susep_met_1.metric('Salvados de Sinistros', number_to_human(susepQ2.salvados.sum()))
-    susep_met_2.metric('Recuperações', number_to_human(susepQ2.recuperacao.sum()))
+        # susep_met_1, susep_met_2 = col_susep2.columns([1, 1])
+        # susep_met_1.metric('Prêmios Diretos', number_to_human(susepQ2.premio_dir.sum()))
+        # susep_met_2.metric('Sinistro Diretos', number_to_human(susepQ2.sin_dir.sum()))
+        # susep_met_1.metric('Prêmios Retidos', number_to_human(susepQ2.premio_ret.sum()))
+        # susep_met_2.metric('Prêmios Retidos (Líquido)', number_to_human(susepQ2.prem_ret_liq.sum()))
+        # susep_met_1.metric('Salvados de Sinistros', number_to_human(susepQ2.salvados.sum()))
+        # susep_met_2.metric('Recuperações', number_to_human(susepQ2.recuperacao.sum()))
 
-    susep_tab1, susep_tab2 = col_susep1.tabs(['Prêmios e Sinsitros', 'Ramos do Seguro Rural'])
+        # susep_tab1, susep_tab2 = col_susep1.tabs(['Prêmios e Sinsitros', 'Ramos do Seguro Rural'])
 
-    bar_susep = susepQ2.groupby([susepQ2.data.dt.year, susepQ2.data.dt.month], as_index=True)[['premio_dir', 'sin_dir']].sum()
-    bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Ano'})
-    bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Mês'})
-    bar_susep.Mês = bar_susep.Mês.astype(str).map(meses)
-    bar_susep.Ano = bar_susep.Ano.astype(str)
-    bar_susep['Período'] = bar_susep[['Mês', 'Ano']].agg('-'.join, axis=1)
-    bar_susep = bar_susep.drop(['Mês', 'Ano'], axis=1)
-    bar_susep = bar_susep.rename(columns={'premio_dir': 'Prêmios Diretos', 'sin_dir': 'Sinistros Diretos'})
-    susepBar = px.bar(bar_susep, x='Período', y=['Prêmios Diretos', 'Sinistros Diretos'], barmode='group', labels={'value': 'Valor', 'variable': 'Tipo', 'Período': 'Período'})
+        # bar_susep = susepQ2.groupby([susepQ2.data.dt.year, susepQ2.data.dt.month], as_index=True)[['premio_dir', 'sin_dir']].sum()
+        # bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Ano'})
+        # bar_susep = bar_susep.reset_index(level=0).rename(columns={'data': 'Mês'})
+        # bar_susep.Mês = bar_susep.Mês.astype(str).map(meses)
+        # bar_susep.Ano = bar_susep.Ano.astype(str)
+        # bar_susep['Período'] = bar_susep[['Mês', 'Ano']].agg('-'.join, axis=1)
+        # bar_susep = bar_susep.drop(['Mês', 'Ano'], axis=1)
+        # bar_susep = bar_susep.rename(columns={'premio_dir': 'Prêmios Diretos', 'sin_dir': 'Sinistros Diretos'})
+        # susepBar = px.bar(bar_susep, x='Período', y=['Prêmios Diretos', 'Sinistros Diretos'], barmode='group', labels={'value': 'Valor', 'variable': 'Tipo', 'Período': 'Período'})
 
-    susep_tab1.write(f'**Prêmios e Sinistros diretos ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
-    susep_tab1.plotly_chart(susepBar, use_container_width=True)
+        # susep_tab1.write(f'**Prêmios e Sinistros diretos ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
+        # susep_tab1.plotly_chart(susepBar, use_container_width=True)
     
 
-    susep_cols = {
-        'premio_dir': 'Prêmios Diretos',
-        'premio_ret': 'Prêmios Retidos',
-        'prem_ret_liq': 'Prêmios Retidos (Líquido)',
-        'sin_dir': 'Sinistros Diretos',
-        'salvados': 'Salvados',
-        'recuperacao': 'Recuperações'
-    }
-    inv_susep_cols = {v: k for k, v in susep_cols.items()}
-    met_selecionada = susep_tab2.selectbox('Métrica', list(susep_cols.values()))
+        # susep_cols = {
+        #     'premio_dir': 'Prêmios Diretos',
+        #     'premio_ret': 'Prêmios Retidos',
+        #     'prem_ret_liq': 'Prêmios Retidos (Líquido)',
+        #     'sin_dir': 'Sinistros Diretos',
+        #     'salvados': 'Salvados',
+        #     'recuperacao': 'Recuperações'
+        # }
+        # inv_susep_cols = {v: k for k, v in susep_cols.items()}
+        # met_selecionada = susep_tab2.selectbox('Métrica', list(susep_cols.values()))
+
+        # susep_tab2.write(f'**Representatividade dos Tipos de Seguro no valor dos {met_selecionada} ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
+
+        # susepPie = susepQ2.groupby(['ramo'])[inv_susep_cols[met_selecionada]].sum()
+        # susepPie = px.pie(
+        #     susepPie,
+        #     values=inv_susep_cols[met_selecionada],
+        #     names=susepPie.index
+        # )
+        # susepPie.update_layout(
+        #     legend=dict(font=dict(size=16)),
+        #     legend_title=dict(font=dict(size=14), text='Tipo de Seguro')
+        # )
+        # susep_tab2.plotly_chart(susepPie, use_container_width=True)
 
-    susep_tab2.write(f'**Representatividade dos Tipos de Seguro no valor dos {met_selecionada} ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year})**')
+   
 
-    susepPie = susepQ2.groupby(['ramo'])[inv_susep_cols[met_selecionada]].sum()
-    susepPie = px.pie(
-        susepPie,
-        values=inv_susep_cols[met_selecionada],
-        names=susepPie.index
-    )
-    susepPie.update_layout(
-        legend=dict(font=dict(size=16)),
-        legend_title=dict(font=dict(size=14), text='Tipo de Seguro')
-    )
-    susep_tab2.plotly_chart(susepPie, use_container_width=True)
+        # DATAFRAME
+        if len(psrQ2_2) > 0:
+
+            # print(f'psrQ2_2:\n{psrQ2_2.head()}')
+            psrG_muni = psrQ2_2.groupby('municipio').agg({
+                'descricao_tipologia': 'count',
+                # 'NM_CULTURA_GLOBAL': lambda x: x.mode().iloc[0],
+                'pe_taxa': 'mean',
+                'prod_segurada': 'mean',
+                'seguradora': lambda x: x.mode().iloc[0],
+            }).reset_index()
+            # print(f'psrG_muni:\n{psrG_muni.head()}')
+
+            apol_muni = conta_apolices(indice_apolices, psrQ1, dt_inicial_psr, dt_final_psr, uf=uf_psr, por='ibge')
+            apol_muni = apol_muni.groupby(apol_muni.index.map(psrQ1.drop_duplicates('ibge').set_index('ibge').municipio)).sum().rename_axis('municipio').reset_index()
+            psrApol_muni = psrQ2_2.groupby(['municipio'], as_index=False).size().merge(apol_muni, how='left', on='municipio')
+            psrG_muni['apolices'] = psrApol_muni['num_apolice']
+            psrG_muni['sin/apol'] = (psrApol_muni['size'] / psrApol_muni['num_apolice'])
+
+            psrG_muni = psrQ2_2.groupby(['municipio', 'cultura'], as_index=False)['area_total'].sum().sort_values('area_total', ascending=False).drop_duplicates('municipio', keep='first').merge(psrG_muni, how='right', on='municipio').drop('area_total', axis=1)
+
+            col_order = ['municipio', 'cultura', 'apolices', 'descricao_tipologia', 'sin/apol', 'pe_taxa', 'prod_segurada', 'seguradora']
+            tabela_cols = {
+                'Média Taxa de Prêmio': 'pe_taxa',
+                'Total Sinistros': 'descricao_tipologia',
+                'Total Apólices': 'apolices',
+                'Média de Sinistros por Apólice': 'sin/apol',
+                'Média Prod. Segurada': 'prod_segurada'
+            }
+
+            tabela_municipios_psr(
+                psrG_muni, col_order, tabela_cols,
+                f'Dados dos Municípios com Sinistros de {tipologia_selecionada_psr} ({meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} - {meses[str(dt_final_psr.month)]} {dt_final_psr.year})',
+                f'psr_{uf_psr}_{meses[str(dt_inicial_psr.month)]}{dt_inicial_psr.year}-{meses[str(dt_final_psr.month)]}{dt_final_psr.year}.csv'
+            )
+
+
+
+        # HEATMAP
+        st.title(" ")
+        st.title(" ")
+
+        tabs_psr = st.tabs(['Sinistros por Evento Climático', 'Sinistros por Estado'])
+        hm_query_psr = psr.drop(psr.query("descricao_tipologia == '-'").index)
+        if tipologia_selecionada_psr != 'Todos os Eventos':
+            hm_query_psr = psr.query("descricao_tipologia == @tipologia_selecionada_psr")
+
+        with tabs_psr[0]:
+            hm_query_psr_1 = psr.drop(psr.query("descricao_tipologia == '-'").index).query("uf in @ufs_selecionadas")
+            pivot_hm1_psr = hm_query_psr_1.pivot_table(index='ano', columns='descricao_tipologia', aggfunc='size', fill_value=0)
+            pivot_hm1_psr = pivot_hm1_psr.reindex(index=anos_psr, fill_value=0).transpose()
+            fig_hm1_psr = compacta_figura(px.imshow(
+                pivot_hm1_psr,
+                labels=dict(x="Ano", y="Evento Climático", color="Sinistros"),
+                x=pivot_hm1_psr.columns,
+                y=pivot_hm1_psr.index,
+                color_continuous_scale='Greys',
+            ))
+            fig_hm1_psr.update_layout(
+                yaxis_nticks=len(pivot_hm1_psr),
+            )
+            st.header(f'Número de Sinistros por Evento Climático de 2006 a 2021')
+            st.plotly_chart(fig_hm1_psr, use_container_width=True)
+
+
+        with tabs_psr[1]:
+            pivot_hm_psr = hm_query_psr.pivot_table(index='ano', columns='uf', aggfunc='size', fill_value=0)
+            # pivot_hm_psr = pivot_hm_psr.reindex(columns=psr.uf.unique(), fill_value=0)
+            pivot_hm_psr = pivot_hm_psr.reindex(index=anos_psr, fill_value=0).transpose()
+            fig_hm_psr = compacta_figura(px.imshow(
+                pivot_hm_psr,
+                labels=dict(x="Ano", y="Estado (UF)", color="Total de Sinistro"),
+                x=pivot_hm_psr.columns,
+                y=pivot_hm_psr.index,
+                color_continuous_scale='Greys',
+            ))
+            fig_hm_psr.update_layout(
+                yaxis_nticks=len(pivot_hm_psr),
+                height=700
+            )
+            st.header(f'Sinistros de *{tipologia_selecionada_psr}* por estado de 2006 a 2021')
+            st.caption('Apenas os estados com pelo menos um sinistro serão exibidos')
+            st.plotly_chart(fig_hm_psr, use_container_width=True)
+
+
+
+        periodo_susep = f'{meses[str(dt_inicial_psr.month)]} {dt_inicial_psr.year} a {meses[str(dt_final_psr.month)]} {dt_final_psr.year}'
+        painel_susep(susepQ, top_seguradoras, periodo_susep)
+
+
+        # SIMULAÇÃO DE PERDAS
+        st.title(" ")
+        st.header(f'Simulação de Perdas da Carteira ({uf_psr})')
+        st.caption('Sinistralidade anual simulada por Monte Carlo a partir da frequência e da severidade históricas dos sinistros de cada município e cultura (2006 a 2021). O recorte segue o estado e as culturas selecionados acima, sempre sobre o histórico completo.')
+        form_sim = st.form('form_simulacao', border=False)
+        col_sim1, col_sim2 = form_sim.columns([1, 1])
+        anos_simulados = col_sim1.select_slider('Anos simulados', [1_000, 10_000, 100_000, 1_000_000], value=100_000, key='anos_simulados')
+        nivel_sim = col_sim2.selectbox('Nível de confiança', [0.95, 0.99], index=1, format_func=lambda n: f'{n:.0%}', key='nivel_sim')
+        enviar_sim = form_sim.form_submit_button('Simular')
+
+        if enviar_sim:
+            with st.spinner('Simulando...'):
+                resumo_sim = simula_perdas(psr, uf_psr, tuple(cultura_psr), anos_simulados)
+            if resumo_sim is None:
+                st.warning('Não há apólices com prêmio no recorte selecionado.')
+            else:
+                met_sim1, met_sim2, met_sim3, met_sim4 = st.columns(4)
+                met_sim1.metric('Sinistralidade média', f'{resumo_sim["media"]:.1f}%')
+                met_sim2.metric(f'VaR {nivel_sim:.0%}', f'{resumo_sim[f"var_{nivel_sim}"]:.1f}%')
+                met_sim3.metric(f'TVaR {nivel_sim:.0%}', f'{resumo_sim[f"tvar_{nivel_sim}"]:.1f}%')
+                met_sim4.metric('Prob. sinistralidade > 100%', f'{resumo_sim["prob_acima_100"]:.1%}')
+                fig_sim = px.bar(resumo_sim['histograma'], x='sinistralidade', y='anos', labels={'sinistralidade': 'Sinistralidade (%)', 'anos': 'Anos simulados'})
+                fig_sim.add_vline(x=resumo_sim[f'var_{nivel_sim}'], line_dash='dash', annotation_text=f'VaR {nivel_sim:.0%}')
+                fig_sim.update_traces(marker_line_width=0)
+                st.plotly_chart(fig_sim, use_container_width=True)
 
 
 
 with tabs[2]:
-    pop_pib_uf = carrega_parquet('pop_pib_latam.parquet')
-    malha_america = carrega_geojson('malha_latam.json')
-    malha_brasil = carrega_geojson('malha_brasileira.json')
-    coord_latam = carrega_parquet('coord_latam3.parquet')
+    # o primeiro bloco (bolhas) fica sempre ao vivo: só o índice por ano e a lista de países antes do instantâneo
+    indice_anos = carrega_indice_anos('desastres_latam2.parquet')
+    dados_merge = carrega_parquet('area2.parquet')
 
     secao1_latam = st.container()
     col_mapa_br1, col_dados_br1 = secao1_latam.columns([1, 1], gap='large')
@@ -1110,13 +1508,8 @@ with tabs[2]:
 
 
 
-    # QUERY
-    dados_atlas_query_br_1 = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado_br & ano >= @ano_inicial_br & ano <= @ano_final_br")
-    
-
-
     # BUBBLE PLOT
-    atlas_year_br = dados_atlas_query_br_1.groupby(['ano', 'descricao_tipologia'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
+    atlas_year_br = agrega_anos(indice_anos, ano_inicial_br, ano_final_br, por=['descricao_tipologia'], anual=True, grupo_de_desastre=grupo_desastre_selecionado_br)[['ano', 'descricao_tipologia', 'ocorrencias']]
 
 
 
@@ -1145,156 +1538,180 @@ with tabs[2]:
 
     pais_selecionado = col_pais.selectbox('Selecione o país', sorted(dados_merge.iloc[-45:].name_state.unique()), index=7, key='pais_br')
     iso = dados_merge.loc[dados_merge.name_state == pais_selecionado, 'code_state'].values[0]
-    malha_pais_selecionado = malha_brasil if iso == 'BRA' else filtra_geojson(malha_america, iso)
     
     tipologia_selecionada_br = col_desastre.selectbox('Selecione a tipologia do desastre', desastres[grupo_desastre_selecionado_br], index=idx_select_br[grupo_desastre_selecionado_br], key='tipol_br')
+    mostrar_eventos = col_pais.toggle('Mostrar eventos georreferenciados', value=False, key='eventos_br')
+    risco_subnacional = col_pais.toggle('Risco por unidade subnacional', value=False, key='subnacional_br', help='Conta os eventos georreferenciados dentro de cada unidade da malha subnacional.')
+    zoom_eventos = col_desastre.select_slider('Zoom dos eventos', list(range(1, 9)), value=4, key='zoom_eventos_br', disabled=not mostrar_eventos)
 
 
 
-    # MAPA DE DESASTRES COMUNS
-    tipologias_mais_comuns_por_estado = dados_atlas_query_br_1.groupby(['pais', 'descricao_tipologia'], as_index=False).size().sort_values('size', ascending=False).drop_duplicates(subset='pais', keep='first').rename(columns={'size': 'ocorrencias', 'descricao_tipologia': 'desastre_mais_comum'})
-    tipol_br = dados_merge.groupby(['code_state', 'name_state'], as_index=False).size().drop('size', axis=1)
-    tipol_merge_br = tipol_br.merge(tipologias_mais_comuns_por_estado, how='left', left_on='name_state', right_on='pais').drop('pais', axis=1)
-    tipol_merge_br.loc[np.isnan(tipol_merge_br['ocorrencias']), 'ocorrencias'] = 0
-    tipol_merge_br.desastre_mais_comum = tipol_merge_br.desastre_mais_comum.fillna('Sem Dados')
-    col_mapa_br1.header(f'Desastre mais comum por País')
-    # col_mapa_br1.header(f'Desastres mais comuns por País ({ano_inicial_br} - {ano_final_br})')
-    col_mapa_br1.plotly_chart(cria_mapa(tipol_merge_br, malha_america, locais='code_state', cor='desastre_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_state', dados_hover=['desastre_mais_comum', 'ocorrencias'], zoom=1, titulo_legenda='Desastre mais comum'), use_container_width=True)
+    # INSTANTÂNEO
+    padrao_latam = grupo_desastre_selecionado_br == list(desastres.keys())[0] and (ano_inicial_br, ano_final_br) == (anos_latam[0], anos_latam[-1]) and tipologia_selecionada_br == desastres[grupo_desastre_selecionado_br][idx_select_br[grupo_desastre_selecionado_br]] and not mostrar_eventos and not risco_subnacional
+    if not mostra_instantaneo('latam', pais_selecionado, padrao_latam):
+        dados_atlas, indice_anos, dados_merge, coord_uf, pop_pib, indice_localidades = carrega_variaveis()
+        pop_pib_uf = carrega_parquet('pop_pib_latam.parquet')
+        malha_america = carrega_geojson('malha_latam.json')
+        malha_brasil = carrega_geojson('malha_brasileira.json')
+        indice_eventos = carrega_indice_eventos('coord_latam3.parquet')
+        malha_subnacional = carrega_geojson('latam+br_uf.json')
+        indice_unidades = carrega_indice_unidades('coord_latam3.parquet', 'latam+br_uf.json')
+        paises_unidades_latam = carrega_paises_unidades('latam+br_uf.json', 'malha_latam.json')
+        nomes_unidades = {str(f['properties']['codarea']): f['properties']['name_state'] for f in malha_brasil['features']} | dict(zip(dados_merge.iloc[-45:].code_state.astype(str), dados_merge.iloc[-45:].name_state))
+        malha_pais_selecionado = malha_brasil if iso == 'BRA' else filtra_geojson(malha_america, iso)
 
 
 
-    # QUERY
-    dados_atlas_query_br_2 = dados_atlas_query_br_1.query("descricao_tipologia == @tipologia_selecionada_br")
+        # MAPA DE DESASTRES COMUNS
+        tipologias_mais_comuns_por_estado = agrega_anos(indice_anos, ano_inicial_br, ano_final_br, por=['pais', 'descricao_tipologia'], grupo_de_desastre=grupo_desastre_selecionado_br)[['pais', 'descricao_tipologia', 'ocorrencias']].sort_values('ocorrencias', ascending=False).drop_duplicates(subset='pais', keep='first').rename(columns={'descricao_tipologia': 'desastre_mais_comum'})
+        tipol_br = dados_merge.groupby(['code_state', 'name_state'], as_index=False).size().drop('size', axis=1)
+        tipol_merge_br = tipol_br.merge(tipologias_mais_comuns_por_estado, how='left', left_on='name_state', right_on='pais').drop('pais', axis=1)
+        tipol_merge_br.loc[np.isnan(tipol_merge_br['ocorrencias']), 'ocorrencias'] = 0
+        tipol_merge_br.desastre_mais_comum = tipol_merge_br.desastre_mais_comum.fillna('Sem Dados')
+        col_mapa_br1.header(f'Desastre mais comum por País')
+        # col_mapa_br1.header(f'Desastres mais comuns por País ({ano_inicial_br} - {ano_final_br})')
+        col_mapa_br1.plotly_chart(cria_mapa(tipol_merge_br, geometria('latam', malha_america), locais='code_state', cor='desastre_mais_comum', lista_cores=mapa_de_cores, nome_hover='name_state', dados_hover=['desastre_mais_comum', 'ocorrencias'], zoom=1, titulo_legenda='Desastre mais comum'), use_container_width=True)
 
 
 
-    # MAPA RISCO
-    # col_mapa_br.divider()  
-    col_mapa_br2.header(f'{pais_selecionado}: Risco de {tipologia_selecionada_br} ({ano_inicial_br} - {ano_final_br})')
+        # QUERY
+        filtros_atlas_br = dict(grupo_de_desastre=grupo_desastre_selecionado_br, descricao_tipologia=tipologia_selecionada_br)
 
-    ocorrencias_br = dados_atlas_query_br_2.groupby(['cod_uf', 'pais'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
 
-    merge_ufs = dados_merge.iloc[:-45].groupby(['code_state', 'name_state'], as_index=False).size().drop('size', axis=1)
-    merge_paises = dados_merge.iloc[-45:].drop(['code_muni', 'name_muni'], axis=1)
-    merge_escolhido = merge_ufs if iso == 'BRA' else merge_paises
-    ocorrencias_merge_br = merge_escolhido.merge(ocorrencias_br, how='left', left_on='code_state', right_on='cod_uf')
-    ocorrencias_merge_br.loc[np.isnan(ocorrencias_merge_br["ocorrencias"]), 'ocorrencias'] = 0
-    classificacao_ocorrencias_br = classifica_risco(ocorrencias_merge_br, 'ocorrencias')
 
-    fig_mapa_br = cria_mapa(classificacao_ocorrencias_br, malha_pais_selecionado, locais='code_state', cor='risco', lista_cores=cores_risco, dados_hover='ocorrencias', nome_hover='name_state', titulo_legenda=f'Risco de {tipologia_selecionada_br}', zoom=1, featureid='properties.codarea')
+        # MAPA RISCO
+        # col_mapa_br.divider()  
+        col_mapa_br2.header(f'{pais_selecionado}: Risco de {tipologia_selecionada_br} ({ano_inicial_br} - {ano_final_br})')
 
-    coord_pais = coord_latam.query("cod_uf == @iso & ano >= @ano_inicial_br & ano <= @ano_final_br & descricao_tipologia == @tipologia_selecionada_br")
+        ocorrencias_br = agrega_anos(indice_anos, ano_inicial_br, ano_final_br, por=['cod_uf', 'pais'], **filtros_atlas_br)[['cod_uf', 'pais', 'ocorrencias']]
 
-    # if iso != 'BRA':
-    #     fig_mapa_br.add_trace(
-    #         px.scatter_mapbox(
-    #             lat=coord_pais['latitude'],
-    #             lon=coord_pais['longitude'],
-    #             hover_name=coord_pais['local']
-    #         ).data[0]
-    #     )
-    #     fig_mapa_br.update_traces(marker=dict(size=12, color='#222A2A'), selector=dict(mode='markers'))
+        merge_ufs = dados_merge.iloc[:-45].groupby(['code_state', 'name_state'], as_index=False).size().drop('size', axis=1)
+        merge_paises = dados_merge.iloc[-45:].drop(['code_muni', 'name_muni'], axis=1)
+        merge_escolhido = merge_ufs if iso == 'BRA' else merge_paises
+        ocorrencias_merge_br = merge_escolhido.merge(ocorrencias_br, how='left', left_on='code_state', right_on='cod_uf')
+        ocorrencias_merge_br.loc[np.isnan(ocorrencias_merge_br["ocorrencias"]), 'ocorrencias'] = 0
+        classificacao_ocorrencias_br = classifica_risco(ocorrencias_merge_br, 'ocorrencias')
+
+        # EVENTOS GEORREFERENCIADOS
+        pontos_pais = None
+        zoom_br, lat_br, lon_br = 1, -14, -53
+        if mostrar_eventos:
+            pontos_pais = agrupa_eventos(indice_eventos, zoom_eventos, tipologia_selecionada_br, ano_inicial_br, ano_final_br, pais=iso)
+            if len(pontos_pais) > 0:
+                zoom_br = zoom_eventos
+                lat_br = np.average(pontos_pais.lat, weights=pontos_pais.eventos)
+                lon_br = np.average(pontos_pais.lon, weights=pontos_pais.eventos)
 
-    col_mapa_br2.plotly_chart(fig_mapa_br, use_container_width=True)
+        if risco_subnacional:
+            unidades_pais = paises_unidades_latam.query("pais == @iso")[['unidade']]
+            ocorrencias_unidades = agrega_anos(indice_unidades, ano_inicial_br, ano_final_br, por=['unidade'], cod_uf=iso, descricao_tipologia=tipologia_selecionada_br)[['unidade', 'ocorrencias']]
+            ocorrencias_unidades = unidades_pais.merge(ocorrencias_unidades, how='left', on='unidade').fillna({'ocorrencias': 0})
+            ocorrencias_unidades['name_state'] = ocorrencias_unidades.unidade.map(nomes_unidades)
+            classificacao_ocorrencias_br = classifica_risco(ocorrencias_unidades.rename(columns={'unidade': 'code_state'}), 'ocorrencias')
+            malha_pais_selecionado = {'type': 'FeatureCollection', 'features': [f for f in malha_subnacional['features'] if f['properties']['codarea'] in set(unidades_pais.unidade)]}
 
+        fig_mapa_br = cria_mapa(classificacao_ocorrencias_br, geometria(f'subnacional_{iso}' if risco_subnacional else f'pais_{iso}', malha_pais_selecionado), locais='code_state', cor='risco', lista_cores=cores_risco, dados_hover='ocorrencias', nome_hover='name_state', titulo_legenda=f'Risco de {tipologia_selecionada_br}', lat=lat_br, lon=lon_br, zoom=zoom_br, featureid='properties.codarea', pontos=pontos_pais)
 
+        col_mapa_br2.plotly_chart(fig_mapa_br, use_container_width=True)
 
-    # DADOS
-    dados_tabela = dados_atlas_query_br_1.query("descricao_tipologia == @tipologia_selecionada_br").groupby(['pais'], as_index=False).size().rename(columns={'size': 'ocorrencias'})
-    tabela_br = dados_tabela.copy().reset_index(drop=True).sort_values('ocorrencias', ascending=False)
-    tabela_br['ocorrencias_por_ano'] = round(tabela_br.ocorrencias.div(ano_final_br - ano_inicial_br + 1), 1)
+
+
+        # DADOS
+        dados_tabela = agrega_anos(indice_anos, ano_inicial_br, ano_final_br, por=['pais'], **filtros_atlas_br)[['pais', 'ocorrencias']]
+        tabela_br = dados_tabela.copy().reset_index(drop=True).sort_values('ocorrencias', ascending=False)
+        tabela_br['ocorrencias_por_ano'] = round(tabela_br.ocorrencias.div(ano_final_br - ano_inicial_br + 1), 1)
   
-    tabela_merge_br = tabela_br.merge(pop_pib_uf, how='right', left_on='pais', right_on='pais')
-    tabela_merge_br.loc[np.isnan(tabela_merge_br["ocorrencias"]), 'ocorrencias'] = 0
-    tabela_merge_br.loc[np.isnan(tabela_merge_br["ocorrencias_por_ano"]), 'ocorrencias_por_ano'] = 0.0
-    tabela_merge_br = tabela_merge_br.sort_values('ocorrencias', ascending=False)
-    tabela_merge_br.loc[tabela_merge_br.query("cod_uf == 'VEN'").index, 'pais'] = 'Venezuela'
+        tabela_merge_br = tabela_br.merge(pop_pib_uf, how='right', left_on='pais', right_on='pais')
+        tabela_merge_br.loc[np.isnan(tabela_merge_br["ocorrencias"]), 'ocorrencias'] = 0
+        tabela_merge_br.loc[np.isnan(tabela_merge_br["ocorrencias_por_ano"]), 'ocorrencias_por_ano'] = 0.0
+        tabela_merge_br = tabela_merge_br.sort_values('ocorrencias', ascending=False)
+        tabela_merge_br.loc[tabela_merge_br.query("cod_uf == 'VEN'").index, 'pais'] = 'Venezuela'
 
 
 
-    # MÉTRICAS
-    met1_br, met2_br = col_dados_br2.columns([1, 1])
-    met1_br.metric('Total de ocorrências', tabela_merge_br.query("pais == @pais_selecionado")['ocorrencias'])
-    met2_br.metric('Média de ocorrências por ano', tabela_merge_br.query("pais == @pais_selecionado")['ocorrencias_por_ano'])
+        # MÉTRICAS
+        met1_br, met2_br = col_dados_br2.columns([1, 1])
+        met1_br.metric('Total de ocorrências', tabela_merge_br.query("pais == @pais_selecionado")['ocorrencias'])
+        met2_br.metric('Média de ocorrências por ano', tabela_merge_br.query("pais == @pais_selecionado")['ocorrencias_por_ano'])
 
     
 
-    # DATAFRAME E DOWNLOAD
-    expander_br = col_dados_br2.expander(f'Países com o maior risco de *{tipologia_selecionada_br}* na América Latina', expanded=True)
-    expander_br.dataframe(tabela_merge_br.drop('cod_uf', axis=1).head(), hide_index=True, 
-                          column_config={
-                            'pais': st.column_config.TextColumn('País'),
-                            'ocorrencias': st.column_config.TextColumn('Total ocorrências'),
-                            'pib_per_capita': st.column_config.NumberColumn(
-                                'PIB per Capita',
-                                format="R$ %.2f",
-                            ),
-                            'populacao': st.column_config.NumberColumn('Pop.', format='%d'),
-                            'ocorrencias_por_ano': st.column_config.NumberColumn('Média ocorrências/ano', format='%.1f')
-                        })
+        # DATAFRAME E DOWNLOAD
+        expander_br = col_dados_br2.expander(f'Países com o maior risco de *{tipologia_selecionada_br}* na América Latina', expanded=True)
+        expander_br.dataframe(tabela_merge_br.drop('cod_uf', axis=1).head(), hide_index=True, 
+                              column_config={
+                                'pais': st.column_config.TextColumn('País'),
+                                'ocorrencias': st.column_config.TextColumn('Total ocorrências'),
+                                'pib_per_capita': st.column_config.NumberColumn(
+                                    'PIB per Capita',
+                                    format="R$ %.2f",
+                                ),
+                                'populacao': st.column_config.NumberColumn('Pop.', format='%d'),
+                                'ocorrencias_por_ano': st.column_config.NumberColumn('Média ocorrências/ano', format='%.1f')
+                            })
 
-    col_dados_br2.download_button('Baixar tabela', tabela_merge_br.to_csv(sep=';', index=False), file_name=f'{tipologia_selecionada_br.replace(" ", "_").lower()}_americalatina.csv', mime='text/csv', use_container_width=True)
+        col_dados_br2.download_button('Baixar tabela', tabela_merge_br.to_csv(sep=';', index=False), file_name=f'{tipologia_selecionada_br.replace(" ", "_").lower()}_americalatina.csv', mime='text/csv', use_container_width=True)
 
 
 
     
-    heatmap_query_br = dados_atlas.iloc[62273:].query("descricao_tipologia == @tipologia_selecionada_br & ano >= 2000")
-    pivot_hm_br = heatmap_query_br.pivot_table(index='ano', columns='pais', aggfunc='size', fill_value=0)
-    # pivot_hm_br = pivot_hm_br.reindex(columns=dados_atlas.pais.unique(), fill_value=0)
-    pivot_hm_br = pivot_hm_br.reindex(index=anos_latam, fill_value=0).transpose()
-    # print(pivot_hm_br.head())
-    fig_hm_br = px.imshow(
-        pivot_hm_br,
-        labels=dict(x="Ano", y="País", color="Total ocorrências"),
-        x=pivot_hm_br.columns,
-        y=pivot_hm_br.index,
-        color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
-    )
-    fig_hm_br.update_layout(
-        yaxis_nticks=len(pivot_hm_br),
-        height=700
-    )
-    st.header(f'Ocorrências de *{tipologia_selecionada_br}* por País de 2000 a 2023')
-    st.caption('Países sem ocorrências não aparecem no gráfico')
-    st.plotly_chart(fig_hm_br, use_container_width=True)
-
-    # aba_hm1_br, aba_hm2_br = st.tabs(['Ocorrências por Grupo de Desastre', 'Ocorrências por País'])
-    # with aba_hm2_br:
-    #     heatmap_query_br = dados_atlas.iloc[62273:].query("descricao_tipologia == @tipologia_selecionada & ano >= 2000")
-    #     pivot_hm_br = heatmap_query_br.pivot_table(index='ano', columns='pais', aggfunc='size', fill_value=0)
-    #     # pivot_hm_br = pivot_hm_br.reindex(columns=dados_atlas.pais.unique(), fill_value=0)
-    #     pivot_hm_br = pivot_hm_br.reindex(index=anos_latam, fill_value=0).transpose()
-    #     fig_hm_br = px.imshow(
-    #         pivot_hm_br,
-    #         labels=dict(x="Ano", y="País", color="Total ocorrências"),
-    #         x=pivot_hm_br.columns,
-    #         y=pivot_hm_br.index,
-    #         color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
-    #     )
-    #     fig_hm_br.update_layout(
-    #         yaxis_nticks=len(pivot_hm_br),
-    #         height=700
-    #     )
-    #     st.subheader(f'Ocorrências de *{tipologia_selecionada_br}* por País de 2000 a 2023')
-    #     st.caption('Países sem ocorrências não aparecem no gráfico')
-    #     st.plotly_chart(fig_hm_br, use_container_width=True)
-    # with aba_hm1_br:
+        heatmap_query_br = dados_atlas.iloc[62273:].query("descricao_tipologia == @tipologia_selecionada_br & ano >= 2000")
+        pivot_hm_br = heatmap_query_br.pivot_table(index='ano', columns='pais', aggfunc='size', fill_value=0)
+        # pivot_hm_br = pivot_hm_br.reindex(columns=dados_atlas.pais.unique(), fill_value=0)
+        pivot_hm_br = pivot_hm_br.reindex(index=anos_latam, fill_value=0).transpose()
+        # print(pivot_hm_br.head())
+        fig_hm_br = compacta_figura(px.imshow(
+            pivot_hm_br,
+            labels=dict(x="Ano", y="País", color="Total ocorrências"),
+            x=pivot_hm_br.columns,
+            y=pivot_hm_br.index,
+            color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
+        ))
+        fig_hm_br.update_layout(
+            yaxis_nticks=len(pivot_hm_br),
+            height=700
+        )
+        st.header(f'Ocorrências de *{tipologia_selecionada_br}* por País de 2000 a 2023')
+        st.caption('Países sem ocorrências não aparecem no gráfico')
+        st.plotly_chart(fig_hm_br, use_container_width=True)
+
+        # aba_hm1_br, aba_hm2_br = st.tabs(['Ocorrências por Grupo de Desastre', 'Ocorrências por País'])
+        # with aba_hm2_br:
+        #     heatmap_query_br = dados_atlas.iloc[62273:].query("descricao_tipologia == @tipologia_selecionada & ano >= 2000")
+        #     pivot_hm_br = heatmap_query_br.pivot_table(index='ano', columns='pais', aggfunc='size', fill_value=0)
+        #     # pivot_hm_br = pivot_hm_br.reindex(columns=dados_atlas.pais.unique(), fill_value=0)
+        #     pivot_hm_br = pivot_hm_br.reindex(index=anos_latam, fill_value=0).transpose()
+        #     fig_hm_br = px.imshow(
+        #         pivot_hm_br,
+        #         labels=dict(x="Ano", y="País", color="Total ocorrências"),
+        #         x=pivot_hm_br.columns,
+        #         y=pivot_hm_br.index,
+        #         color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
+        #     )
+        #     fig_hm_br.update_layout(
+        #         yaxis_nticks=len(pivot_hm_br),
+        #         height=700
+        #     )
+        #     st.subheader(f'Ocorrências de *{tipologia_selecionada_br}* por País de 2000 a 2023')
+        #     st.caption('Países sem ocorrências não aparecem no gráfico')
+        #     st.plotly_chart(fig_hm_br, use_container_width=True)
+        # with aba_hm1_br:
  
-    #     heatmap_query2_br = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & pais == @pais_selecionado & ano >= 2000")
-    #     pivot_hm2_br = heatmap_query2_br.pivot_table(index='ano', columns='descricao_tipologia', aggfunc='size', fill_value=0)
-    #     pivot_hm2_br = pivot_hm2_br.reindex(index=anos_latam, fill_value=0).transpose()
-    #     fig_hm2_br = px.imshow(
-    #         pivot_hm2_br,
-    #         labels=dict(x="Ano", y="Desastre", color="Total ocorrências"),
-    #         x=pivot_hm2_br.columns,
-    #         y=pivot_hm2_br.index,
-    #         color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
-    #     )
-    #     fig_hm2_br.update_layout(
-    #         yaxis_nticks=len(pivot_hm2_br),
-    #     )
-    #     st.subheader(f'{pais_selecionado}: Ocorrências do grupo de desastre *{grupo_desastre_selecionado_br}* de 2000 a 2023')
-    #     st.plotly_chart(fig_hm2_br, use_container_width=True)
+        #     heatmap_query2_br = dados_atlas.query("grupo_de_desastre == @grupo_desastre_selecionado & pais == @pais_selecionado & ano >= 2000")
+        #     pivot_hm2_br = heatmap_query2_br.pivot_table(index='ano', columns='descricao_tipologia', aggfunc='size', fill_value=0)
+        #     pivot_hm2_br = pivot_hm2_br.reindex(index=anos_latam, fill_value=0).transpose()
+        #     fig_hm2_br = px.imshow(
+        #         pivot_hm2_br,
+        #         labels=dict(x="Ano", y="Desastre", color="Total ocorrências"),
+        #         x=pivot_hm2_br.columns,
+        #         y=pivot_hm2_br.index,
+        #         color_continuous_scale=cls_scales[grupo_desastre_selecionado_br],
+        #     )
+        #     fig_hm2_br.update_layout(
+        #         yaxis_nticks=len(pivot_hm2_br),
+        #     )
+        #     st.subheader(f'{pais_selecionado}: Ocorrências do grupo de desastre *{grupo_desastre_selecionado_br}* de 2000 a 2023')
+        #     st.plotly_chart(fig_hm2_br, use_container_width=True)
 
 
 # with tabs[3]:
@@ -1324,3 +1741,31 @@ with tabs[-1]:
     ''')
                         
     
+
+
+
+    # MEMÓRIA
+    # a medição carrega todos os conjuntos: só a pedido, para não pesar na primeira tela
+    expander_mem = st.expander('Memória dos conjuntos de dados')
+    if expander_mem.toggle('Medir memória dos conjuntos de dados', value=False, key='medir_memoria', help='Carrega todos os conjuntos que ainda não estão na memória.'):
+        dados_atlas, indice_anos, dados_merge, coord_uf, pop_pib, indice_localidades = carrega_variaveis()
+        relatorio_mem, total_mem, excede_mem = relatorio_memoria({
+            'desastres_latam2': dados_atlas, 'area2': dados_merge, 'coord_uf': coord_uf, 'pop_pib_muni': pop_pib,
+            'PSR_COMPLETO': carrega_psr('PSR_COMPLETO.parquet', seg | {curto: curto for curto in seg.values()}),
+            'susep_agro2 (rollup)': carrega_indice_susep('susep_agro2.parquet')['rollup'], 'pop_pib_latam': carrega_parquet('pop_pib_latam.parquet'),
+        })
+        expander_mem.caption(f'Total: {total_mem:.0f} MB')
+        if excede_mem:
+            expander_mem.warning(f'O total de {total_mem:.0f} MB passa do orçamento de {ORCAMENTO_MB:.0f} MB (OBSERVARIO_ORCAMENTO_MB).')
+        expander_mem.dataframe(relatorio_mem.groupby('conjunto', as_index=False).agg(linhas=('linhas', 'first'), colunas=('coluna', 'size'), mb=('mb', 'sum')).sort_values('mb', ascending=False), hide_index=True, use_container_width=True, column_config={'mb': st.column_config.NumberColumn('MB', format='%.1f')})
+        expander_mem.dataframe(relatorio_mem.sort_values('mb', ascending=False), hide_index=True, use_container_width=True, column_config={'mb': st.column_config.NumberColumn('MB', format='%.2f')})
+    antecipador = carrega_antecipador()
+    mostra_status_cargas(expander_mem)
+    expander_mem.caption(f'Antecipação em segundo plano: {antecipador["feitas"]} tarefas concluídas, {len(antecipador["pendentes"])} na fila, {antecipador["descartadas"]} descartadas (fila cheia ou acima de {antecipador["limite_mb"]:.0f} MB).')
+
+
+
+# ANTECIPAÇÃO
+# com o instantâneo servido, a visão padrão já está pronta e não se antecipa nada
+if not instantaneo_uf:
+    antecipa_selecoes(uf_selecionado, ufs_selecionadas, grupo_desastre_selecionado, ano_inicial, ano_final, uf_psr)
@@ -0,0 +1,133 @@
+import sys
+import time
+import socket
+import threading
+import statistics
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from compartilhado import rss_mb
+
+
+# Teste de carga do app2.py sem navegador: N sessões simuladas (AppTest) no mesmo processo, como no
+# servidor, repetem sequências de interações de um analista com pausas entre elas:
+#   python bench_carga.py [interacoes] [sessoes ...]      ex.: python bench_carga.py 20 1 2 4 8
+# O AppTest troca um runtime global a cada rerun, então os reruns das sessões entram numa fila
+# (um por vez): a latência medida é espera na fila + rerun, o que o analista sente quando várias
+# sessões clicam juntas num processo só. Os caches st.cache_* são compartilhados entre as sessões.
+# Rodar de dentro da pasta do app com os dados locais. A rede fica bloqueada: as malhas do IBGE
+# precisam estar no cache persistente (basta uma execução normal do app antes); se não estiverem,
+# a falha aparece na coluna de erros em vez de medir a API do IBGE.
+APP = 'app2.py'
+TEMPO_LIMITE = 300
+ROTEIRO = {'uf': 3, 'anos': 3, 'agro': 2, 'pais': 2}
+PAUSA_MEDIA = 0.5
+_fila = threading.Lock()
+
+
+def bloqueia_rede():
+    locais = ('127.0.0.1', '::1', 'localhost')
+    resolve, conecta = socket.getaddrinfo, socket.socket.connect
+
+    def resolve_local(host, *args, **kwargs):
+        if host not in locais:
+            raise OSError(f'rede bloqueada no teste de carga: {host}')
+        return resolve(host, *args, **kwargs)
+
+    def conecta_local(self, endereco):
+        if self.family in (socket.AF_INET, socket.AF_INET6) and endereco[0] not in locais:
+            raise OSError(f'rede bloqueada no teste de carga: {endereco[0]}')
+        return conecta(self, endereco)
+    socket.getaddrinfo = resolve_local
+    socket.socket.connect = conecta_local
+
+
+def _por_rotulo(widgets, rotulo):
+    return next(w for w in widgets if w.label == rotulo)
+
+
+def interage(at, acao, rng):
+    if acao == 'uf':
+        widget = _por_rotulo(at.selectbox, 'Selecione o estado')
+        widget.select(widget.options[rng.integers(len(widget.options))])
+    elif acao == 'anos':
+        widget = _por_rotulo(at.select_slider, 'Selecione o Intervalo de Anos')
+        inicio = int(rng.integers(len(widget.options) - 1))
+        fim = int(rng.integers(inicio + 1, len(widget.options)))
+        widget.set_value((widget.options[inicio], widget.options[fim]))
+    elif acao == 'agro':
+        estado = at.selectbox(key='uf_psr')
+        estado.select(estado.options[rng.integers(len(estado.options))])
+        culturas = at.multiselect(key='cultura_psr')
+        culturas.set_value(list(rng.choice(culturas.options, size=min(2, len(culturas.options)), replace=False)))
+        _por_rotulo(at.button, 'Aplicar Parâmetros').click()
+    elif acao == 'pais':
+        pais = at.selectbox(key='pais_br')
+        pais.select(pais.options[rng.integers(len(pais.options))])
+    inicio = time.perf_counter()
+    with _fila:
+        at.run(timeout=TEMPO_LIMITE)
+    return time.perf_counter() - inicio
+
+
+def sessao(indice, interacoes, semente, resultado):
+    rng = np.random.default_rng([semente, indice])
+    acoes, pesos = list(ROTEIRO), np.array(list(ROTEIRO.values()), dtype=float)
+    at = AppTest.from_file(APP, default_timeout=TEMPO_LIMITE)
+    inicio = time.perf_counter()
+    with _fila:
+        at.run()
+    resultado['primeira'].append(time.perf_counter() - inicio)
+    for _ in range(interacoes):
+        time.sleep(rng.exponential(PAUSA_MEDIA))
+        acao = acoes[rng.choice(len(acoes), p=pesos / pesos.sum())]
+        try:
+            resultado['latencias'].append(interage(at, acao, rng))
+        except Exception as erro:
+            resultado['erros'].append(f'{acao}: {erro}')
+        resultado['erros'].extend(f'{acao}: {e.message}' for e in at.exception)
+    resultado['sessoes'].append(at)
+
+
+def rodada(sessoes, interacoes, semente=0):
+    resultado = {'primeira': [], 'latencias': [], 'erros': [], 'sessoes': []}
+    rss_antes = rss_mb()
+    linhas = [threading.Thread(target=sessao, args=(i, interacoes, semente, resultado)) for i in range(sessoes)]
+    inicio = time.perf_counter()
+    for linha in linhas:
+        linha.start()
+    for linha in linhas:
+        linha.join()
+    duracao = time.perf_counter() - inicio
+    # mede com as sessões ainda vivas (o estado de cada uma conta)
+    resultado['rss'] = rss_mb()
+    resultado['crescimento'] = (resultado['rss'] - rss_antes) / sessoes
+    resultado['duracao'] = duracao
+    resultado.pop('sessoes')
+    return resultado
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p)) if valores else float('nan')
+
+
+if __name__ == '__main__':
+    interacoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    contagens = [int(n) for n in sys.argv[2:]] or [1, 2, 4, 8]
+    bloqueia_rede()
+
+    # aquecimento: carrega os caches compartilhados para medir só as interações
+    aquecimento = rodada(1, 0)
+    print(f'aquecimento: primeira renderização em {aquecimento["primeira"][0]:.1f} s, RSS {aquecimento["rss"]:.0f} MB')
+    for erro in aquecimento['erros'][:5]:
+        print(f'  erro: {erro}')
+
+    print(f'{"sessões":>7} {"reruns":>7} {"p50 (s)":>8} {"p90 (s)":>8} {"p99 (s)":>8} {"reruns/s":>9} {"1ª tela (s)":>11} {"RSS (MB)":>9} {"MB/sessão":>10} {"erros":>6}')
+    for sessoes in contagens:
+        r = rodada(sessoes, interacoes)
+        latencias = r['latencias']
+        print(f'{sessoes:>7} {len(latencias):>7} {percentil(latencias, 50):>8.2f} {percentil(latencias, 90):>8.2f} {percentil(latencias, 99):>8.2f} '
+              f'{len(latencias) / r["duracao"]:>9.2f} {statistics.median(r["primeira"]):>11.2f} {r["rss"]:>9.0f} {r["crescimento"]:>10.1f} {len(r["erros"]):>6}')
+        for erro in r['erros'][:3]:
+            print(f'  erro: {erro}')
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import statistics
+import importlib.util
+
+import plotly.tools
+import plotly.io as pio
+import plotly.graph_objects as go
+from streamlit import config
+from streamlit.testing.v1 import AppTest
+
+from figuras import serializa_figura
+from instantaneos import ABAS
+
+
+# Tamanho e tempo de serialização das figuras de cada aba (visão padrão) no caminho antigo
+# (to_dict + encoder json do plotly, tudo como lista de números) e no atual (arrays tipados em
+# base64 + orjson quando instalado), mais o passo intermediário só com orjson:
+#   python bench_figuras.py [repeticoes] [embutidas]
+# As figuras são capturadas rodando o app sem navegador (AppTest), como em instantaneos.py.
+# Com 'embutidas' a pasta static/ fica desligada e as malhas vão dentro das figuras (como antes
+# das URLs de malha); sem, o geojson é só a URL. Rodar de dentro da pasta do app.
+APP = 'app2.py'
+TEMPO_LIMITE = 600
+CAMINHOS = {
+    'antigo': lambda fig: pio.to_json(go.Figure.to_dict(fig), validate=False, engine='json'),
+    'orjson': lambda fig: pio.to_json(go.Figure.to_dict(fig), validate=False, engine='auto'),
+    'tipado': serializa_figura,
+}
+
+
+def captura_figuras(embutidas=False):
+    # o st.plotly_chart passa toda figura por plotly.tools.return_figure_from_figure_or_data
+    config.set_option('server.enableStaticServing', not embutidas)
+    figuras = []
+    original = plotly.tools.return_figure_from_figure_or_data
+
+    def registra(figura, validate_figure):
+        figuras.append(figura)
+        return original(figura, validate_figure)
+    plotly.tools.return_figure_from_figure_or_data = registra
+    try:
+        at = AppTest.from_file(os.path.abspath(APP), default_timeout=TEMPO_LIMITE)
+        for aba in ABAS:
+            at.session_state[f'ao_vivo_{aba}'] = True
+        at.run()
+    finally:
+        plotly.tools.return_figure_from_figure_or_data = original
+    for erro in at.exception:
+        print(f'erro no app: {erro.message}')
+    return figuras, at
+
+
+def conta_graficos(nos):
+    total = 0
+    for no in nos:
+        if getattr(no, 'type', None) == 'plotly_chart':
+            total += 1
+        else:
+            total += conta_graficos(getattr(no, 'children', {}).values())
+    return total
+
+
+def figuras_por_aba(figuras, at):
+    # as abas rodam em ordem no script: as primeiras figuras são da aba 0, depois da 1 e da 2
+    contagens = {aba: conta_graficos(at.tabs[config_aba['posicao']].children.values()) for aba, config_aba in ABAS.items()}
+    if sum(contagens.values()) != len(figuras):
+        return {'todas': figuras}
+    grupos, inicio = {}, 0
+    for aba, n in contagens.items():
+        grupos[aba] = figuras[inicio:inicio + n]
+        inicio += n
+    return grupos
+
+
+def mede(figuras, caminho, repeticoes):
+    serializa = CAMINHOS[caminho]
+    tamanho = sum(len(serializa(fig).encode()) for fig in figuras)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for fig in figuras:
+            serializa(fig)
+        tempos.append(time.perf_counter() - inicio)
+    return tamanho / 1e6, statistics.median(tempos) * 1000
+
+
+if __name__ == '__main__':
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    embutidas = 'embutidas' in sys.argv[2:]
+    figuras, at = captura_figuras(embutidas)
+    print(f'{len(figuras)} figuras, malhas {"embutidas" if embutidas else "por URL"}, orjson {"instalado" if importlib.util.find_spec("orjson") else "ausente"}')
+    print(f'{"aba":<7} {"figuras":>7}' + ''.join(f' {caminho + " (MB)":>13} {caminho + " (ms)":>13}' for caminho in CAMINHOS))
+    for aba, grupo in figuras_por_aba(figuras, at).items():
+        linha = f'{aba:<7} {len(grupo):>7}'
+        for caminho in CAMINHOS:
+            megas, ms = mede(grupo, caminho, repeticoes)
+            linha += f' {megas:>13.2f} {ms:>13.1f}'
+        print(linha)
@@ -0,0 +1,47 @@
+import ast
+import sys
+import subprocess
+import statistics
+
+
+# Tempo de import de cada dependência num interpretador novo (mediana de N execuções):
+#   python bench_importacao.py [repeticoes]
+# "topo antigo" é o conjunto importado no topo do app2.py antes dos imports preguiçosos;
+# "topo atual" sai dos imports de nível de módulo do app2.py de hoje (lidos pela árvore sintática,
+# então acompanha o arquivo; imports dentro de funções ficam de fora). Rodar de dentro da pasta do app.
+MODULOS = ['numpy', 'pandas', 'streamlit', 'plotly.express', 'plotly.graph_objects', 'plotly.subplots', 'pyarrow', 'requests', 'shapely', 'geopandas']
+TOPO_ANTIGO = ['json', 'math', 'requests', 'numpy', 'pandas', 'streamlit', 'geopandas', 'plotly.express', 'pyarrow', 'plotly.graph_objects', 'plotly.subplots', 'shapely', 'indices', 'compartilhado', 'simulacao', 'estatistica']
+APP = 'app2.py'
+
+
+def imports_topo(arquivo=APP):
+    with open(arquivo, encoding='utf-8') as f:
+        arvore = ast.parse(f.read())
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos += [alias.name for alias in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.level == 0:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+
+def tempo_import(modulos, repeticoes):
+    codigo = 'import time; t = time.perf_counter()\n' + ''.join(f'import {m}\n' for m in modulos) + 'print(time.perf_counter() - t)'
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True)
+        if saida.returncode != 0:
+            return None
+        tempos.append(float(saida.stdout.strip().splitlines()[-1]))
+    return statistics.median(tempos)
+
+
+if __name__ == '__main__':
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    topo_atual = imports_topo()
+    print(f'topo atual ({APP}): {", ".join(topo_atual)}')
+    print(f'{"import":<24} {"mediana (s)":>12}')
+    for nome, modulos in [(m, [m]) for m in MODULOS] + [('topo antigo', TOPO_ANTIGO), ('topo atual', topo_atual)]:
+        tempo = tempo_import(modulos, repeticoes)
+        print(f'{nome:<24} {"falhou" if tempo is None else f"{tempo:12.3f}":>12}')
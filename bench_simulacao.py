@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import resource
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from simulacao import simula_carteira, simula_lote, tamanho_lote, cria_executor
+
+
+# Benchmark da simulação de Monte Carlo com uma carteira sintética:
+#   python bench_simulacao.py [anos] [unidades]
+# Mede o tempo por número de processos e o pico de memória do processo principal. Antes, confere
+# que um lote do tamanho escolhido por simula_carteira cabe em LIMITE_LOTE_MB (o pico de cada
+# processo do pool), medido com tracemalloc, que vê as alocações do numpy.
+LIMITE_LOTE_MB = 256
+
+
+def carteira_sintetica(unidades, semente=42):
+    rng = np.random.default_rng(semente)
+    taxa = rng.gamma(0.8, 2.0, unidades)
+    r = np.where(rng.random(unidades) < 0.5, np.inf, rng.uniform(0.5, 5, unidades))
+    return pd.DataFrame({
+        'taxa': taxa,
+        'r': r,
+        'mu': rng.normal(9.5, 0.8, unidades),
+        'sigma': rng.uniform(0.4, 1.2, unidades),
+        'premio': rng.lognormal(11, 1, unidades),
+    })
+
+
+def pico_lote(parametros):
+    colunas = [parametros[coluna].to_numpy(dtype=np.float64) for coluna in ('taxa', 'r', 'mu', 'sigma')]
+    lote = tamanho_lote(colunas[0])
+    tracemalloc.start()
+    try:
+        simula_lote(*colunas, parametros.premio.sum(), lote, np.random.SeedSequence(0))
+        pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+    return lote, pico
+
+
+if __name__ == '__main__':
+    anos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    unidades = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    parametros = carteira_sintetica(unidades)
+    print(f'{anos} anos simulados, {unidades} unidades, {parametros.taxa.sum():.0f} sinistros esperados/ano')
+    lote, pico = pico_lote(parametros)
+    print(f'lote de {lote} anos ({lote * unidades} células): pico de {pico:.0f} MB por processo (limite {LIMITE_LOTE_MB} MB)')
+    if pico > LIMITE_LOTE_MB:
+        sys.exit(f'lote acima do limite de memória: {pico:.0f} MB > {LIMITE_LOTE_MB} MB')
+    print(f'{"processos":>9} {"tempo (s)":>10} {"speedup":>8} {"VaR 99%":>9} {"TVaR 99%":>9} {"pico RSS (MB)":>14}')
+
+    base = None
+    processos = 1
+    while processos <= os.cpu_count():
+        executor = None if processos == 1 else cria_executor(processos)
+        if executor is not None:
+            # aquece os processos para não medir o spawn
+            list(executor.map(abs, range(processos)))
+        inicio = time.perf_counter()
+        resumo = simula_carteira(parametros, anos=anos, executor=executor, processos=processos)
+        tempo = time.perf_counter() - inicio
+        if executor is not None:
+            executor.shutdown()
+        base = base or tempo
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f'{processos:>9} {tempo:>10.2f} {base / tempo:>8.2f} {resumo["var_0.99"]:>9.1f} {resumo["tvar_0.99"]:>9.1f} {pico:>14.0f}')
+        processos *= 2
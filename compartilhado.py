@@ -0,0 +1,522 @@
+import os
+import sys
+import json
+import bisect
+import time
+import hashlib
+import inspect
+import functools
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# DADOS COMPARTILHADOS ENTRE PROCESSOS
+# Cada parquet é publicado uma vez como arquivo Arrow IPC sem compressão numa pasta comum a todas
+# as réplicas do servidor (por padrão no tmp; /dev/shm também serve). Os processos abrem o arquivo
+# por memory map: as colunas (dtype pyarrow) apontam direto para as páginas do arquivo, que o
+# sistema operacional mantém uma única vez no page cache para todos os processos.
+PASTA_ARROW = os.environ.get('OBSERVARIO_ARROW', os.path.join(tempfile.gettempdir(), 'observario_arrow'))
+ORCAMENTO_MB = float(os.environ.get('OBSERVARIO_ORCAMENTO_MB', 0))
+PASTA_CACHE = os.environ.get('OBSERVARIO_CACHE', os.path.join(tempfile.gettempdir(), 'observario_cache'))
+LIMITE_CACHE_MB = float(os.environ.get('OBSERVARIO_CACHE_MB', 2048))
+LIMITE_ANTECIPACAO_MB = float(os.environ.get('OBSERVARIO_ANTECIPACAO_MB', 4096))
+LIMITE_CARGAS_MB = float(os.environ.get('OBSERVARIO_CARGAS_MB', 4096))
+
+
+# SEGURADORAS
+# Razão social (como vem do PSR) -> nome curto usado no app; aqui para o app e a ingestão lerem o mesmo
+# mapa sem que o app importe a ingestão (pyarrow.csv e o pool de conversão).
+SEGURADORAS = {
+    'BRASILSEG COMPANHIA DE SEGUROS': 'Brasilseg',
+    'Mapfre Seguros Gerais S.A.': 'MAPFRE Seguros',
+    'Essor Seguros S.A.': 'Essor Seguros',
+    'Swiss Re Corporate Solutions Brasil S.A.': 'Swiss Re',
+    'Nobre Seguradora do Brasil S.A': 'Nobre Seguradora',
+    'Allianz Seguros S.A': 'Allianz Seguros',
+    'Sancor Seguros do Brasil S.A.': 'Sancor Seguros',
+    'FairFax Brasil Seguros Corporativos S/A': 'Fairfax Seguros',
+    'Newe Seguros S.A': 'Newe Seguros',
+    'Tokio Marine Seguradora S.A.': 'Tokio Marine Seguradora',
+    'Porto Seguro Companhia de Seguros Gerais': 'Porto Seguro',
+    'Too Seguros S.A.': 'Too Seguros',
+    'Aliança do Brasil Seguros S/A.': 'Aliança do Brasil Seguros',
+    'Sompo Seguros S/A': 'Sompo Seguros',
+    'Companhia Excelsior de Seguros': 'Seguros Excelsior',
+    'EZZE Seguros S.A.': 'EZZE Seguros',
+    'Itaú XL Seguros Corporativos S.A': 'Itaú XL Seguros',
+}
+
+
+# ESQUEMA COMPACTO
+# Aplicado uma vez na publicação, antes de gravar o Arrow IPC. Inteiros de 64 bits descem para
+# int32 quando cabem (não mais estreito: contas como ano * 100 estourariam um int16). Colunas de
+# dinheiro só viram float32 se todos os valores voltam idênticos ao centavo; as demais continuam
+# float64, que é exato ao centavo até ~R$ 90 trilhões. Medidas físicas e taxas aceitam float32.
+# Códigos IBGE em texto viram int32 só se listados em 'codigos' (as malhas e area2 usam o texto).
+VERSAO_ESQUEMA = 1
+ESQUEMAS = {
+    'PSR_COMPLETO': {'centavos': ['valor_premio', 'valor_subvencao', 'valor_indenizacao'], 'medidas': ['area_total', 'prod_segurada', 'pe_taxa']},
+    'susep_agro2': {'centavos': ['premio_dir', 'premio_ret', 'prem_ret_liq', 'sin_dir', 'salvados', 'recuperacao']},
+    'desastres_latam2': {'centavos': ['agricultura', 'pecuaria', 'industria']},
+}
+
+
+def _cabe_int32(coluna):
+    minimo, maximo = pc.min_max(coluna).values()
+    return minimo.as_py() is None or (minimo.as_py() >= -2 ** 31 and maximo.as_py() < 2 ** 31)
+
+
+def _exato_em_float32(coluna, casas=2):
+    reduzida = coluna.cast(pa.float32(), safe=False).cast(pa.float64())
+    iguais = pc.equal(pc.round(reduzida, casas), pc.round(coluna, casas))
+    return pc.all(pc.or_kleene(iguais, pc.is_null(coluna))).as_py() is not False
+
+
+def otimiza_esquema(tabela, centavos=(), medidas=(), codigos=()):
+    colunas = []
+    for nome, coluna in zip(tabela.column_names, tabela.columns):
+        tipo = coluna.type
+        if pa.types.is_integer(tipo) and tipo.bit_width > 32 and _cabe_int32(coluna):
+            coluna = coluna.cast(pa.int32())
+        elif nome in codigos and (pa.types.is_string(tipo) or pa.types.is_large_string(tipo)):
+            if pc.all(pc.match_substring_regex(coluna, r'^\d{1,9}$')).as_py() is not False:
+                coluna = coluna.cast(pa.int32())
+        elif pa.types.is_float64(tipo) and nome in medidas:
+            coluna = coluna.cast(pa.float32(), safe=False)
+        elif pa.types.is_float64(tipo) and nome in centavos and _exato_em_float32(coluna):
+            coluna = coluna.cast(pa.float32(), safe=False)
+        colunas.append(coluna)
+    return pa.Table.from_arrays(colunas, names=tabela.column_names).replace_schema_metadata(tabela.schema.metadata)
+
+
+def _nome(caminho_arquivo):
+    return os.path.splitext(os.path.basename(caminho_arquivo))[0]
+
+
+def caminho_arrow(caminho_arquivo, pasta=PASTA_ARROW):
+    return os.path.join(pasta, f'{_nome(caminho_arquivo)}.v{VERSAO_ESQUEMA}.arrow')
+
+
+def le_parquet(caminho_arquivo, colunas=None):
+    # arquivo único ou dataset hive da ingestao.py (a chave da partição volta como coluna comum)
+    return pq.read_table(caminho_arquivo, columns=colunas, partitioning=ds.HivePartitioning.discover(infer_dictionary=False))
+
+
+def publica_arrow(caminho_arquivo, pasta=PASTA_ARROW):
+    destino = caminho_arrow(caminho_arquivo, pasta)
+    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(caminho_arquivo):
+        return destino
+
+    # cada processo escreve no seu temporário e troca atomicamente: leitores nunca veem arquivo pela metade
+    os.makedirs(pasta, exist_ok=True)
+    tabela = otimiza_esquema(le_parquet(caminho_arquivo), **ESQUEMAS.get(_nome(caminho_arquivo), {}))
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    with pa.OSFile(temporario, 'wb') as saida, pa.ipc.new_file(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, destino)
+    return destino
+
+
+def mapeia_arrow(caminho_arquivo, pasta=PASTA_ARROW):
+    # o memory map continua vivo enquanto houver buffers apontando para ele
+    fonte = pa.memory_map(publica_arrow(caminho_arquivo, pasta), 'r')
+    tabela = pa.ipc.open_file(fonte).read_all()
+    return tabela.to_pandas(types_mapper=pd.ArrowDtype, split_blocks=True, self_destruct=False)
+
+
+# CACHE PERSISTENTE
+# Resultados de carregadores e agregações gravados em Arrow IPC, endereçados pelo conteúdo: a chave
+# é o hash da função, dos argumentos e do conteúdo de cada arquivo de entrada (argumentos 'caminho*'
+# e os arquivos declarados no decorador). O código entra na chave: o fonte da função, o das funções
+# do mesmo módulo que ela chama e o arquivo de cada módulo do projeto que ela usa; o que vem de fora
+# (uma API que mudou de formato) se invalida com versao=. Vale entre reinícios e entre réplicas.
+# Escrita em temporário + os.replace; leitura por memory map; ao passar do limite, os arquivos menos
+# usados recentemente (mtime renovado a cada leitura) são apagados. Um leitor que já mapeou um
+# arquivo apagado continua lendo normalmente; quem chega depois só conta um miss.
+_assinaturas = {}
+
+
+def assinatura_arquivo(caminho):
+    if os.path.isdir(caminho):
+        # dataset particionado (ingestao.py): caminho relativo e conteúdo de cada arquivo
+        resumo = hashlib.blake2b(digest_size=16)
+        for pasta, subpastas, arquivos in os.walk(caminho):
+            subpastas.sort()
+            for arquivo in sorted(arquivos):
+                completo = os.path.join(pasta, arquivo)
+                resumo.update(f'{os.path.relpath(completo, caminho)}={assinatura_arquivo(completo)};'.encode())
+        return resumo.hexdigest()
+    estado = os.stat(caminho)
+    chave = (os.path.abspath(caminho), estado.st_size, estado.st_mtime_ns)
+    if chave not in _assinaturas:
+        resumo = hashlib.blake2b(digest_size=16)
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 22), b''):
+                resumo.update(bloco)
+        _assinaturas[chave] = resumo.hexdigest()
+    return _assinaturas[chave]
+
+
+def _repr_estavel(valor):
+    if isinstance(valor, dict):
+        return '{' + ','.join(f'{k!r}:{_repr_estavel(v)}' for k, v in sorted(valor.items())) + '}'
+    if isinstance(valor, (list, tuple)):
+        return '[' + ','.join(_repr_estavel(v) for v in valor) + ']'
+    return repr(valor)
+
+
+def _para_tabela(valor):
+    if isinstance(valor, pd.DataFrame):
+        tabela = pa.Table.from_pandas(valor)
+        return tabela.replace_schema_metadata({**tabela.schema.metadata, b'observario': b'dataframe'})
+    return pa.table({'json': pa.array([json.dumps(valor).encode()], type=pa.binary())}).replace_schema_metadata({b'observario': b'json'})
+
+
+def _de_tabela(tabela):
+    if tabela.schema.metadata.get(b'observario') == b'json':
+        return json.loads(tabela.column('json')[0].as_py())
+    return tabela.to_pandas()
+
+
+def le_cache(chave, pasta=PASTA_CACHE):
+    caminho = os.path.join(pasta, f'{chave}.arrow')
+    try:
+        tabela = pa.ipc.open_file(pa.memory_map(caminho, 'r')).read_all()
+        os.utime(caminho)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    return _de_tabela(tabela)
+
+
+def grava_cache(chave, valor, pasta=PASTA_CACHE, limite_mb=LIMITE_CACHE_MB):
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, f'{chave}.arrow')
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    tabela = _para_tabela(valor)
+    with pa.OSFile(temporario, 'wb') as saida, pa.ipc.new_file(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, destino)
+    despeja_cache(pasta, limite_mb)
+
+
+def despeja_cache(pasta=PASTA_CACHE, limite_mb=LIMITE_CACHE_MB):
+    arquivos = []
+    for entrada in os.scandir(pasta):
+        if entrada.name.endswith('.arrow'):
+            try:
+                estado = entrada.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_mb * 2 ** 20:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+
+def _nomes_usados(codigo):
+    # nomes globais do corpo, incluindo funções internas e compreensões
+    nomes = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if inspect.iscode(constante):
+            nomes |= _nomes_usados(constante)
+    return nomes
+
+
+def assinatura_codigo(funcao):
+    funcao = inspect.unwrap(funcao)
+    partes = [inspect.getsource(funcao)]
+    for nome in sorted(_nomes_usados(funcao.__code__)):
+        if nome not in funcao.__globals__:
+            continue
+        objeto = inspect.unwrap(funcao.__globals__[nome])
+        modulo = objeto if inspect.ismodule(objeto) else inspect.getmodule(objeto)
+        arquivo = getattr(modulo, '__file__', None)
+        if arquivo is None or os.path.dirname(os.path.abspath(arquivo)) != PASTA_PROJETO:
+            continue
+        if modulo.__name__ == funcao.__module__:
+            if inspect.isfunction(objeto) or inspect.isclass(objeto):
+                partes.append(inspect.getsource(objeto))
+        else:
+            partes.append(f'{modulo.__name__}={assinatura_arquivo(arquivo)}')
+    return hashlib.blake2b('|'.join(partes).encode(), digest_size=16).hexdigest()
+
+
+def persistente(*arquivos, versao=None):
+    # argumentos com '_' na frente ficam fora da chave (como no st.cache_data); declare em 'arquivos'
+    # os dados de que eles dependem
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+        codigo = []
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            ligados = assinatura.bind(*args, **kwargs)
+            ligados.apply_defaults()
+            # na primeira chamada: os auxiliares definidos depois do decorador já existem
+            if not codigo:
+                codigo.append(assinatura_codigo(funcao))
+            partes = [funcao.__module__, funcao.__qualname__, codigo[0], repr(versao)] + [assinatura_arquivo(a) for a in arquivos]
+            for nome, valor in ligados.arguments.items():
+                if nome.startswith('_'):
+                    continue
+                partes.append(f'{nome}={assinatura_arquivo(valor) if nome.startswith("caminho") else _repr_estavel(valor)}')
+            chave = hashlib.blake2b('|'.join(partes).encode(), digest_size=16).hexdigest()
+            resultado = le_cache(chave)
+            if resultado is None:
+                resultado = funcao(*args, **kwargs)
+                grava_cache(chave, resultado)
+            return resultado
+        return envolvida
+    return decorador
+
+
+# CACHE DOS CARREGADORES
+# Malhas, geojson e tabelas ficam na memória do processo (o mesmo objeto para todas as sessões, como
+# no st.cache_resource: não alterar no lugar) com o tamanho de cada entrada medido na carga. Passando
+# do limite, as entradas usadas há mais tempo saem. Só a memória privada conta no limite: buffers Arrow
+# que apontam para um arquivo mapeado (mapeia_arrow) são páginas do page cache, divididas entre as
+# réplicas, e aparecem à parte. Acertos, faltas e despejos por função e o tamanho de cada entrada
+# ficam em status_cargas(). Duas sessões pedindo a mesma entrada carregam uma vez.
+_cargas = OrderedDict()
+_estatisticas_cargas = {}
+_carregando = {}
+_trava_cargas = threading.Lock()
+
+
+def tamanho_bytes(valor):
+    # dataframe: buffers das colunas; geojson: soma dos objetos Python (pares de coordenadas sem
+    # visitar cada float)
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_bytes(k) + tamanho_bytes(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        if valor and isinstance(valor[0], float):
+            return sys.getsizeof(valor) + len(valor) * sys.getsizeof(0.0)
+        return sys.getsizeof(valor) + sum(tamanho_bytes(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+def _regioes_mapeadas():
+    # faixas de endereço mapeadas de arquivo, contíguas unidas (Linux); fora dele nada conta como mapeado
+    regioes = []
+    try:
+        with open('/proc/self/maps') as f:
+            for linha in f:
+                campos = linha.split(maxsplit=5)
+                if len(campos) < 6 or not campos[5].startswith('/'):
+                    continue
+                inicio, fim = (int(endereco, 16) for endereco in campos[0].split('-'))
+                if regioes and regioes[-1][1] == inicio:
+                    regioes[-1][1] = fim
+                else:
+                    regioes.append([inicio, fim])
+    except OSError:
+        pass
+    return regioes
+
+
+def bytes_mapeados(valor):
+    # buffers das colunas Arrow que caem dentro de um arquivo mapeado
+    if not isinstance(valor, pd.DataFrame):
+        return 0
+    regioes = _regioes_mapeadas()
+    inicios = [inicio for inicio, _ in regioes]
+    total, vistos = 0, set()
+    for _, serie in valor.items():
+        if not isinstance(serie.dtype, pd.ArrowDtype):
+            continue
+        for pedaco in serie.array.__arrow_array__().chunks:
+            for buffer in pedaco.buffers():
+                if buffer is None or buffer.address in vistos:
+                    continue
+                vistos.add(buffer.address)
+                i = bisect.bisect_right(inicios, buffer.address) - 1
+                if i >= 0 and buffer.address + buffer.size <= regioes[i][1]:
+                    total += buffer.size
+    return total
+
+
+def _acerto(chave):
+    entrada = _cargas[chave]
+    _cargas.move_to_end(chave)
+    entrada['acertos'] += 1
+    entrada['acesso'] = time.time()
+    _estatisticas_cargas[entrada['funcao']]['acertos'] += 1
+    return entrada['valor']
+
+
+def despeja_cargas(limite_mb=LIMITE_CARGAS_MB):
+    # chamada com a trava; só a memória privada ('bytes') conta; a entrada mais recente fica mesmo sozinha acima do limite
+    total = sum(entrada['bytes'] for entrada in _cargas.values())
+    while len(_cargas) > 1 and total > limite_mb * 2 ** 20:
+        _, entrada = _cargas.popitem(last=False)
+        total -= entrada['bytes']
+        _estatisticas_cargas[entrada['funcao']]['despejos'] += 1
+
+
+def cache_orcado(funcao):
+    assinatura = inspect.signature(funcao)
+    nome = funcao.__qualname__
+
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        ligados = assinatura.bind(*args, **kwargs)
+        ligados.apply_defaults()
+        argumentos = ', '.join(f'{k}={_repr_estavel(v)}' for k, v in ligados.arguments.items())
+        chave = (nome, argumentos)
+        with _trava_cargas:
+            _estatisticas_cargas.setdefault(nome, {'acertos': 0, 'faltas': 0, 'despejos': 0})
+            if chave in _cargas:
+                return _acerto(chave)
+            carregando = _carregando.setdefault(chave, threading.Lock())
+        with carregando:
+            with _trava_cargas:
+                # outra sessão pode ter terminado a carga enquanto esta esperava
+                if chave in _cargas:
+                    return _acerto(chave)
+            try:
+                inicio = time.perf_counter()
+                valor = funcao(*args, **kwargs)
+                duracao = time.perf_counter() - inicio
+                mapeados = bytes_mapeados(valor)
+                privados = max(tamanho_bytes(valor) - mapeados, 0)
+            except BaseException:
+                with _trava_cargas:
+                    _carregando.pop(chave, None)
+                raise
+            # entra em _cargas antes de soltar _carregando, na mesma trava: quem chega no meio acha a entrada
+            with _trava_cargas:
+                _estatisticas_cargas[nome]['faltas'] += 1
+                _cargas[chave] = {'funcao': nome, 'argumentos': argumentos, 'valor': valor, 'bytes': privados, 'mapeados': mapeados, 'acertos': 0, 'segundos': duracao, 'acesso': time.time()}
+                _carregando.pop(chave, None)
+                despeja_cargas()
+        return valor
+    return envolvida
+
+
+def status_cargas(limite_mb=LIMITE_CARGAS_MB):
+    with _trava_cargas:
+        entradas = pd.DataFrame([{k: v for k, v in entrada.items() if k != 'valor'} for entrada in _cargas.values()],
+                                columns=['funcao', 'argumentos', 'bytes', 'mapeados', 'acertos', 'segundos', 'acesso'])
+        funcoes = pd.DataFrame([{'funcao': nome, **contagem} for nome, contagem in _estatisticas_cargas.items()],
+                               columns=['funcao', 'acertos', 'faltas', 'despejos'])
+    # mb: memória privada (entra no limite); mb_mapeado: páginas do arquivo mapeado
+    entradas['mb'] = entradas.pop('bytes') / 2 ** 20
+    entradas['mb_mapeado'] = entradas.pop('mapeados') / 2 ** 20
+    entradas['ocioso_s'] = time.time() - entradas.pop('acesso')
+    por_funcao = entradas.groupby('funcao', as_index=False).agg(entradas=('mb', 'size'), mb=('mb', 'sum'), mb_mapeado=('mb_mapeado', 'sum'))
+    funcoes = funcoes.merge(por_funcao, how='left', on='funcao').fillna({'entradas': 0, 'mb': 0.0, 'mb_mapeado': 0.0})
+    funcoes['taxa_acerto'] = funcoes.acertos / (funcoes.acertos + funcoes.faltas).where(lambda n: n > 0)
+    return {'funcoes': funcoes, 'entradas': entradas.sort_values('mb', ascending=False), 'total_mb': entradas.mb.sum(), 'mapeado_mb': entradas.mb_mapeado.sum(), 'limite_mb': limite_mb}
+
+
+# MEMÓRIA
+def relatorio_memoria(conjuntos, orcamento_mb=ORCAMENTO_MB):
+    # conjuntos: {nome: dataframe}; bytes por coluna (buffers Arrow contam uma vez, mesmo mapeados)
+    linhas = []
+    for nome, df in conjuntos.items():
+        uso = df.memory_usage(index=False, deep=True)
+        for coluna, bytes_coluna in uso.items():
+            linhas.append({'conjunto': nome, 'coluna': coluna, 'tipo': str(df[coluna].dtype), 'linhas': len(df), 'mb': bytes_coluna / 2 ** 20})
+    relatorio = pd.DataFrame(linhas, columns=['conjunto', 'coluna', 'tipo', 'linhas', 'mb'])
+    total = relatorio.mb.sum()
+    return relatorio, total, bool(orcamento_mb) and total > orcamento_mb
+
+
+def rss_mb():
+    # RSS atual do processo (Linux); fora dele, o pico
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ANTECIPAÇÃO
+# Depois de cada rerun, as seleções mais prováveis a seguir (vizinhos, outra tipologia, outra aba)
+# são aquecidas em segundo plano: poucas threads com prioridade baixa (nice por thread no Linux),
+# fila curta (o que não cabe é descartado, não enfileirado) e nada é disparado com o processo
+# acima do limite de memória. Tarefas iguais já na fila não se repetem.
+def _prioridade_baixa():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def cria_antecipador(threads=2, fila=16, limite_mb=LIMITE_ANTECIPACAO_MB):
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='antecipa', initializer=_prioridade_baixa)
+    return {'executor': executor, 'pendentes': set(), 'trava': threading.Lock(), 'fila': fila, 'limite_mb': limite_mb, 'feitas': 0, 'descartadas': 0}
+
+
+def antecipa(antecipador, chave, funcao, *args, **kwargs):
+    with antecipador['trava']:
+        if chave in antecipador['pendentes']:
+            return False
+        if len(antecipador['pendentes']) >= antecipador['fila'] or rss_mb() > antecipador['limite_mb']:
+            antecipador['descartadas'] += 1
+            return False
+        antecipador['pendentes'].add(chave)
+
+    def tarefa():
+        try:
+            funcao(*args, **kwargs)
+        except Exception:
+            # só aquecimento: o erro aparece de novo (e é tratado) quando a seleção for feita de verdade
+            pass
+        finally:
+            with antecipador['trava']:
+                antecipador['pendentes'].discard(chave)
+                antecipador['feitas'] += 1
+    antecipador['executor'].submit(tarefa)
+    return True
+
+
+# MALHAS NO NAVEGADOR
+# Cada malha é gravada uma vez em static/ (servido pelo Streamlit em app/static/) com a versão,
+# hash do conteúdo, no nome do arquivo. As figuras levam só a URL no lugar do geojson: o plotly.js
+# baixa cada URL uma vez por página e guarda a geometria (mapas com a mesma malha, outros reruns e
+# os quadros da animação reaproveitam), e o navegador revalida pelo ETag entre visitas. O nome da
+# malha identifica o conteúdo dentro do processo (as malhas não mudam com o app no ar).
+PASTA_MALHAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'malhas')
+_malhas_publicadas = {}
+_trava_malhas = threading.Lock()
+
+
+def publica_malha(nome, malha, pasta=PASTA_MALHAS):
+    with _trava_malhas:
+        if nome in _malhas_publicadas:
+            return _malhas_publicadas[nome]
+        conteudo = json.dumps(malha, separators=(',', ':')).encode()
+        arquivo = f'{nome}.{hashlib.blake2b(conteudo, digest_size=8).hexdigest()}.json'
+        destino = os.path.join(pasta, arquivo)
+        if not os.path.exists(destino):
+            os.makedirs(pasta, exist_ok=True)
+            temporario = f'{destino}.{os.getpid()}.tmp'
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, destino)
+        _malhas_publicadas[nome] = f'app/static/malhas/{arquivo}'
+        return _malhas_publicadas[nome]
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+# TENDÊNCIAS
+# Todas as séries (município x tipologia) são processadas juntas: cada linha da matriz é uma
+# série anual. Os pares (i, j) de anos são gerados uma vez e o Mann-Kendall, o declive de Sen e a
+# anomalia do último ano saem de operações vetorizadas por lote de linhas.
+LOTE_SERIES = 4096
+
+
+def _erfc(x):
+    # Abramowitz & Stegun 7.1.26 (erro < 1.5e-7), para x >= 0
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    polinomio = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return polinomio * np.exp(-x * x)
+
+
+def p_valor_normal(z):
+    # bicaudal: 2 * (1 - Phi(|z|)) = erfc(|z| / sqrt(2))
+    return _erfc(np.abs(z) / np.sqrt(2.0))
+
+
+def _correcao_empates(X):
+    # soma de t(t-1)(2t+5) sobre os grupos de valores repetidos de cada linha
+    ordenado = np.sort(X, axis=1)
+    novo = np.ones(ordenado.shape, dtype=bool)
+    novo[:, 1:] = ordenado[:, 1:] != ordenado[:, :-1]
+    grupo = np.cumsum(novo.ravel()) - 1
+    t = np.bincount(grupo).astype(np.float64)
+    linha = np.repeat(np.arange(X.shape[0]), X.shape[1])[novo.ravel()]
+    return np.bincount(linha, weights=t * (t - 1) * (2 * t + 5), minlength=X.shape[0])
+
+
+def mann_kendall(X, lote=LOTE_SERIES):
+    X = np.asarray(X, dtype=np.float64)
+    n_series, n = X.shape
+    s = np.zeros(n_series)
+    declive = np.zeros(n_series)
+    if n < 3:
+        return {'s': s, 'z': s.copy(), 'p_valor': np.ones(n_series), 'declive': declive}
+
+    i, j = np.triu_indices(n, k=1)
+    distancia = (j - i).astype(np.float64)
+    for inicio in range(0, n_series, lote):
+        parte = X[inicio:inicio + lote]
+        diferencas = parte[:, j] - parte[:, i]
+        s[inicio:inicio + lote] = np.sign(diferencas).sum(axis=1)
+        declive[inicio:inicio + lote] = np.median(diferencas / distancia, axis=1)
+
+    variancia = (n * (n - 1) * (2 * n + 5) - _correcao_empates(X)) / 18.0
+    z = np.zeros(n_series)
+    validos = variancia > 0
+    z[validos] = (s[validos] - np.sign(s[validos])) / np.sqrt(variancia[validos])
+    return {'s': s, 'z': z, 'p_valor': p_valor_normal(z), 'declive': declive}
+
+
+def anomalia_ultimo_ano(X):
+    # z-score do último ano contra os anos anteriores da mesma série
+    X = np.asarray(X, dtype=np.float64)
+    if X.shape[1] < 3:
+        return np.zeros(X.shape[0])
+    historico = X[:, :-1]
+    media = historico.mean(axis=1)
+    desvio = historico.std(axis=1, ddof=1)
+    return np.divide(X[:, -1] - media, desvio, out=np.zeros(X.shape[0]), where=desvio > 0)
+
+
+def classifica_tendencia(resultado, alfa=0.05):
+    significativo = resultado['p_valor'] < alfa
+    return np.select(
+        [significativo & (resultado['s'] > 0), significativo & (resultado['s'] < 0)],
+        ['Tendência de Alta', 'Tendência de Queda'],
+        'Sem Tendência'
+    ).astype(object)
+
+
+# FREQUÊNCIA E PERÍODO DE RETORNO
+# Cada série anual recebe uma taxa de ocorrência: Poisson quando a variância não passa da média,
+# binomial negativa (momentos) quando há sobredispersão. A probabilidade anual de excedência é
+# P(N >= minimo) e o período de retorno é o seu inverso, comparáveis entre estados e janelas.
+def ajusta_frequencia(X, modelo='auto', expostos=None):
+    # expostos: anos (colunas) que contam em cada série; por padrão, todos
+    X = np.asarray(X, dtype=np.float64)
+    peso = np.ones_like(X) if expostos is None else np.asarray(expostos, dtype=np.float64)
+    n = peso.sum(axis=1)
+    media = np.divide((X * peso).sum(axis=1), n, out=np.zeros(X.shape[0]), where=n > 0)
+    variancia = np.divide((((X - media[:, None]) ** 2) * peso).sum(axis=1), n - 1, out=np.zeros(X.shape[0]), where=n > 1)
+    dispersao = (variancia > media) & (modelo != 'poisson')
+    # r = inf equivale à Poisson
+    r = np.full(X.shape[0], np.inf)
+    r[dispersao] = media[dispersao] ** 2 / (variancia[dispersao] - media[dispersao])
+    return {'media': media, 'variancia': variancia, 'r': r}
+
+
+def probabilidade_excedencia(ajuste, minimo=1):
+    media, r = ajuste['media'], ajuste['r']
+    poisson = ~np.isfinite(r)
+    r_nb = np.where(poisson, 1.0, r)
+    q = np.where(poisson, 0.0, media / (r_nb + media))
+
+    # pmf(0) e recorrência pmf(k + 1) = pmf(k) * razão(k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmf = np.where(poisson, np.exp(-media), np.exp(r_nb * np.log1p(-q)))
+    acumulada = np.zeros_like(media)
+    for k in range(minimo):
+        acumulada += pmf
+        pmf = np.where(poisson, pmf * media / (k + 1), pmf * (k + r_nb) / (k + 1) * q)
+    return np.clip(1.0 - acumulada, 0.0, 1.0)
+
+
+def periodo_retorno(probabilidade):
+    return np.divide(1.0, probabilidade, out=np.full(len(probabilidade), np.inf), where=probabilidade > 0)
+
+
+def classifica_periodo_retorno(periodo, limites=(2, 5, 10, 25)):
+    rotulos = np.array([f'Até {limites[0]} anos'] + [f'{a} a {b} anos' for a, b in zip(limites[:-1], limites[1:])] + [f'Acima de {limites[-1]} anos'], dtype=object)
+    return rotulos[np.searchsorted(np.asarray(limites, dtype=float), periodo, side='left')]
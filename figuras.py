@@ -0,0 +1,64 @@
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+
+# FIGURAS COMPACTAS
+# O st.plotly_chart serializa a figura com figure.to_dict() + plotly.io.to_json. No caminho padrão
+# cada número de z, customdata e cores vira texto decimal; aqui os arrays numéricos dos traços (e
+# dos quadros das animações) saem como arrays tipados do plotly.js ({dtype, bdata em base64, shape}),
+# que o navegador lê direto para um Float64Array/Int32Array. Com o orjson instalado o plotly.io usa
+# o codificador rápido sozinho (engine 'auto'). Texto (locations, hover) continua em lista JSON.
+# int64 não existe no plotly.js: desce para int32 quando cabe, senão vai como float64.
+TIPOS = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2', 'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+MINIMO_TIPADO = 16
+
+
+def array_tipado(valor):
+    if valor.dtype.kind not in 'iuf' or valor.size < MINIMO_TIPADO:
+        return None
+    if valor.dtype.name not in TIPOS:
+        if valor.dtype.kind in 'iu' and valor.min() >= np.iinfo(np.int32).min and valor.max() <= np.iinfo(np.int32).max:
+            valor = valor.astype(np.int32)
+        else:
+            valor = valor.astype(np.float64)
+    valor = np.ascontiguousarray(valor, dtype=valor.dtype.newbyteorder('<'))
+    tipado = {'dtype': TIPOS[valor.dtype.name], 'bdata': base64.b64encode(valor).decode('ascii')}
+    if valor.ndim > 1:
+        tipado['shape'] = ', '.join(str(n) for n in valor.shape)
+    return tipado
+
+
+def compacta_dados(objeto):
+    if isinstance(objeto, np.ndarray):
+        tipado = array_tipado(objeto)
+        return objeto if tipado is None else tipado
+    if isinstance(objeto, dict):
+        return {chave: compacta_dados(valor) for chave, valor in objeto.items()}
+    if isinstance(objeto, (list, tuple)):
+        return [compacta_dados(valor) for valor in objeto]
+    return objeto
+
+
+class FiguraCompacta(go.Figure):
+    # só muda a saída do to_dict (usado pelo st.plotly_chart e pelo to_json); a figura em si é a mesma
+    def to_dict(self):
+        figura = super().to_dict()
+        figura['data'] = compacta_dados(figura['data'])
+        if 'frames' in figura:
+            figura['frames'] = compacta_dados(figura['frames'])
+        return figura
+
+
+def compacta_figura(fig):
+    # figuras do plotly express: mesma estrutura, já validada, sem copiar de novo os arrays
+    compacta = FiguraCompacta(fig, _validate=False)
+    compacta._validate = True
+    return compacta
+
+
+def serializa_figura(fig, engine=None):
+    # o mesmo caminho do st.plotly_chart
+    return pio.to_json(fig.to_dict(), validate=False, engine=engine)
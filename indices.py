@@ -0,0 +1,560 @@
+import json
+import numpy as np
+import pandas as pd
+from pyroaring import BitMap
+
+
+# APÓLICES DISTINTAS
+# Cada apólice recebe um código inteiro denso e cada combinação (uf, ibge, mês, cultura)
+# guarda o conjunto de códigos em um bitmap comprimido (roaring). Contar apólices distintas
+# para qualquer filtro vira uma união de bitmaps seguida da cardinalidade.
+HLL_PRECISAO = 12
+HLL_REGISTROS = 1 << HLL_PRECISAO
+MES_NULO = 0
+
+
+def mes_chave(datas):
+    # data vazia vira MES_NULO, que nenhuma janela de meses seleciona
+    return (datas.dt.year * 100 + datas.dt.month).fillna(MES_NULO).astype('int32')
+
+
+def meses_completos(inicio, fim):
+    # meses inteiramente contidos em [inicio, fim), mesmo critério do filtro do app
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    primeiro = inicio if inicio.day == 1 else inicio + pd.offsets.MonthBegin(1)
+    ultimo = (fim if fim.day == 1 else fim - pd.offsets.MonthBegin(1)) - pd.offsets.MonthBegin(1)
+    if ultimo < primeiro:
+        return np.array([], dtype='int32')
+    periodo = pd.date_range(primeiro, ultimo, freq='MS')
+    return (periodo.year * 100 + periodo.month).to_numpy(dtype='int32')
+
+
+def _hash64(codigos):
+    # splitmix64: espalha os códigos inteiros para o HyperLogLog
+    x = codigos.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hll_registra(codigos):
+    h = _hash64(np.asarray(codigos))
+    posicao = (h >> np.uint64(64 - HLL_PRECISAO)).astype(np.int64)
+    resto = (h & np.uint64((1 << (64 - HLL_PRECISAO)) - 1)).astype(np.float64)
+    # posição do primeiro bit 1 nos 64 - p bits restantes (exato: resto < 2**53)
+    rank = (64 - HLL_PRECISAO + 1 - np.frexp(resto)[1]).astype(np.uint8)
+    return posicao, rank
+
+
+def _hll_atualiza(registros, codigos):
+    posicao, rank = _hll_registra(codigos)
+    np.maximum.at(registros, posicao, rank)
+    return registros
+
+
+def _hll_estima(registros):
+    m = HLL_REGISTROS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimativa = alpha * m * m / np.sum(np.power(2.0, -registros.astype(np.float64)))
+    vazios = np.count_nonzero(registros == 0)
+    if estimativa <= 2.5 * m and vazios > 0:
+        estimativa = m * np.log(m / vazios)
+    return int(round(estimativa))
+
+
+def indexa_apolices(df):
+    codigos, _ = pd.factorize(df.num_apolice)
+    codigos = codigos.astype(np.uint32)
+    # apólices sem data não entram em janela nenhuma: ficam fora dos baldes (o código continua
+    # alinhado ao df); uf, ibge e cultura vazios formam baldes próprios nos dois índices
+    mes = mes_chave(df.data_apolice).to_numpy()
+    validas = mes != MES_NULO
+    chaves = pd.DataFrame({
+        'uf': df.uf.to_numpy()[validas],
+        'ibge': df.ibge.to_numpy()[validas],
+        'mes': mes[validas],
+        'cultura': df.cultura.to_numpy()[validas],
+    })
+    codigos_validos = codigos[validas]
+
+    grupo = chaves.groupby(['uf', 'ibge', 'mes', 'cultura'], sort=True, dropna=False).ngroup().to_numpy()
+    ordem = np.argsort(grupo, kind='stable')
+    limites = np.flatnonzero(np.diff(grupo[ordem])) + 1
+    bitmaps = [BitMap(parte) for parte in np.split(codigos_validos[ordem], limites)]
+    baldes = chaves.iloc[ordem[np.r_[0, limites]]].reset_index(drop=True) if len(ordem) else chaves.iloc[:0]
+
+    # sketches HyperLogLog por (uf, mês) para totais nacionais aproximados; linha e grupo saem do mesmo ngroup
+    grupo_hll = chaves.groupby(['uf', 'mes'], sort=True, dropna=False).ngroup().to_numpy()
+    baldes_hll = chaves[['uf', 'mes']].assign(_grupo=grupo_hll).drop_duplicates('_grupo').sort_values('_grupo')
+    baldes_hll = baldes_hll.drop('_grupo', axis=1).reset_index(drop=True)
+    registros = np.zeros((len(baldes_hll), HLL_REGISTROS), dtype=np.uint8)
+    posicao, rank = _hll_registra(codigos_validos)
+    np.maximum.at(registros, (grupo_hll, posicao), rank)
+
+    # linhas do df ordenadas por mês: os meses parciais das bordas de uma janela são fatias, sem varrer o df
+    linhas_mes = np.argsort(mes, kind='stable')
+    return {'codigos': codigos, 'baldes': baldes, 'bitmaps': bitmaps, 'baldes_hll': baldes_hll, 'hll': registros,
+            'linhas_mes': linhas_mes, 'meses_linhas': mes[linhas_mes]}
+
+
+def linhas_parciais(indice, inicio, fim):
+    # posições (no df indexado) das linhas dos meses de borda de [inicio, fim) que não entram inteiros
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    bordas = {inicio.year * 100 + inicio.month, (fim - pd.Timedelta(days=1)).year * 100 + (fim - pd.Timedelta(days=1)).month}
+    bordas = sorted(bordas - set(meses_completos(inicio, fim).tolist()))
+    fatias = [indice['linhas_mes'][slice(*np.searchsorted(indice['meses_linhas'], [mes, mes + 1]))] for mes in bordas]
+    return np.sort(np.concatenate(fatias)) if fatias else np.array([], dtype=np.int64)
+
+
+def _filtra_baldes(baldes, meses, uf=None, culturas=None):
+    mascara = baldes.mes.isin(meses).to_numpy()
+    if uf is not None:
+        mascara = mascara & baldes.uf.eq(uf).to_numpy()
+    if culturas:
+        mascara = mascara & baldes.cultura.isin(culturas).to_numpy()
+    return np.flatnonzero(mascara)
+
+
+def conta_apolices(indice, df, inicio, fim, uf=None, culturas=None, por=None, aproximado=False):
+    # df: linhas já filtradas pelo app (com a coluna cod_apolice); só os meses parciais
+    # das bordas do intervalo são lidos dele, o restante sai dos bitmaps
+    completos = meses_completos(inicio, fim)
+    meses = mes_chave(df.data_apolice)
+    parciais = df.loc[(meses.ne(MES_NULO) & ~meses.isin(completos)).to_numpy()]
+
+    if aproximado and por is None and not culturas:
+        selecionados = indice['baldes_hll'].mes.isin(completos).to_numpy()
+        if uf is not None:
+            selecionados = selecionados & indice['baldes_hll'].uf.eq(uf).to_numpy()
+        registros = indice['hll'][selecionados].max(axis=0, initial=0)
+        if len(parciais):
+            registros = _hll_atualiza(registros.copy(), parciais.cod_apolice.to_numpy())
+        return _hll_estima(registros)
+
+    posicoes = _filtra_baldes(indice['baldes'], completos, uf, culturas)
+    if por is None:
+        conjunto = BitMap.union(BitMap(parciais.cod_apolice.to_numpy(np.uint32)), *[indice['bitmaps'][i] for i in posicoes])
+        return len(conjunto)
+
+    chaves_baldes = indice['baldes'][por].to_numpy()[posicoes]
+    conjuntos = {}
+    for chave, i in zip(chaves_baldes, posicoes):
+        conjuntos.setdefault(chave, []).append(indice['bitmaps'][i])
+    for chave, codigos in parciais.groupby(mes_chave(parciais.data_apolice) if por == 'mes' else parciais[por]).cod_apolice:
+        conjuntos.setdefault(chave, []).append(BitMap(codigos.to_numpy(np.uint32)))
+    return pd.Series({chave: len(BitMap.union(*bms)) for chave, bms in conjuntos.items()}, name='num_apolice', dtype='int64').sort_index()
+
+
+# MUNICÍPIOS
+# Os códigos IBGE viram posições densas; cada conjunto de municípios (segurados, sinistrados,
+# acima do p90...) acende um bit na máscara de cada posição e a classe sai de uma tabela de
+# rótulos indexada pela máscara, em uma única passada vetorizada.
+def indexa_municipios(codigos):
+    return pd.Index(pd.unique(np.asarray(codigos)))
+
+
+def _tipo_mascara(bits):
+    return np.uint8 if bits <= 8 else np.uint32
+
+
+def mascara_municipios(posicoes, conjuntos=(), mascaras=()):
+    # conjuntos: códigos IBGE (bits 0..); mascaras: arrays booleanos alinhados a posicoes (bits seguintes)
+    mascara = np.zeros(len(posicoes), dtype=_tipo_mascara(len(conjuntos) + len(mascaras)))
+    for bit, conjunto in enumerate(conjuntos):
+        conjunto = np.asarray(conjunto)
+        if conjunto.dtype == bool:
+            raise TypeError(f'conjunto {bit} é booleano: máscaras vão em mascaras=')
+        achados = posicoes.get_indexer(pd.unique(conjunto))
+        mascara[achados[achados >= 0]] |= mascara.dtype.type(1 << bit)
+    for bit, marcados in enumerate(mascaras, start=len(conjuntos)):
+        marcados = np.asarray(marcados)
+        if marcados.dtype != bool or len(marcados) != len(posicoes):
+            raise ValueError(f'máscara {bit} precisa ser booleana com {len(posicoes)} posições (veio {marcados.dtype}, {len(marcados)})')
+        mascara |= marcados.astype(mascara.dtype) << mascara.dtype.type(bit)
+    return mascara
+
+
+def classifica_mascara(codigos, conjuntos, rotulos, mascaras=()):
+    # rotulos[m] é a classe do município cuja máscara de pertinência é m (len(rotulos) == 2 ** (len(conjuntos) + len(mascaras)));
+    # aqui as mascaras são booleanas alinhadas a codigos, linha a linha
+    codigos = np.asarray(codigos)
+    posicoes = indexa_municipios(codigos)
+    bits = len(conjuntos) + len(mascaras)
+    mascara = mascara_municipios(posicoes, conjuntos).astype(_tipo_mascara(bits))[posicoes.get_indexer(codigos)]
+    for bit, marcados in enumerate(mascaras, start=len(conjuntos)):
+        marcados = np.asarray(marcados)
+        if marcados.dtype != bool or len(marcados) != len(codigos):
+            raise ValueError(f'máscara {bit} precisa ser booleana com {len(codigos)} linhas (veio {marcados.dtype}, {len(marcados)})')
+        mascara |= marcados.astype(mascara.dtype) << mascara.dtype.type(bit)
+    return np.asarray(rotulos, dtype=object)[mascara]
+
+
+def classifica_segurado(df, munis_segurados, munis_sinistrados):
+    # munis_segurados: códigos IBGE (bit 0); munis_sinistrados: booleano por linha de df, mais sinistros que a média (bit 1)
+    rotulos = ['Não Segurada', 'Menos Sinistros que a Média', 'Não Segurada', 'Mais Sinistros que a Média']
+    df['seg'] = classifica_mascara(df.code_muni, [munis_segurados], rotulos, mascaras=[munis_sinistrados])
+    return df
+
+
+# BUSCA DE MUNICÍPIOS
+# Índice montado uma única vez: por UF, arrays ordenados pelo nome normalizado (sem acento,
+# minúsculo) com código, latitude e longitude; um dicionário código -> posição para resolver a
+# seleção em O(1) e um índice invertido de trigramas para a busca aproximada.
+def normaliza_nome(nomes):
+    nomes = pd.Series(nomes, dtype=object).astype(str)
+    return nomes.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower().str.strip().to_numpy(dtype=object)
+
+
+def _trigramas(nome):
+    nome = f'  {nome} '
+    return {nome[i:i + 3] for i in range(len(nome) - 2)}
+
+
+def indexa_localidades(municipios, coordenadas):
+    base = municipios[['abbrev_state', 'code_muni', 'name_muni']].drop_duplicates('code_muni')
+    base = base.merge(coordenadas[['codarea', 'lat', 'lon']], how='left', left_on='code_muni', right_on='codarea').drop('codarea', axis=1)
+    base['chave'] = normaliza_nome(base.name_muni)
+    base = base.sort_values(['chave', 'abbrev_state'], kind='stable').reset_index(drop=True)
+
+    colunas = {
+        'uf': base.abbrev_state.to_numpy(dtype=object),
+        'codigo': base.code_muni.to_numpy(dtype=object),
+        'nome': base.name_muni.to_numpy(dtype=object),
+        'chave': base.chave.to_numpy(dtype=object),
+        'lat': base.lat.to_numpy(dtype=float, na_value=np.nan),
+        'lon': base.lon.to_numpy(dtype=float, na_value=np.nan),
+    }
+    por_uf = {uf: posicoes.to_numpy() for uf, posicoes in base.groupby('abbrev_state').groups.items()}
+
+    trigramas = {}
+    for posicao, chave in enumerate(colunas['chave']):
+        for trigrama in _trigramas(chave):
+            trigramas.setdefault(trigrama, []).append(posicao)
+
+    return {
+        **colunas,
+        'por_uf': por_uf,
+        'posicao': {codigo: posicao for posicao, codigo in enumerate(colunas['codigo'])},
+        'trigramas': {trigrama: np.array(posicoes) for trigrama, posicoes in trigramas.items()},
+    }
+
+
+def municipios_uf(indice, uf):
+    return indice['codigo'][indice['por_uf'].get(uf, np.array([], dtype=int))].tolist()
+
+
+def nome_municipio(indice, codigo, com_uf=False):
+    posicao = indice['posicao'].get(codigo)
+    if posicao is None:
+        return codigo
+    return f"{indice['nome'][posicao]} ({indice['uf'][posicao]})" if com_uf else indice['nome'][posicao]
+
+
+def coordenadas_municipio(indice, codigo):
+    posicao = indice['posicao'][codigo]
+    return indice['lat'][posicao], indice['lon'][posicao]
+
+
+def busca_municipios(indice, termo, uf=None, limite=10):
+    termo = normaliza_nome([termo])[0]
+    if not termo:
+        return []
+    chaves = indice['chave']
+
+    # prefixo: intervalo contíguo no array ordenado
+    inicio = np.searchsorted(chaves, termo, side='left')
+    fim = np.searchsorted(chaves, termo + '￿', side='left')
+    candidatos = np.arange(inicio, fim)
+    if uf is not None:
+        candidatos = candidatos[indice['uf'][candidatos] == uf]
+    encontrados = candidatos[:limite].tolist()
+
+    # trigramas: completa com os nomes mais parecidos (erros de digitação, palavras do meio)
+    if len(encontrados) < limite:
+        listas = [indice['trigramas'][t] for t in _trigramas(termo) if t in indice['trigramas']]
+        if listas:
+            posicoes, votos = np.unique(np.concatenate(listas), return_counts=True)
+            if uf is not None:
+                filtro = indice['uf'][posicoes] == uf
+                posicoes, votos = posicoes[filtro], votos[filtro]
+            ordem = np.lexsort((posicoes, -votos))
+            vistos = set(encontrados)
+            for posicao in posicoes[ordem]:
+                if len(encontrados) >= limite:
+                    break
+                if posicao not in vistos:
+                    encontrados.append(int(posicao))
+    return indice['codigo'][encontrados].tolist()
+
+
+# AGRUPAMENTO DE EVENTOS
+# Grade em Web Mercator por nível de zoom (estilo supercluster): cada célula tem ~TAMANHO_CELULA px
+# na tela naquele zoom. As somas de contagem/lat/lon ficam pré-agregadas por (tipologia, ano, país,
+# zoom, célula), em um bloco por (zoom, tipologia) ordenado por ano: qualquer janela de anos é uma
+# fatia contígua do bloco (searchsorted) somada, sem varrer os outros zooms e tipologias.
+ZOOM_MAXIMO = 10
+TAMANHO_CELULA = 60
+
+
+def _mercator(lat, lon):
+    lat = np.clip(np.radians(lat), -1.4844, 1.4844)
+    x = (np.asarray(lon) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return x, y
+
+
+def indexa_eventos(df, zoom_maximo=ZOOM_MAXIMO):
+    eventos = df.dropna(subset=['latitude', 'longitude'])
+    lat = eventos.latitude.to_numpy(dtype=float)
+    lon = eventos.longitude.to_numpy(dtype=float)
+    x, y = _mercator(lat, lon)
+    base = pd.DataFrame({
+        'descricao_tipologia': eventos.descricao_tipologia.to_numpy(),
+        'ano': eventos.ano.to_numpy(),
+        'cod_uf': eventos.cod_uf.to_numpy(),
+        'lat': lat,
+        'lon': lon,
+    })
+
+    blocos = {}
+    for zoom in range(zoom_maximo + 1):
+        celulas = int(2 ** zoom * 256 / TAMANHO_CELULA) + 1
+        base['celula'] = np.floor(y * celulas).astype(np.int64) * celulas + np.floor(x * celulas).astype(np.int64)
+        nivel = base.groupby(['descricao_tipologia', 'ano', 'cod_uf', 'celula'], as_index=False).agg(eventos=('lat', 'size'), lat=('lat', 'sum'), lon=('lon', 'sum'))
+        for tipologia, bloco in nivel.groupby('descricao_tipologia', sort=False):
+            blocos[(zoom, tipologia)] = bloco.drop('descricao_tipologia', axis=1).sort_values('ano', kind='stable').reset_index(drop=True)
+    vazio = pd.DataFrame({'ano': base.ano.iloc[:0], 'cod_uf': base.cod_uf.iloc[:0], 'celula': np.array([], dtype=np.int64),
+                          'eventos': np.array([], dtype=np.int64), 'lat': np.array([]), 'lon': np.array([])})
+    return {'zoom_maximo': zoom_maximo, 'blocos': blocos, 'vazio': vazio}
+
+
+def agrupa_eventos(indice, zoom, tipologia, inicio, fim, pais=None):
+    zoom = int(np.clip(round(zoom), 0, indice['zoom_maximo']))
+    bloco = indice['blocos'].get((zoom, tipologia), indice['vazio'])
+    anos = bloco.ano.to_numpy(dtype=float, na_value=np.nan)
+    parte = bloco.iloc[np.searchsorted(anos, inicio, side='left'):np.searchsorted(anos, fim, side='right')]
+    if pais is not None:
+        parte = parte[parte.cod_uf.eq(pais).to_numpy()]
+    grupos = parte.groupby('celula')[['eventos', 'lat', 'lon']].sum()
+    grupos['lat'] = grupos.lat / grupos.eventos
+    grupos['lon'] = grupos.lon / grupos.eventos
+    return grupos.reset_index(drop=True).sort_values('eventos', ascending=False)
+
+
+# SOMAS POR JANELA DE ANOS
+# Para cada combinação de chaves (país, uf, município, tipologia...) guarda-se a soma acumulada
+# ano a ano das ocorrências e de cada coluna de dano. Qualquer intervalo [inicio, fim] do slider é a
+# diferença entre duas linhas do acumulado, sem voltar às linhas brutas.
+def indexa_anos(df, chaves, medidas=()):
+    anos = np.arange(int(df.ano.min()), int(df.ano.max()) + 1)
+    codigo = df.groupby(list(chaves), dropna=False, sort=True).ngroup().to_numpy()
+    tabela = df[list(chaves)].assign(_codigo=codigo).drop_duplicates('_codigo').sort_values('_codigo')
+    tabela = tabela.drop('_codigo', axis=1).reset_index(drop=True)
+
+    n_chaves = len(tabela)
+    posicao = (df.ano.to_numpy(dtype=np.int64) - anos[0] + 1) * n_chaves + codigo
+    tamanho = (len(anos) + 1) * n_chaves
+    colunas = [np.bincount(posicao, minlength=tamanho)]
+    for medida in medidas:
+        colunas.append(np.bincount(posicao, weights=df[medida].fillna(0).to_numpy(dtype=np.float64), minlength=tamanho))
+    acumulado = np.stack(colunas, axis=-1).reshape(len(anos) + 1, n_chaves, len(colunas)).astype(np.float64)
+    np.cumsum(acumulado, axis=0, out=acumulado)
+
+    return {'anos': anos, 'chaves': tabela, 'medidas': ['ocorrencias', *medidas], 'acumulado': acumulado}
+
+
+def _blocos_anos(indice, inicio, fim, por, anual, filtros):
+    # filtros: coluna=valor ou coluna=[valores]; None ignora o filtro
+    chaves, anos = indice['chaves'], indice['anos']
+    mascara = np.ones(len(chaves), dtype=bool)
+    for coluna, valor in filtros.items():
+        if valor is None:
+            continue
+        valores = valor if isinstance(valor, (list, tuple, set, np.ndarray, pd.Series)) else [valor]
+        mascara &= chaves[coluna].isin(valores).to_numpy()
+    posicoes = np.flatnonzero(mascara)
+
+    i = int(np.clip(inicio - anos[0], 0, len(anos)))
+    f = int(np.clip(fim - anos[0] + 1, i, len(anos)))
+    acumulado = indice['acumulado'][:, posicoes]
+    bloco = np.diff(acumulado[i:f + 1], axis=0) if anual else (acumulado[f] - acumulado[i])[None]
+
+    por = list(por)
+    if por:
+        grupos = chaves.iloc[posicoes][por].reset_index(drop=True)
+        codigo = grupos.groupby(por, dropna=False, sort=True).ngroup().to_numpy()
+        ordem = np.argsort(codigo, kind='stable')
+        inicios = np.flatnonzero(np.r_[True, np.diff(codigo[ordem]) != 0]) if len(ordem) else np.array([], dtype=int)
+        bloco = np.add.reduceat(bloco[:, ordem], inicios, axis=1) if len(ordem) else bloco[:, :0]
+        rotulos = grupos.iloc[ordem[inicios]].reset_index(drop=True)
+    else:
+        bloco = bloco.sum(axis=1, keepdims=True)
+        rotulos = pd.DataFrame(index=[0])
+    return rotulos, bloco, anos[i:f]
+
+
+def agrega_anos(indice, inicio, fim, por=(), anual=False, **filtros):
+    rotulos, bloco, anos = _blocos_anos(indice, inicio, fim, por, anual, filtros)
+    n_anos, n_grupos = bloco.shape[0], bloco.shape[1]
+    resultado = pd.concat([rotulos] * n_anos, ignore_index=True) if len(por) else pd.DataFrame(index=range(n_anos))
+    if anual:
+        resultado.insert(0, 'ano', np.repeat(anos, n_grupos))
+    for j, medida in enumerate(indice['medidas']):
+        resultado[medida] = bloco[:, :, j].reshape(-1)
+    resultado['ocorrencias'] = resultado.ocorrencias.astype(np.int64)
+    return resultado[resultado.ocorrencias > 0].reset_index(drop=True)
+
+
+def matriz_anos(indice, inicio, fim, por, medida='ocorrencias', **filtros):
+    # séries completas (com zeros) de cada grupo: matriz grupos x anos
+    rotulos, bloco, anos = _blocos_anos(indice, inicio, fim, por, True, filtros)
+    return rotulos, bloco[:, :, indice['medidas'].index(medida)].T, anos
+
+
+# JUNÇÃO ESPAÇO-TEMPORAL
+# Cada par (município, tipologia) vira um grupo inteiro e cada evento uma chave grupo * 2^32 + dia,
+# ordenada uma única vez: é a linha do tempo de todos os municípios concatenada. Para um sinistro
+# basta um searchsorted na mesma chave e olhar os vizinhos imediatos, sem produto cartesiano.
+def _dias(datas):
+    dias = pd.Series(datas).astype('datetime64[ns]').to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(dias), np.iinfo(np.int64).min, dias.astype(np.int64))
+
+
+def indexa_linha_tempo(eventos, municipio='ibge', tipologia='descricao_tipologia', data='data'):
+    grupos = pd.MultiIndex.from_arrays([eventos[municipio].to_numpy(), eventos[tipologia].to_numpy()]).unique()
+    grupo = grupos.get_indexer(pd.MultiIndex.from_arrays([eventos[municipio].to_numpy(), eventos[tipologia].to_numpy()]))
+    dias = _dias(eventos[data])
+    validos = dias != np.iinfo(np.int64).min
+    chaves = np.sort((grupo[validos].astype(np.int64) << 32) + dias[validos])
+    return {'grupos': grupos, 'chaves': chaves}
+
+
+def associa_eventos(indice, sinistros, janela=30, municipio='ibge', tipologia='descricao_tipologia', data='data_apolice'):
+    # devolve, alinhado a sinistros, a defasagem em dias (evento - sinistro) do evento mais próximo
+    # dentro de +-janela dias, ou NaN quando nenhum evento da mesma tipologia no município se encaixa
+    grupo = indice['grupos'].get_indexer(pd.MultiIndex.from_arrays([sinistros[municipio].to_numpy(), sinistros[tipologia].to_numpy()]))
+    dias = _dias(sinistros[data])
+    validos = (grupo >= 0) & (dias != np.iinfo(np.int64).min)
+    defasagem = np.full(len(sinistros), np.nan)
+    if not validos.any() or len(indice['chaves']) == 0:
+        return defasagem
+
+    chave = (grupo[validos].astype(np.int64) << 32) + dias[validos]
+    chaves = indice['chaves']
+    posicao = np.searchsorted(chaves, chave)
+    melhor = np.full(len(chave), np.inf)
+    for vizinho in (posicao - 1, posicao):
+        dentro = (vizinho >= 0) & (vizinho < len(chaves))
+        candidato = chaves[np.clip(vizinho, 0, len(chaves) - 1)]
+        mesmo_grupo = dentro & ((candidato >> 32) == (chave >> 32))
+        diferenca = np.where(mesmo_grupo, candidato - chave, np.inf)
+        melhor = np.where(np.abs(diferenca) < np.abs(melhor), diferenca, melhor)
+    defasagem[validos] = np.where(np.abs(melhor) <= janela, melhor, np.nan)
+    return defasagem
+
+
+def taxa_explicada(sinistros, defasagem, por=('ibge', 'cultura')):
+    tabela = sinistros[list(por)].assign(explicado=~np.isnan(defasagem))
+    tabela = tabela.groupby(list(por), as_index=False, observed=True).agg(sinistros=('explicado', 'size'), explicados=('explicado', 'sum'))
+    tabela['taxa_explicada'] = tabela.explicados / tabela.sinistros * 100
+    return tabela
+
+
+# JUNÇÃO ESPACIAL
+# (shapely é importado dentro das funções: só a geração do cache em disco precisa dele.)
+# Os polígonos da malha vão para uma STRtree; todos os pontos são consultados de uma vez
+# (predicado 'intersects'), e quem cai fora de tudo (litoral, ilhas simplificadas) fica com o
+# polígono mais próximo dentro da tolerância, em graus.
+def _geometrias(geojson, prop='codarea'):
+    import shapely
+    geometrias = shapely.from_geojson([json.dumps(f['geometry']) for f in geojson['features']])
+    codigos = np.array([str(f['properties'][prop]) for f in geojson['features']], dtype=object)
+    return geometrias, codigos
+
+
+def atribui_unidades(lat, lon, geojson, prop='codarea', tolerancia=0.5):
+    import shapely
+    geometrias, codigos = _geometrias(geojson, prop)
+    arvore = shapely.STRtree(geometrias)
+    pontos = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    unidade = np.full(len(pontos), -1, dtype=np.int64)
+
+    ponto, poligono = arvore.query(pontos, predicate='intersects')
+    primeiro = np.unique(ponto, return_index=True)[1]
+    unidade[ponto[primeiro]] = poligono[primeiro]
+
+    faltando = np.flatnonzero(unidade < 0)
+    if len(faltando):
+        ponto, poligono = arvore.query_nearest(pontos[faltando], max_distance=tolerancia, all_matches=False)
+        unidade[faltando[ponto]] = poligono
+    return np.where(unidade >= 0, codigos[np.maximum(unidade, 0)], None)
+
+
+def paises_unidades(unidades, paises, prop='codarea'):
+    import shapely
+    # país de cada unidade subnacional: o ponto representativo do polígono na malha de países
+    geometrias, codigos = _geometrias(unidades, prop)
+    representativos = shapely.point_on_surface(geometrias)
+    pais = atribui_unidades(shapely.get_y(representativos), shapely.get_x(representativos), paises, prop)
+    return pd.DataFrame({'unidade': codigos, 'pais': pais})
+
+
+def vizinhos(geojson, prop='codarea', folga=0.01):
+    import shapely
+    # pares de polígonos que se tocam; a folga (graus) cobre as fronteiras das malhas simplificadas
+    geometrias, codigos = _geometrias(geojson, prop)
+    a, b = shapely.STRtree(geometrias).query(shapely.buffer(geometrias, folga), predicate='intersects')
+    resultado = {codigo: [] for codigo in codigos}
+    for i, j in zip(a, b):
+        if i != j:
+            resultado[codigos[i]].append(codigos[j])
+    return resultado
+
+
+# SUSEP MENSAL
+# A tabela da SUSEP vira um rollup por (uf, mês, seguradora, ramo) com as seis medidas, ordenado
+# por uf e mês: o recorte de um estado numa janela é uma fatia contígua. Para o ranking das
+# seguradoras cada UF guarda o prêmio direto acumulado mês a mês por seguradora, então qualquer
+# janela ordena as seguradoras pela diferença de duas linhas do acumulado.
+MEDIDAS_SUSEP = ['premio_dir', 'premio_ret', 'prem_ret_liq', 'sin_dir', 'salvados', 'recuperacao']
+
+
+def indexa_susep(df, medidas=MEDIDAS_SUSEP):
+    rollup = df.assign(mes=mes_chave(df.data)).groupby(['uf', 'mes', 'seguradora', 'ramo'], sort=True, observed=True, dropna=False)[medidas].sum().reset_index()
+    rollup[medidas] = rollup[medidas].astype(np.float64)
+
+    ufs = {}
+    for uf, linhas in rollup.groupby('uf', sort=False, observed=True).indices.items():
+        inicio, fim = int(linhas[0]), int(linhas[-1]) + 1
+        parte = rollup.iloc[inicio:fim]
+        parte = parte[parte.seguradora.notna().to_numpy()]
+        meses, mes = np.unique(parte.mes.to_numpy(dtype=np.int32), return_inverse=True)
+        seguradoras, seguradora = np.unique(parte.seguradora.to_numpy(dtype=object).astype(str), return_inverse=True)
+        # linha 0 zerada; presença conta à parte do prêmio (seguradora com prêmio zero também entra)
+        posicao = (mes + 1) * len(seguradoras) + seguradora
+        tamanho = (len(meses) + 1) * len(seguradoras)
+        premio = np.bincount(posicao, weights=parte.premio_dir.to_numpy(dtype=np.float64), minlength=tamanho).reshape(-1, len(seguradoras))
+        presenca = np.bincount(posicao, minlength=tamanho).reshape(-1, len(seguradoras))
+        ufs[uf] = {'inicio': inicio, 'fim': fim, 'meses': meses, 'seguradoras': seguradoras, 'premio': np.cumsum(premio, axis=0), 'presenca': np.cumsum(presenca, axis=0)}
+    return {'rollup': rollup, 'ufs': ufs}
+
+
+def recorte_susep(indice, uf, inicio, fim):
+    # mesmo critério de data >= inicio & data < fim, com a data da SUSEP no primeiro dia do mês
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    primeiro = inicio if inicio.day == 1 else inicio + pd.offsets.MonthBegin(1)
+    ultimo = (fim - pd.Timedelta(days=1)).replace(day=1)
+    estado = indice['ufs'].get(uf)
+    if estado is None or ultimo < primeiro:
+        return indice['rollup'].iloc[:0], []
+
+    chave_inicio, chave_fim = primeiro.year * 100 + primeiro.month, ultimo.year * 100 + ultimo.month
+    i, f = np.searchsorted(estado['meses'], [chave_inicio, chave_fim + 1], side='left')
+    mes_rollup = indice['rollup'].mes.to_numpy()[estado['inicio']:estado['fim']]
+    a, b = np.searchsorted(mes_rollup, [chave_inicio, chave_fim + 1], side='left')
+    parte = indice['rollup'].iloc[estado['inicio'] + a:estado['inicio'] + b]
+
+    premio = estado['premio'][f] - estado['premio'][i]
+    presentes = np.flatnonzero(estado['presenca'][f] - estado['presenca'][i])
+    ordem = presentes[np.argsort(-premio[presentes], kind='stable')]
+    return parte, estado['seguradoras'][ordem].tolist()
@@ -0,0 +1,198 @@
+import os
+import re
+import csv
+import sys
+import shutil
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from compartilhado import ESQUEMAS, SEGURADORAS
+
+
+# INGESTÃO DOS CSVs BRUTOS
+# Os extratos do PSR e da SUSEP (vários GB, ';' e latin-1) viram o parquet que o app lê, sem passar
+# por um dataframe inteiro: o arquivo é lido em blocos de BLOCO_MB cortados no fim de linha, cada bloco
+# é lido e convertido numa thread (nomes das colunas, espaços, nomes das seguradoras, tipos) e escrito
+# direto na partição. No máximo threads * 2 blocos ficam em voo, então a memória não cresce com o CSV
+# (o leitor em streaming do pyarrow lê adiante sem limite quando a conversão é mais lenta que o disco).
+# Os blocos assumem que não há quebra de linha dentro de campos entre aspas. A saída é um
+# dataset hive (PSR_COMPLETO.parquet/ano=2016/parte-0.parquet ...) montado numa pasta temporária e
+# trocado no fim; o pq.read_table do app lê a pasta como lia o arquivo único. Para gerar:
+#   python ingestao.py <fonte> <csv> [csv ...]      ex.: python ingestao.py PSR_COMPLETO psr_2006_2015.csv psr_2016_2021.csv
+# Os CSVs podem ter cabeçalhos diferentes (colunas novas de um ano para outro): o esquema de saída é a
+# união dos cabeçalhos, na ordem em que aparecem, e a coluna que falta num arquivo sai nula.
+# Colunas fora de 'tipos' ficam em texto. O float32 de dinheiro continua na publicação (otimiza_esquema),
+# que olha a coluna inteira; aqui só entram as regras que não dependem dos dados.
+BLOCO_MB = 64
+PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+THREADS = os.cpu_count()
+FONTES = {
+    # renomeia: cabeçalho normalizado (minúsculo, sem acento, '_') -> coluna do app
+    'PSR_COMPLETO': {
+        'separador': ';', 'codificacao': 'latin-1',
+        'renomeia': {'nm_razao_social': 'seguradora', 'sg_uf_propriedade': 'uf', 'nm_municipio_propriedade': 'municipio', 'cd_geocmu': 'ibge',
+                     'nm_cultura_global': 'cultura', 'nr_area_total': 'area_total', 'nr_produtividade_segurada': 'prod_segurada',
+                     'vl_premio_liquido': 'valor_premio', 'vl_subvencao_federal': 'valor_subvencao', 'dt_apolice': 'data_apolice',
+                     'ano_apolice': 'ano', 'nr_apolice': 'num_apolice'},
+        'tipos': {'ano': pa.int32(), 'data_apolice': pa.timestamp('s'), 'area_total': pa.float64(), 'prod_segurada': pa.float64(), 'pe_taxa': pa.float64(),
+                  'valor_premio': pa.float64(), 'valor_subvencao': pa.float64(), 'valor_indenizacao': pa.float64()},
+        'seguradora': 'seguradora',
+        'particao': 'ano',
+    },
+    'susep_agro2': {
+        'separador': ';', 'codificacao': 'latin-1',
+        'renomeia': {'noenti': 'seguradora'},
+        'tipos': {'premio_dir': pa.float64(), 'premio_ret': pa.float64(), 'prem_ret_liq': pa.float64(), 'sin_dir': pa.float64(), 'salvados': pa.float64(), 'recuperacao': pa.float64()},
+        'seguradora': 'seguradora',
+        'particao': None,
+    },
+}
+
+
+def normaliza_cabecalho(nome):
+    sem_acento = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^0-9a-z]+', '_', sem_acento.lower()).strip('_')
+
+
+def le_cabecalho(caminho, fonte):
+    with open(caminho, encoding=fonte['codificacao'], newline='') as f:
+        cabecalho = next(csv.reader(f, delimiter=fonte['separador']))
+    return [fonte['renomeia'].get(normaliza_cabecalho(nome), normaliza_cabecalho(nome)) for nome in cabecalho]
+
+
+def blocos_csv(caminho, bloco_mb=BLOCO_MB):
+    # bytes crus, sem o cabeçalho, cada bloco terminando numa quebra de linha
+    with open(caminho, 'rb') as f:
+        f.readline()
+        resto = b''
+        while True:
+            dados = f.read(int(bloco_mb * 2 ** 20))
+            if not dados:
+                if resto.strip():
+                    yield resto
+                return
+            dados = resto + dados
+            corte = dados.rfind(b'\n') + 1
+            if corte:
+                yield dados[:corte]
+            resto = dados[corte:]
+
+
+def le_bloco(bruto, fonte, colunas):
+    # nomes e tipos fixos: todos os blocos de um arquivo saem com o mesmo esquema
+    return pacsv.read_csv(
+        pa.BufferReader(bruto),
+        read_options=pacsv.ReadOptions(column_names=colunas, encoding=fonte['codificacao'], use_threads=False),
+        parse_options=pacsv.ParseOptions(delimiter=fonte['separador']),
+        convert_options=pacsv.ConvertOptions(
+            column_types={nome: fonte['tipos'].get(nome, pa.string()) for nome in colunas},
+            decimal_point=',', timestamp_parsers=['%d/%m/%Y', '%d/%m/%Y %H:%M:%S', pacsv.ISO8601],
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def normaliza_nomes(coluna, mapa):
+    # o mapa roda só sobre os valores distintos do bloco (dicionário), não linha a linha
+    codificada = pc.dictionary_encode(coluna)
+    valores = codificada.dictionary.to_pylist()
+    return pc.take(pa.array([mapa.get(v, v) for v in valores], type=pa.string()), codificada.indices)
+
+
+def converte_bloco(bruto, fonte, nomes, esquema):
+    lote = le_bloco(bruto, fonte, nomes)
+    colunas = []
+    for nome, coluna in zip(lote.column_names, lote.columns):
+        coluna = coluna.combine_chunks()
+        if pa.types.is_string(coluna.type):
+            coluna = pc.utf8_trim_whitespace(pc.replace_substring_regex(coluna, r'\s+', ' '))
+            if nome == fonte.get('seguradora'):
+                coluna = normaliza_nomes(coluna, SEGURADORAS)
+        colunas.append(coluna)
+    # colunas na ordem do esquema unificado; as que este arquivo não tem saem nulas
+    lidas = dict(zip(lote.column_names, colunas))
+    tabela = pa.Table.from_arrays([lidas[campo.name].cast(campo.type) if campo.name in lidas else pa.nulls(len(lote), campo.type) for campo in esquema], schema=esquema)
+
+    # pasta da partição -> linhas do bloco; sem valor vai para a partição nula do hive
+    particao = fonte.get('particao')
+    if particao is None:
+        return {'': tabela}
+    partes = {}
+    for valor in pc.unique(tabela[particao]).to_pylist():
+        filtro = pc.is_null(tabela[particao]) if valor is None else pc.equal(tabela[particao], valor)
+        partes[f'{particao}={PARTICAO_NULA if valor is None else valor}'] = tabela.filter(filtro).drop_columns([particao])
+    return partes
+
+
+def esquema_saida(colunas, nome_fonte, fonte):
+    medidas = set(ESQUEMAS.get(nome_fonte, {}).get('medidas', ()))
+    campos = []
+    for nome in colunas:
+        tipo = fonte['tipos'].get(nome, pa.string())
+        campos.append(pa.field(nome, pa.float32() if nome in medidas and pa.types.is_float64(tipo) else tipo))
+    return pa.schema(campos)
+
+
+def troca_pasta(temporaria, destino):
+    # o destino some só pelo tempo de dois renames; um parquet antigo em arquivo único também é trocado
+    antigo = f'{destino}.{os.getpid()}.antigo'
+    if os.path.isdir(destino):
+        os.replace(destino, antigo)
+    elif os.path.exists(destino):
+        os.remove(destino)
+    os.replace(temporaria, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+
+
+def ingere(nome_fonte, arquivos, destino=None, threads=THREADS, bloco_mb=BLOCO_MB):
+    fonte = FONTES[nome_fonte]
+    destino = destino or f'{nome_fonte}.parquet'
+    temporaria = f'{destino}.{os.getpid()}.tmp'
+    shutil.rmtree(temporaria, ignore_errors=True)
+    escritores, linhas, concluida = {}, 0, False
+    cabecalhos = {arquivo: le_cabecalho(arquivo, fonte) for arquivo in arquivos}
+    esquema = esquema_saida(list(dict.fromkeys(nome for colunas in cabecalhos.values() for nome in colunas)), nome_fonte, fonte)
+
+    def escreve(partes):
+        nonlocal linhas
+        for particao, tabela in partes.items():
+            if particao not in escritores:
+                pasta = os.path.join(temporaria, particao)
+                os.makedirs(pasta, exist_ok=True)
+                escritores[particao] = pq.ParquetWriter(os.path.join(pasta, 'parte-0.parquet'), tabela.schema, compression='zstd')
+            escritores[particao].write_table(tabela)
+            linhas += len(tabela)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for arquivo in arquivos:
+                em_voo = []
+                for bruto in blocos_csv(arquivo, bloco_mb):
+                    em_voo.append(executor.submit(converte_bloco, bruto, fonte, cabecalhos[arquivo], esquema))
+                    # no máximo 2 blocos por thread esperando escrita; a escrita segue a ordem do CSV
+                    if len(em_voo) >= threads * 2:
+                        escreve(em_voo.pop(0).result())
+                for tarefa in em_voo:
+                    escreve(tarefa.result())
+        concluida = True
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+        # falha no meio: a pasta temporária não fica para trás (o destino antigo segue intacto)
+        if not concluida:
+            shutil.rmtree(temporaria, ignore_errors=True)
+    troca_pasta(temporaria, destino)
+    return {'destino': destino, 'linhas': linhas, 'particoes': len(escritores)}
+
+
+if __name__ == '__main__':
+    from compartilhado import rss_mb
+    import resource
+    resultado = ingere(sys.argv[1], sys.argv[2:])
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{resultado["linhas"]} linhas em {resultado["particoes"]} partições de {resultado["destino"]}/ (pico de memória {pico:.0f} MB, agora {rss_mb():.0f} MB)')
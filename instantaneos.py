@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import html
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from compartilhado import assinatura_arquivo
+
+
+# INSTANTÂNEOS
+# A visão padrão de cada aba (filtros no valor inicial) é renderizada em lote para cada UF e país:
+# o app roda sem navegador (AppTest) em um pool de processos, e os títulos, métricas e figuras de
+# cada aba viram um pacote JSON (mais uma página HTML autônoma) por local. Na primeira tela o app
+# mostra o pacote em vez de montar as figuras; o pacote só vale para a mesma assinatura do código
+# e dos dados (ARQUIVOS_APP: fontes versionados, nunca arquivos gerados pelo próprio app). Para gerar:
+#   python instantaneos.py [processos]
+PASTA_INSTANTANEOS = os.environ.get('OBSERVARIO_INSTANTANEOS', 'instantaneos')
+APP = 'app2.py'
+TEMPO_LIMITE = 600
+ABAS = {
+    # aba: posição em st.tabs, chave do seletor principal, blocos do topo que não entram no pacote
+    # (na América Latina o primeiro bloco não depende do país e continua ao vivo) e cabeçalhos
+    # escritos antes do ponto de corte
+    'uf': {'posicao': 0, 'seletor': 'uf_br', 'pula': 0, 'fixos': ['Parâmetros de Análise']},
+    'agro': {'posicao': 1, 'seletor': 'uf_psr', 'pula': 0, 'fixos': ['Parâmetros de Análise']},
+    'latam': {'posicao': 2, 'seletor': 'pais_br', 'pula': 1, 'fixos': ['Refinar Parâmetros']},
+}
+TEXTOS = {'title', 'header', 'subheader', 'caption'}
+ARQUIVOS_APP = [
+    # código que monta as abas
+    'app2.py', 'compartilhado.py', 'indices.py', 'estatistica.py', 'simulacao.py', 'figuras.py', 'ingestao.py', 'instantaneos.py',
+    # dados lidos pelo app
+    'desastres_latam2.parquet', 'area2.parquet', 'coord_uf.parquet', 'coord_muni.parquet', 'pop_pib_muni.parquet', 'pop_pib_latam.parquet',
+    'coord_latam3.parquet', 'PSR_COMPLETO.parquet', 'susep_agro2.parquet', 'malha_brasileira.json', 'malha_latam.json', 'latam+br_uf.json',
+]
+
+
+def assinatura_app(pasta='.'):
+    # arquivo ausente entra como tal: some da pasta, muda a assinatura
+    resumo = hashlib.blake2b(digest_size=16)
+    for arquivo in ARQUIVOS_APP:
+        caminho = os.path.join(pasta, arquivo)
+        resumo.update(f'{arquivo}={assinatura_arquivo(caminho) if os.path.exists(caminho) else "-"};'.encode())
+    return resumo.hexdigest()
+
+
+def caminho_instantaneo(aba, local, extensao='json', pasta=PASTA_INSTANTANEOS):
+    nome = re.sub(r'[^\w]+', '_', str(local))
+    return os.path.join(pasta, aba, f'{nome}.{extensao}')
+
+
+def _coleta(nos, fixos, itens):
+    for filho in nos:
+        tipo = getattr(filho, 'type', None)
+        if tipo in TEXTOS and filho.value not in fixos:
+            itens.append({'tipo': tipo, 'texto': filho.value})
+        elif tipo == 'metric':
+            itens.append({'tipo': 'metric', 'rotulo': filho.label, 'valor': filho.value})
+        elif tipo == 'plotly_chart':
+            itens.append({'tipo': 'figura', 'spec': json.loads(filho.proto.spec)})
+        else:
+            _coleta(getattr(filho, 'children', {}).values(), fixos, itens)
+    return itens
+
+
+def coleta_aba(at, aba):
+    config = ABAS[aba]
+    blocos = list(at.tabs[config['posicao']].children.values())[config['pula']:]
+    return _coleta(blocos, config['fixos'], [])
+
+
+def html_instantaneo(pacote):
+    # página autônoma: plotly.js do CDN e uma div por figura
+    partes = ['<html><head><meta charset="utf-8"><script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>',
+              '<style>body{font-family:sans-serif;margin:0}.metricas{display:flex;gap:2em}.metrica b{display:block;font-size:1.6em}</style></head><body>']
+    metricas = []
+    for i, item in enumerate(pacote['itens'] + [{'tipo': None}]):
+        texto = html.escape(item.get('texto', ''))
+        if item['tipo'] == 'metric':
+            metricas.append(f'<div class="metrica">{html.escape(item["rotulo"])}<b>{html.escape(item["valor"])}</b></div>')
+            continue
+        if metricas:
+            partes.append(f'<div class="metricas">{"".join(metricas)}</div>')
+            metricas = []
+        if item['tipo'] in ('title', 'header'):
+            partes.append(f'<h2>{texto}</h2>')
+        elif item['tipo'] == 'subheader':
+            partes.append(f'<h3>{texto}</h3>')
+        elif item['tipo'] == 'caption':
+            partes.append(f'<p style="color:#777">{texto}</p>')
+        elif item['tipo'] == 'figura':
+            spec = json.dumps(item['spec']).replace('</', '<\\/')
+            partes.append(f'<div id="f{i}"></div><script>(function(s){{Plotly.newPlot("f{i}",s.data,s.layout,{{responsive:true}})}})({spec});</script>')
+    partes.append('</body></html>')
+    return ''.join(partes)
+
+
+def altura_instantaneo(pacote):
+    altura = 0
+    for item in pacote['itens']:
+        if item['tipo'] == 'figura':
+            altura += item['spec'].get('layout', {}).get('height') or 450
+        elif item['tipo'] != 'metric':
+            altura += 40
+    return altura + 80
+
+
+def le_instantaneo(aba, local, assinatura, pasta=PASTA_INSTANTANEOS):
+    try:
+        with open(caminho_instantaneo(aba, local, pasta=pasta)) as f:
+            pacote = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return pacote if pacote.get('assinatura') == assinatura else None
+
+
+def grava_instantaneo(pacote, pasta=PASTA_INSTANTANEOS):
+    os.makedirs(os.path.join(pasta, pacote['aba']), exist_ok=True)
+    for extensao, conteudo in (('json', json.dumps(pacote)), ('html', html_instantaneo(pacote))):
+        destino = caminho_instantaneo(pacote['aba'], pacote['local'], extensao, pasta)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        with open(temporario, 'w') as f:
+            f.write(conteudo)
+        os.replace(temporario, destino)
+
+
+def renderiza_lote(tarefas, assinatura, pasta=PASTA_INSTANTANEOS):
+    # um AppTest por processo, reaproveitado entre os locais (os caches do app ficam quentes); sem
+    # static/ as figuras levam o geojson junto e a página HTML do pacote fica autônoma
+    from streamlit import config
+    from streamlit.testing.v1 import AppTest
+    config.set_option('server.enableStaticServing', False)
+    at = AppTest.from_file(os.path.abspath(APP), default_timeout=TEMPO_LIMITE)
+    for aba in ABAS:
+        at.session_state[f'ao_vivo_{aba}'] = True
+    at.run()
+    gerados = []
+    for aba, local in tarefas:
+        at.selectbox(key=ABAS[aba]['seletor']).select(local)
+        at.run()
+        if len(at.exception):
+            print(f'{aba}/{local}: {at.exception[0].message}', file=sys.stderr)
+            continue
+        grava_instantaneo({'aba': aba, 'local': local, 'assinatura': assinatura, 'itens': coleta_aba(at, aba)}, pasta)
+        gerados.append((aba, local))
+    return gerados
+
+
+def locais_abas():
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.abspath(APP), default_timeout=TEMPO_LIMITE)
+    for aba in ABAS:
+        at.session_state[f'ao_vivo_{aba}'] = True
+    at.run()
+    return {aba: list(at.selectbox(key=config['seletor']).options) for aba, config in ABAS.items()}
+
+
+def renderiza_todos(processos=None, pasta=PASTA_INSTANTANEOS):
+    assinatura = assinatura_app()
+    tarefas = [(aba, local) for aba, locais in locais_abas().items() for local in locais]
+    processos = processos or os.cpu_count()
+    lotes = [tarefas[i::processos] for i in range(processos)]
+    with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn')) as executor:
+        gerados = [par for resultado in executor.map(renderiza_lote, lotes, [assinatura] * len(lotes), [pasta] * len(lotes)) for par in resultado]
+    return tarefas, gerados
+
+
+if __name__ == '__main__':
+    tarefas, gerados = renderiza_todos(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f'{len(gerados)} de {len(tarefas)} instantâneos em {PASTA_INSTANTANEOS}/')
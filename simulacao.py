@@ -0,0 +1,164 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from estatistica import ajusta_frequencia
+
+
+# SIMULAÇÃO DE PERDAS (MONTE CARLO)
+# Cada unidade (município x cultura) tem uma frequência anual de sinistros (Poisson ou binomial
+# negativa, via mistura gama-Poisson) e uma severidade lognormal ajustada às indenizações. Os anos
+# sintéticos são sorteados em lotes independentes num pool de processos; cada lote devolve só um
+# histograma da sinistralidade, então a memória não cresce com o número de anos simulados.
+LR_MAXIMO = 2000.0
+LR_PASSO = 0.1
+SINISTROS_POR_LOTE = 4_000_000
+# células (ano x unidade) de um lote: ~80 bytes cada nos arrays de sorteio, ~80 MB por processo
+MAX_CELULAS = 1_000_000
+
+
+def parametros_carteira(psr, anos):
+    # psr: apólices já filtradas (uf, culturas); unidade = (ibge, cultura)
+    unidades = psr.groupby(['ibge', 'cultura'], sort=True).ngroup().to_numpy()
+    chaves = psr[['ibge', 'cultura']].assign(_unidade=unidades).drop_duplicates('_unidade').sort_values('_unidade').drop('_unidade', axis=1).reset_index(drop=True)
+    sinistro = (psr.descricao_tipologia != '-').to_numpy(dtype=bool, na_value=False) & (psr.valor_indenizacao.fillna(0) > 0).to_numpy(dtype=bool, na_value=False)
+
+    # frequência: matriz unidade x ano de sinistros; o ajuste só olha os anos expostos (abaixo)
+    ano = psr.ano.to_numpy(dtype=np.int64) - anos[0]
+    dentro = (ano >= 0) & (ano < len(anos))
+    contagem = np.zeros((len(chaves), len(anos)))
+    np.add.at(contagem, (unidades[sinistro & dentro], ano[sinistro & dentro]), 1)
+
+    # severidade lognormal por unidade; poucas observações usam o ajuste da carteira toda
+    log_indenizacao = np.log(psr.valor_indenizacao.to_numpy(dtype=np.float64, na_value=0)[sinistro])
+    unidade_sinistro = unidades[sinistro]
+    n = np.bincount(unidade_sinistro, minlength=len(chaves))
+    soma = np.bincount(unidade_sinistro, weights=log_indenizacao, minlength=len(chaves))
+    soma2 = np.bincount(unidade_sinistro, weights=log_indenizacao ** 2, minlength=len(chaves))
+    mu_geral = log_indenizacao.mean() if len(log_indenizacao) else 0.0
+    sigma_geral = log_indenizacao.std(ddof=1) if len(log_indenizacao) > 1 else 0.0
+    mu = np.divide(soma, n, out=np.full(len(chaves), mu_geral), where=n >= 3)
+    variancia = np.divide(soma2 - n * mu ** 2, n - 1, out=np.full(len(chaves), sigma_geral ** 2), where=n >= 3)
+    sigma = np.sqrt(np.clip(variancia, 0, None))
+
+    # exposição: prêmio + subvenção médio por ano com apólices; frequência e prêmio usam os mesmos anos
+    # expostos, senão uma unidade nova teria os sinistros diluídos por todo o histórico
+    premio = (psr.valor_premio.fillna(0) + psr.valor_subvencao.fillna(0)).to_numpy(dtype=np.float64)
+    premio_ano = np.zeros((len(chaves), len(anos)))
+    np.add.at(premio_ano, (unidades[dentro], ano[dentro]), premio[dentro])
+    expostos = (premio_ano > 0) | (contagem > 0)
+    anos_ativos = np.maximum(expostos.sum(axis=1), 1)
+    ajuste = ajusta_frequencia(contagem, expostos=expostos)
+
+    chaves['taxa'] = ajuste['media']
+    chaves['r'] = ajuste['r']
+    chaves['mu'] = mu
+    chaves['sigma'] = sigma
+    chaves['premio'] = premio_ano.sum(axis=1) / anos_ativos
+    return chaves
+
+
+def _novo_acumulador():
+    bins = int(LR_MAXIMO / LR_PASSO)
+    return {'contagem': np.zeros(bins + 1, dtype=np.int64), 'soma': np.zeros(bins + 1), 'n': 0, 'total': 0.0, 'total2': 0.0, 'maximo': 0.0}
+
+
+def _acumula(acumulador, parcial):
+    for chave in ('contagem', 'soma'):
+        acumulador[chave] += parcial[chave]
+    acumulador['n'] += parcial['n']
+    acumulador['total'] += parcial['total']
+    acumulador['total2'] += parcial['total2']
+    acumulador['maximo'] = max(acumulador['maximo'], parcial['maximo'])
+    return acumulador
+
+
+def simula_lote(taxa, r, mu, sigma, premio_total, anos, semente):
+    rng = np.random.default_rng(semente)
+    poisson = ~np.isfinite(r)
+    r_nb = np.where(poisson, 1.0, r)
+
+    # mistura gama-Poisson: binomial negativa nas unidades sobredispersas
+    lam = np.broadcast_to(taxa, (anos, len(taxa)))
+    lam = np.where(poisson, lam, rng.gamma(r_nb, taxa / r_nb, size=(anos, len(taxa))))
+    sinistros = rng.poisson(lam)
+
+    por_celula = sinistros.ravel()
+    unidade = np.repeat(np.tile(np.arange(len(taxa)), anos), por_celula)
+    ano = np.repeat(np.repeat(np.arange(anos), len(taxa)), por_celula)
+    perdas = np.bincount(ano, weights=rng.lognormal(mu[unidade], sigma[unidade]), minlength=anos)
+
+    sinistralidade = perdas / premio_total * 100
+    parcial = _novo_acumulador()
+    posicao = np.minimum((sinistralidade / LR_PASSO).astype(np.int64), len(parcial['contagem']) - 1)
+    parcial['contagem'] = np.bincount(posicao, minlength=len(parcial['contagem']))
+    parcial['soma'] = np.bincount(posicao, weights=sinistralidade, minlength=len(parcial['contagem']))
+    parcial['n'] = anos
+    parcial['total'] = sinistralidade.sum()
+    parcial['total2'] = (sinistralidade ** 2).sum()
+    parcial['maximo'] = sinistralidade.max(initial=0.0)
+    return parcial
+
+
+def resume_simulacao(acumulador, niveis=(0.95, 0.99)):
+    contagem, soma, n = acumulador['contagem'], acumulador['soma'], acumulador['n']
+    acumulada = np.cumsum(contagem)
+    media = acumulador['total'] / n
+    resumo = {
+        'anos': n,
+        'media': media,
+        'desvio': np.sqrt(max(acumulador['total2'] / n - media ** 2, 0.0)),
+        'maximo': acumulador['maximo'],
+        'prob_acima_100': contagem[int(100 / LR_PASSO):].sum() / n,
+        'histograma': pd.DataFrame({'sinistralidade': np.arange(len(contagem)) * LR_PASSO, 'anos': contagem}).query('anos > 0'),
+    }
+    for nivel in niveis:
+        posicao = int(np.searchsorted(acumulada, nivel * n, side='left'))
+        # VaR com a resolução do histograma; TVaR = média exata dos anos no bin do VaR e acima
+        resumo[f'var_{nivel}'] = (posicao + 1) * LR_PASSO if posicao < len(contagem) - 1 else acumulador['maximo']
+        resumo[f'tvar_{nivel}'] = soma[posicao:].sum() / max(contagem[posicao:].sum(), 1)
+    return resumo
+
+
+def tamanho_lote(taxa):
+    # anos por lote: limitado pelo número esperado de sinistros e pelas células ano x unidade
+    return int(np.clip(min(SINISTROS_POR_LOTE / max(taxa.sum(), 1.0), MAX_CELULAS // max(len(taxa), 1)), 1, 20_000))
+
+
+def cria_executor(processos=None):
+    # 'spawn' evita herdar as threads do servidor do Streamlit no fork
+    return ProcessPoolExecutor(max_workers=processos or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+
+def simula_carteira(parametros, anos=100_000, executor=None, processos=None, semente=0, niveis=(0.95, 0.99)):
+    taxa = parametros.taxa.to_numpy(dtype=np.float64)
+    r = parametros.r.to_numpy(dtype=np.float64)
+    mu = parametros.mu.to_numpy(dtype=np.float64)
+    sigma = parametros.sigma.to_numpy(dtype=np.float64)
+    premio_total = parametros.premio.sum()
+    if premio_total <= 0 or len(parametros) == 0:
+        return None
+
+    lote = tamanho_lote(taxa)
+    tamanhos = [min(lote, anos - inicio) for inicio in range(0, anos, lote)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+
+    acumulador = _novo_acumulador()
+    proprio = executor is None and processos != 1
+    if proprio:
+        executor = cria_executor(processos)
+    try:
+        if executor is None:
+            for tamanho, s in zip(tamanhos, sementes):
+                _acumula(acumulador, simula_lote(taxa, r, mu, sigma, premio_total, tamanho, s))
+        else:
+            tarefas = [executor.submit(simula_lote, taxa, r, mu, sigma, premio_total, tamanho, s) for tamanho, s in zip(tamanhos, sementes)]
+            for tarefa in as_completed(tarefas):
+                _acumula(acumulador, tarefa.result())
+    finally:
+        if proprio:
+            executor.shutdown()
+    return resume_simulacao(acumulador, niveis)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indices import classifica_mascara, classifica_segurado, indexa_municipios, mascara_municipios, indexa_apolices, conta_apolices, linhas_parciais, indexa_eventos, agrupa_eventos
+
+
+# APÓLICES DISTINTAS
+def _apolices(n=5000, semente=0):
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        'uf': rng.choice(['SP', 'PR', None], n),
+        'ibge': rng.integers(1, 30, n),
+        'cultura': rng.choice(['Soja', 'Milho'], n),
+        'data_apolice': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 500, n), 'D'),
+        'num_apolice': rng.integers(0, 3000, n),
+    })
+    df.loc[::40, 'data_apolice'] = pd.NaT
+    df['cod_apolice'] = indexa_apolices(df)['codigos']
+    return df
+
+
+def test_linhas_parciais_sao_as_bordas_da_janela():
+    df = _apolices()
+    indice = indexa_apolices(df)
+    linhas = linhas_parciais(indice, '2020-02-10', '2021-03-05')
+    meses = df.data_apolice.iloc[linhas].dt.strftime('%Y-%m')
+    assert set(meses) == {'2020-02', '2021-03'}
+    esperado = df.data_apolice.dt.strftime('%Y-%m').isin(['2020-02', '2021-03'])
+    assert len(linhas) == esperado.sum()
+
+
+def test_total_nacional_so_com_as_bordas():
+    df = _apolices()
+    indice = indexa_apolices(df)
+    inicio, fim = pd.Timestamp('2020-02-10'), pd.Timestamp('2021-03-05')
+    bordas = df.iloc[linhas_parciais(indice, inicio, fim)].query('data_apolice >= @inicio & data_apolice < @fim')
+    periodo = df.query('data_apolice >= @inicio & data_apolice < @fim')
+    assert conta_apolices(indice, bordas, inicio, fim) == periodo.num_apolice.nunique()
+    assert conta_apolices(indice, bordas, inicio, fim, aproximado=True) == conta_apolices(indice, periodo, inicio, fim, aproximado=True)
+
+
+# MUNICÍPIOS
+def test_classifica_segurado_como_na_aba_agro():
+    # mesmo formato do app: códigos segurados em lista e sinistros acima da média por linha
+    sin_merge = pd.DataFrame({'code_muni': ['1', '2', '3', '4'], 'sinistros': [0, 5, 1, 9]})
+    munis_sinistrados = sin_merge.sinistros.gt(sin_merge.sinistros.mean()).to_numpy(dtype=bool)
+    resultado = classifica_segurado(sin_merge, pd.Series(['1', '2', '4', '2']), munis_sinistrados)
+    assert resultado.seg.tolist() == ['Menos Sinistros que a Média', 'Mais Sinistros que a Média', 'Não Segurada', 'Mais Sinistros que a Média']
+
+
+def test_classifica_mascara_conjuntos_e_mascaras():
+    codigos = pd.Series(['a', 'b', 'c', 'a'])
+    rotulos = ['nenhum', 'conjunto', 'mascara', 'ambos']
+    resultado = classifica_mascara(codigos, [['a', 'c']], rotulos, mascaras=[np.array([True, True, False, False])])
+    assert resultado.tolist() == ['ambos', 'mascara', 'conjunto', 'conjunto']
+
+
+def test_mascara_booleana_fora_de_mascaras():
+    posicoes = indexa_municipios(['a', 'b'])
+    with pytest.raises(TypeError):
+        mascara_municipios(posicoes, [np.array([True, False])])
+    with pytest.raises(ValueError):
+        mascara_municipios(posicoes, mascaras=[np.array([True, False, True])])
+
+
+# AGRUPAMENTO DE EVENTOS
+def test_agrupa_eventos_so_no_bloco_da_janela():
+    rng = np.random.default_rng(1)
+    n = 3000
+    eventos = pd.DataFrame({
+        'latitude': rng.uniform(-30, 5, n), 'longitude': rng.uniform(-70, -35, n),
+        'descricao_tipologia': rng.choice(['Granizo', 'Inundações'], n), 'ano': rng.integers(2000, 2024, n),
+        'cod_uf': rng.choice(['BRA', 'ARG'], n),
+    })
+    indice = indexa_eventos(eventos, zoom_maximo=4)
+    grupos = agrupa_eventos(indice, 3, 'Granizo', 2005, 2010, pais='BRA')
+    esperado = eventos.query("descricao_tipologia == 'Granizo' & ano >= 2005 & ano <= 2010 & cod_uf == 'BRA'")
+    assert grupos.eventos.sum() == len(esperado)
+    assert np.isclose((grupos.lat * grupos.eventos).sum(), esperado.latitude.sum())
+    assert agrupa_eventos(indice, 3, 'Tornado', 2005, 2010).empty
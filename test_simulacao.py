@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from estatistica import ajusta_frequencia
+from simulacao import parametros_carteira, simula_carteira
+
+
+ANOS = np.arange(2006, 2022)
+
+
+def _carteira_curta():
+    # unidade segurada só em 2020 e 2021: 3 apólices de 1000 por ano, todas com sinistro de ~1000
+    rng = np.random.default_rng(0)
+    linhas = 6
+    return pd.DataFrame({
+        'ibge': '4100103', 'cultura': 'Soja', 'descricao_tipologia': 'Granizo',
+        'ano': np.repeat([2020, 2021], 3),
+        'valor_premio': np.full(linhas, 1000.0), 'valor_subvencao': np.zeros(linhas),
+        'valor_indenizacao': 1000.0 * np.exp(rng.normal(0, 0.05, linhas)),
+    })
+
+
+def test_frequencia_so_nos_anos_expostos():
+    parametros = parametros_carteira(_carteira_curta(), ANOS)
+    assert np.isclose(parametros.taxa.iloc[0], 3.0)
+    assert np.isclose(parametros.premio.iloc[0], 3000.0)
+
+
+def test_unidade_nova_mantem_a_sinistralidade_historica():
+    psr = _carteira_curta()
+    historica = psr.valor_indenizacao.sum() / psr.valor_premio.sum() * 100
+    resumo = simula_carteira(parametros_carteira(psr, ANOS), anos=20_000, processos=1)
+    assert abs(resumo['media'] - historica) < 5
+
+
+def test_ajusta_frequencia_sem_expostos_igual_a_todos():
+    X = np.random.default_rng(2).poisson(2.0, (5, 16))
+    padrao, todos = ajusta_frequencia(X), ajusta_frequencia(X, expostos=np.ones_like(X, dtype=bool))
+    assert np.allclose(padrao['media'], X.mean(axis=1)) and np.allclose(padrao['variancia'], X.var(axis=1, ddof=1))
+    assert np.allclose(padrao['media'], todos['media']) and np.allclose(padrao['variancia'], todos['variancia'])